@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+ETL правил скидок: загрузка справочников и правил из API в SQLite
+
+Запуск: python -m discount_etl --help
+"""
+
+from .api import APIError, DiscountRulesAPI, IncompleteDataError
+from .config import Config
+from .db import SQLiteManager
+from .engine import Basket, BasketItem, EvaluationResult, RuleEngine
+from .layouts import LAYOUTS, JsonBlobLayout, NormalizedLayout, RuleLayout
+from .mappings import MappingLoader
+from .metrics import MetricsRegistry
+from .pipeline import ETLPipeline
+from .processing import DataProcessor
+from .replay import RecordingAPI, ReplayAPI, ResponseCache
+from .sku_index import SkuSetIndex
+from .time_index import TimeWindowIndex
+
+__all__ = [
+    "APIError",
+    "Basket",
+    "BasketItem",
+    "Config",
+    "DataProcessor",
+    "DiscountRulesAPI",
+    "ETLPipeline",
+    "EvaluationResult",
+    "IncompleteDataError",
+    "JsonBlobLayout",
+    "LAYOUTS",
+    "MappingLoader",
+    "MetricsRegistry",
+    "NormalizedLayout",
+    "RecordingAPI",
+    "ReplayAPI",
+    "ResponseCache",
+    "RuleEngine",
+    "RuleLayout",
+    "SkuSetIndex",
+    "SQLiteManager",
+    "TimeWindowIndex",
+]
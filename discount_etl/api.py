@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP клиент API правил скидок
+
+Все запросы списков и деталей идут через _post_json: ограничение частоты,
+таймаут и повторы. Если страницу так и не удалось получить, поднимается
+исключение - неполный список не должен попасть в БД как полный.
+"""
+
+import asyncio
+import json
+import logging
+import ssl
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import aiohttp
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+from .config import Config
+from .metrics import MetricsRegistry
+from .ratelimit import AdaptiveRateLimiter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class APIError(Exception):
+    """Ошибочный ответ API"""
+    
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class RetryableAPIError(APIError):
+    """Временная ошибка (429, 5xx, неполный JSON): запрос можно повторить"""
+
+
+class IncompleteDataError(APIError):
+    """Получено меньше записей, чем сообщил сервер"""
+
+
+RETRYABLE_ERRORS = (RetryableAPIError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class APIResponse(NamedTuple):
+    """Разобранный JSON ответа и, если они запрошены (keep_raw), исходные байты тела"""
+    data: Any
+    raw: Optional[bytes] = None
+
+
+def decode_json(body: bytes) -> Any:
+    """Разбор тела ответа из байтов за один проход, без декодирования в str
+    
+    orjson разбирает bytes напрямую. Целые больше 64 бит старые версии orjson
+    превращают во float, но id сервера (Java long) в этот диапазон не попадают.
+    Ошибка разбора поднимается как ValueError.
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _accept_encoding() -> str:
+    """Поддерживаемые aiohttp алгоритмы сжатия ответов"""
+    try:
+        import brotli  # noqa: F401
+        return "gzip, deflate, br"
+    except ImportError:
+        return "gzip, deflate"
+
+
+class DiscountRulesAPI:
+    """HTTP клиент для работы с API правил скидок
+    
+    Соединения берутся из пула TCPConnector с лимитами из конфигурации.
+    Переданный снаружи connector не закрывается при выходе, поэтому один пул
+    (и его keep-alive соединения) можно использовать в нескольких запусках.
+    Connector привязан к циклу событий, в котором создан: переиспользовать его
+    можно только в запусках внутри того же цикла (одного asyncio.run), а
+    закрывает его создавший (await connector.close()).
+    Время запросов, объем ответов, время разбора JSON и повторы пишутся
+    в metrics с меткой endpoint (путь без адреса сервера).
+    
+    Тело ответа читается байтами и разбирается один раз; сами байты после
+    разбора сохраняются (APIResponse.raw), только если включен keep_raw:
+    при уровне логирования DEBUG или записи ответов (RecordingAPI).
+    """
+    
+    def __init__(self, config: Config, connector: Optional[aiohttp.TCPConnector] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.config = config
+        self.metrics = metrics or MetricsRegistry()
+        self.base_url = config.BASE_URL
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.cookies = None
+        self.connector = connector
+        self.headers = self._default_headers()
+        self.keep_raw = logger.isEnabledFor(logging.DEBUG)
+        self.limiter: Optional[AdaptiveRateLimiter] = None
+        if config.RATE_LIMIT:
+            self.limiter = AdaptiveRateLimiter(
+                rate=config.RATE_LIMIT_INITIAL,
+                min_rate=config.RATE_LIMIT_MIN,
+                max_rate=config.RATE_LIMIT_MAX,
+                burst=config.RATE_LIMIT_BURST
+            )
+    
+    @staticmethod
+    def create_ssl_context() -> ssl.SSLContext:
+        """SSL без проверки сертификата (сервер API с самоподписанным сертификатом)"""
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        return ssl_context
+    
+    @classmethod
+    def create_connector(cls, config: Config) -> aiohttp.TCPConnector:
+        """Пул соединений с настройками из конфигурации"""
+        return aiohttp.TCPConnector(
+            ssl=cls.create_ssl_context(),
+            limit=config.HTTP_POOL_LIMIT,
+            limit_per_host=config.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=config.HTTP_DNS_CACHE_TTL,
+        )
+    
+    async def __aenter__(self):
+        connector_owner = self.connector is None
+        connector = self.connector or self.create_connector(self.config)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=connector_owner,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(
+                total=self.config.HTTP_TIMEOUT,
+                sock_connect=self.config.HTTP_CONNECT_TIMEOUT
+            )
+        )
+        await self.login()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.session:
+            await self.session.close()
+    
+    async def login(self):
+        """Авторизация в системе"""
+        url = f"{self.base_url}{self.config.ENDPOINTS['login']}"
+        payload = {
+            "username": self.config.USERNAME,
+            "password": self.config.PASSWORD
+        }
+        
+        logger.info(f"Авторизация: POST {url} (пользователь {self.config.USERNAME})")
+        
+        async with self.session.post(url, json=payload) as response:
+            response_text = await response.text()
+            
+            if response.status == 200:
+                # Сохраняем cookies из ответа
+                self.cookies = response.cookies
+                logger.info("Успешная авторизация")
+            else:
+                logger.error(f"Ответ авторизации: {response_text[:500]}")
+                raise Exception(f"Ошибка авторизации: {response.status}")
+    
+    def _build_page_payload(self, offset: int, sort_field: str) -> Dict:
+        """Тело запроса одной страницы списка"""
+        return {
+            "count": self.config.BATCH_SIZE,
+            "offset": offset,
+            "filter": {},
+            "period": {},
+            "sort": {
+                "fields": [{"field": sort_field, "asc": True}]  # asc: True как в старом коде
+            }
+        }
+    
+    @staticmethod
+    def _retry_after(value: Optional[str]) -> Optional[float]:
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
+    
+    def _endpoint(self, url: str) -> str:
+        """Метка endpoint для метрик"""
+        return url[len(self.base_url):] if url.startswith(self.base_url) else url
+    
+    async def _post_once(self, url: str, payload: Dict, context: str) -> APIResponse:
+        """Один POST: токен лимитера, запрос, проверка статуса и разбор JSON"""
+        if self.limiter:
+            await self.limiter.acquire()
+        
+        endpoint = self._endpoint(url)
+        started = time.perf_counter()
+        try:
+            # Cookies передаем явно; заголовки заданы сессии
+            async with self.session.post(url, json=payload, cookies=self.cookies) as response:
+                status = response.status
+                retry_after = self._retry_after(response.headers.get('Retry-After'))
+                body = await response.read()
+        except RETRYABLE_ERRORS as e:
+            self.metrics.observe('discount_etl_http_request_seconds', time.perf_counter() - started,
+                                 endpoint=endpoint, status=type(e).__name__)
+            if self.limiter:
+                self.limiter.on_throttle()
+            raise
+        
+        self.metrics.observe('discount_etl_http_request_seconds', time.perf_counter() - started,
+                             endpoint=endpoint, status=status)
+        self.metrics.inc('discount_etl_http_response_bytes_total', len(body), endpoint=endpoint)
+        
+        if status == 429 or status >= 500:
+            if self.limiter:
+                self.limiter.on_throttle(retry_after)
+            raise RetryableAPIError(f"{context}: HTTP {status}", status)
+        
+        if status != 200:
+            logger.error(f"Ошибка запроса {context}: {status}")
+            logger.error(f"Полный ответ: {body[:1000].decode('utf-8', 'replace')}")
+            raise APIError(f"{context}: HTTP {status}", status)
+        
+        try:
+            with self.metrics.timer('discount_etl_json_parse_seconds', endpoint=endpoint):
+                data = decode_json(body)
+        except ValueError as e:
+            raise RetryableAPIError(f"{context}: ошибка парсинга JSON: {e}", status)
+        
+        if self.limiter:
+            self.limiter.on_success()
+        return APIResponse(data, body if self.keep_raw else None)
+    
+    async def _post_json(self, url: str, payload: Dict, context: str) -> APIResponse:
+        """POST с повторами (config.RETRY_*) для временных ошибок"""
+        def log_retry(retry_state):
+            self.metrics.inc('discount_etl_http_retries_total', endpoint=self._endpoint(url))
+            logger.warning(
+                f"Повтор {context} (попытка {retry_state.attempt_number + 1} из {self.config.RETRY_ATTEMPTS}): "
+                f"{retry_state.outcome.exception()!r}"
+            )
+        
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.config.RETRY_ATTEMPTS),
+            wait=wait_random_exponential(multiplier=self.config.RETRY_BACKOFF_BASE,
+                                         max=self.config.RETRY_BACKOFF_MAX),
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            before_sleep=log_retry,
+            reraise=True
+        ):
+            with attempt:
+                response = await self._post_once(url, payload, context)
+        return response
+    
+    async def fetch_page(self, endpoint: str, offset: int, sort_field: str = "name") -> tuple:
+        """Получение одной страницы списка: (items, total_count)
+        
+        Ошибки, оставшиеся после повторов, поднимаются как исключения.
+        """
+        response = await self._request_page(endpoint, offset, sort_field)
+        
+        items = response.data.get('data', [])
+        total_count = response.data.get('count', 0)
+        
+        if not items:
+            logger.warning(f"Нет данных в поле 'data' для {endpoint} (offset: {offset})")
+            if response.raw is not None:
+                logger.debug(f"Полный ответ: {response.raw[:2000].decode('utf-8', 'replace')}")
+        
+        return items, total_count
+    
+    async def _request_page(self, endpoint: str, offset: int, sort_field: str) -> APIResponse:
+        """Ответ API на запрос страницы списка"""
+        url = f"{self.base_url}{endpoint}"
+        payload = self._build_page_payload(offset, sort_field)
+        return await self._post_json(url, payload, f"{endpoint} (offset: {offset})")
+    
+    async def _request_sku_set(self, sku_set_id: int) -> Optional[APIResponse]:
+        """Ответ API на запрос деталей SKU set; None - набора нет на сервере (404)"""
+        url = f"{self.base_url}{self.config.ENDPOINTS['sku_set_details']}"
+        payload = {"id": sku_set_id}
+        
+        try:
+            return await self._post_json(url, payload, f"SKU set {sku_set_id}")
+        except APIError as e:
+            if e.status == 404:
+                return None
+            raise
+    
+    def _default_headers(self) -> Dict:
+        """Заголовки как в рабочем коде (строятся один раз и задаются сессии)"""
+        return {
+            'accept': '*/*',
+            'accept-encoding': _accept_encoding() if self.config.HTTP_COMPRESSION else 'identity',
+            'content-type': 'application/json',
+            'origin': self.base_url,
+            'referer': f"{self.base_url}/",
+            'user-agent': self.config.USER_AGENT
+        }
+    
+    async def iter_pages(self, endpoint: str, sort_field: str = "name",
+                         concurrent: Optional[bool] = None) -> AsyncIterator[List[Dict]]:
+        """Постраничная выдача списка в порядке offset
+        
+        В параллельном режиме сначала запрашивается первая страница, из неё
+        берется count, затем следующие offset запрашиваются скользящим окном
+        из config.FETCH_CONCURRENCY запросов. В памяти одновременно не больше
+        окна страниц.
+        
+        Если записей получено меньше, чем count из ответа сервера, в конце
+        поднимается IncompleteDataError, чтобы загрузчик не принял неполный
+        список за полный (и не удалил "пропавшие" записи).
+        """
+        if concurrent is None:
+            concurrent = self.config.CONCURRENT_PAGING
+        
+        items, total_count = await self.fetch_page(endpoint, 0, sort_field)
+        received = len(items)
+        if items:
+            logger.debug(f"Получено {len(items)} записей из {endpoint} (offset: 0, total: {total_count})")
+            yield items
+        
+        if concurrent and total_count and len(items) >= self.config.BATCH_SIZE:
+            offsets = range(self.config.BATCH_SIZE, total_count, self.config.BATCH_SIZE)
+            async for _, page_items, _ in self.iter_offsets(endpoint, offsets, sort_field):
+                received += len(page_items)
+                if page_items:
+                    yield page_items
+        
+        elif len(items) >= self.config.BATCH_SIZE:
+            offset = self.config.BATCH_SIZE
+            while True:
+                items, total_count = await self.fetch_page(endpoint, offset, sort_field)
+                received += len(items)
+                if not items:
+                    break
+                
+                logger.debug(f"Получено {len(items)} записей из {endpoint} (offset: {offset}, total: {total_count})")
+                yield items
+                
+                if len(items) < self.config.BATCH_SIZE:
+                    break
+                
+                offset += self.config.BATCH_SIZE
+        
+        if received < total_count:
+            raise IncompleteDataError(
+                f"{endpoint}: получено {received} записей из {total_count}"
+            )
+    
+    async def iter_offsets(self, endpoint: str, offsets: Iterable[int], sort_field: str = "name",
+                           window_size: Optional[int] = None) -> AsyncIterator[tuple]:
+        """Страницы по заданным offset скользящим окном запросов: (offset, items, total_count)
+        
+        Результаты выдаются в порядке offsets; незавершенные запросы
+        отменяются, если потребитель прекратил итерацию.
+        """
+        window_size = window_size or self.config.FETCH_CONCURRENCY
+        window = deque()
+        
+        async def take():
+            page_offset, task = window.popleft()
+            page_items, total_count = await task
+            if page_items:
+                logger.debug(f"Получено {len(page_items)} записей из {endpoint} (offset: {page_offset}, total: {total_count})")
+            return page_offset, page_items, total_count
+        
+        try:
+            for offset in offsets:
+                window.append((offset, asyncio.create_task(
+                    self.fetch_page(endpoint, offset, sort_field)
+                )))
+                if len(window) >= window_size:
+                    yield await take()
+            
+            while window:
+                yield await take()
+        finally:
+            for _, task in window:
+                task.cancel()
+            # Дожидаемся отмены, чтобы запросы не пережили итерацию и сессию
+            await asyncio.gather(*(task for _, task in window), return_exceptions=True)
+    
+    async def iter_missing_pages(self, endpoint: str, done_offsets: Set[int], total_count: Optional[int],
+                                 sort_field: str = "name") -> AsyncIterator[tuple]:
+        """Страницы, которых нет среди done_offsets: (offset, items, total_count)
+        
+        Для возобновления загрузки: первая страница запрашивается, только если
+        она не сохранена или неизвестен count. В последовательном режиме
+        (CONCURRENT_PAGING = False) окно состоит из одного запроса.
+        """
+        if total_count is None or 0 not in done_offsets:
+            items, total_count = await self.fetch_page(endpoint, 0, sort_field)
+            yield 0, items, total_count
+        
+        offsets = [
+            offset for offset in range(self.config.BATCH_SIZE, total_count, self.config.BATCH_SIZE)
+            if offset not in done_offsets
+        ]
+        window_size = None if self.config.CONCURRENT_PAGING else 1
+        async for page in self.iter_offsets(endpoint, offsets, sort_field, window_size):
+            yield page
+    
+    async def fetch_data(self, endpoint: str, sort_field: str = "name",
+                         concurrent: Optional[bool] = None) -> List[Dict]:
+        """Получение всех данных списка с пагинацией"""
+        all_data = []
+        async for items in self.iter_pages(endpoint, sort_field, concurrent):
+            all_data.extend(items)
+        
+        logger.info(f"Всего получено {len(all_data)} записей из {endpoint}")
+        return all_data
+    
+    async def fetch_sku_set_details(self, sku_set_id: int) -> List[int]:
+        """Получение деталей набора товаров
+        
+        Набор, которого уже нет на сервере (404), считается пустым; остальные
+        ошибки после повторов поднимаются, чтобы не записать неполный состав.
+        """
+        if not sku_set_id:
+            return []
+        
+        response = await self._request_sku_set(sku_set_id)
+        if response is None:
+            logger.warning(f"SKU set {sku_set_id} не найден")
+            return []
+        
+        skus = (response.data.get('data') or {}).get('skus', [])
+        return [sku.get('id') for sku in skus if sku.get('id')]
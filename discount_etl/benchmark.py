@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Сквозной замер ETL: время стадий, строк в секунду, пик памяти, объем записи
+
+Для каждого размера каталога запускается заглушка API (discount_etl.mockserver,
+отдельным процессом, чтобы генерация данных не влияла на замер) и полная
+загрузка ETLPipeline в новую БД; с --incremental следом - повторная
+инкрементальная синхронизация тех же данных. С --replay DIR источником
+служат ответы, записанные через --record (сеть не используется).
+
+Результат - JSON (см. --output):
+- stages: время стадий из ETLPipeline.stage_times, секунды;
+- tables: строк в таблице и строк в секунду за время загрузки таблицы
+  (для таблиц правил - за стадию discount_rules);
+- peak_rss_bytes: пик RSS процесса (psutil, опрос в отдельном потоке);
+- sqlite_write_bytes / db_bytes / write_amplification: сколько байт процесс
+  записал (write_chars из /proc, включая WAL и checkpoint) на байт итоговой БД.
+
+С --codec вместо загрузки замеряется нормализация value условий
+(discount_etl.codec) против прежнего json.loads + json.dumps на значениях из
+записанных ответов (--replay) или синтетических правил.
+
+Запуск:
+    python -m discount_etl.benchmark --sizes 1000,10000,100000 --output bench.json
+    python -m discount_etl.benchmark --replay recorded/ --output bench.json
+    python -m discount_etl.benchmark --codec --replay recorded/
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import psutil
+
+from . import codec
+from .config import Config
+from .layouts import LAYOUTS
+from .mockserver import MockCatalog
+from .pipeline import ETLPipeline
+from .replay import ResponseCache
+
+REFERENCE_TABLES = ('merchants', 'locations', 'terminals', 'sku_sets', 'sku_set_items')
+# Стадия, за время которой считается скорость загрузки таблицы
+TABLE_STAGES = {'sku_set_items': 'sku_sets'}
+
+
+def catalog_sizes(rules: int) -> Dict[str, int]:
+    """Размеры справочников для каталога из rules правил"""
+    return {
+        'rules': rules,
+        'sku_sets': max(10, rules // 20),
+        'skus': rules * 10,
+        'merchants': 10,
+        'locations': max(10, rules // 50),
+        'terminals': max(10, rules // 10),
+    }
+
+
+class RSSSampler:
+    """Пик RSS процесса за время замера (опрос в потоке, не зависит от event loop)"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = self.process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample(self):
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+
+def written_bytes() -> Optional[int]:
+    """Байт, переданных процессом в write() (None, если ОС не сообщает)"""
+    try:
+        counters = psutil.Process().io_counters()
+    except (AttributeError, psutil.Error):
+        return None
+    return getattr(counters, 'write_chars', counters.write_bytes)
+
+
+def database_bytes(db_path: str) -> int:
+    return sum(
+        os.path.getsize(path) for path in (db_path, f"{db_path}-wal") if os.path.exists(path)
+    )
+
+
+def table_counts(db_path: str, tables) -> Dict[str, int]:
+    with sqlite3.connect(db_path) as conn:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class MockServerProcess:
+    """discount_etl.mockserver в дочернем процессе на свободном порту"""
+
+    def __init__(self, sizes: Dict[str, int], latency: float, error_rate: float):
+        self.sizes = sizes
+        self.latency = latency
+        self.error_rate = error_rate
+        self.port = free_port()
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        command = [sys.executable, '-m', 'discount_etl.mockserver', '--port', str(self.port),
+                   '--latency', str(self.latency), '--error-rate', str(self.error_rate)]
+        for name, value in self.sizes.items():
+            command += [f"--{name.replace('_', '-')}", str(value)]
+        # Пакет должен импортироваться в дочернем процессе из любого рабочего каталога
+        package_root = str(Path(__file__).resolve().parent.parent)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (package_root, os.environ.get('PYTHONPATH')))))
+        self.process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Заглушка API завершилась с кодом {self.process.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.2).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        self.__exit__(None, None, None)
+        raise RuntimeError("Заглушка API не запустилась за 30 секунд")
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+
+
+def run_once(config: Config) -> Dict:
+    """Один запуск ETLPipeline с замерами"""
+    gc.collect()
+    pipeline = ETLPipeline(config)
+    written_before = written_bytes()
+    with RSSSampler() as rss:
+        asyncio.run(pipeline.run())
+    written_after = written_bytes()
+
+    stages = {name: round(seconds, 4) for name, seconds in pipeline.stage_times.items()}
+    rule_tables = LAYOUTS[config.LAYOUT].TABLES
+    counts = table_counts(config.DB_PATH, REFERENCE_TABLES + rule_tables)
+    tables = {}
+    for table, rows in counts.items():
+        stage = TABLE_STAGES.get(table, 'discount_rules' if table in rule_tables else table)
+        seconds = pipeline.stage_times.get(stage)
+        tables[table] = {
+            'rows': rows,
+            'seconds': round(seconds, 4) if seconds else None,
+            'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        }
+
+    db_bytes = database_bytes(config.DB_PATH)
+    write_bytes = None
+    if written_before is not None and written_after is not None:
+        write_bytes = written_after - written_before
+
+    return {
+        'mode': 'incremental' if config.INCREMENTAL_SYNC else 'full',
+        'wall_time': stages.get('total'),
+        'stages': stages,
+        'tables': tables,
+        'start_rss_bytes': rss.start_rss,
+        'peak_rss_bytes': rss.peak_rss,
+        'sqlite_write_bytes': write_bytes,
+        'db_bytes': db_bytes,
+        'write_amplification': round(write_bytes / db_bytes, 2) if write_bytes and db_bytes else None,
+    }
+
+
+def benchmark_source(config: Config, label: Dict, incremental: bool) -> List[Dict]:
+    """Полная загрузка в новую БД и (опционально) повторная инкрементальная"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="discount_etl_bench_") as work_dir:
+        config.DB_PATH = str(Path(work_dir) / "bench.db")
+        modes = (False, True) if incremental else (False,)
+        for incremental_sync in modes:
+            config.INCREMENTAL_SYNC = incremental_sync
+            result = dict(label, **run_once(config))
+            print(f"{label.get('size', label['source'])}: {result['mode']} за {result['wall_time']:.2f} с, "
+                  f"пик RSS {result['peak_rss_bytes'] / 2**20:.0f} МБ", file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def condition_values(rule: Dict):
+    """Поля value всех условий правила (как их обходит схема normalized)"""
+    for group in ('ruleConditionGroup', 'orderConditionGroup'):
+        for condition in (rule.get(group) or {}).get('requiredConditions') or []:
+            yield condition.get('value')
+    for scale_item in rule.get('resultScaleItems') or []:
+        for result in scale_item.get('results') or []:
+            for condition in (result.get('restriction') or {}).get('conditions') or []:
+                yield condition.get('value')
+
+
+def json_round_trip(value_str: str) -> str:
+    """Прежняя нормализация value: json.loads и json.dumps обратно"""
+    value_obj = json.loads(value_str)
+    if isinstance(value_obj, dict) and 'ids' in value_obj:
+        return json.dumps(value_obj['ids'])
+    if isinstance(value_obj, dict) and 'id' in value_obj:
+        return str(value_obj['id'])
+    if isinstance(value_obj, dict) and 'value' in value_obj:
+        return str(value_obj['value'])
+    return json.dumps(value_obj)
+
+
+def benchmark_codec(values: List[str], rounds: int) -> Dict:
+    """Значений в секунду: прежний способ, codec без кеша и с кешем"""
+    def measure(function) -> Dict:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for value in values:
+                function(value)
+        seconds = time.perf_counter() - started
+        return {'seconds': round(seconds, 4), 'values_per_sec': round(len(values) * rounds / seconds, 1)}
+
+    uncached = codec.normalize_value.__wrapped__
+    codec.normalize_value.cache_clear()
+    return {
+        'values': len(values),
+        'unique_values': len(set(values)),
+        'rounds': rounds,
+        'mismatches': sum(1 for value in values if json_round_trip(value) != uncached(value)),
+        'orjson': codec.orjson is not None,
+        'json_round_trip': measure(json_round_trip),
+        'codec_uncached': measure(uncached),
+        'codec_cached': measure(codec.normalize_value),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m discount_etl.benchmark",
+        description="Сквозной замер ETL на синтетических или записанных данных"
+    )
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="размеры каталога в правилах через запятую (по умолчанию %(default)s)")
+    parser.add_argument("--replay", metavar="DIR", help="ответы API, записанные через --record, вместо заглушки")
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default=Config.LAYOUT)
+    parser.add_argument("--no-resume", action="store_true", help="загрузка без staging")
+    parser.add_argument("--incremental", action="store_true",
+                        help="после полной загрузки замерить повторную инкрементальную")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа заглушки, секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ошибок заглушки (0..1)")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="включить адаптивное ограничение частоты запросов к заглушке")
+    parser.add_argument("--batch-size", type=int, default=Config.BATCH_SIZE)
+    parser.add_argument("--codec", action="store_true",
+                        help="замерить нормализацию value условий вместо загрузки")
+    parser.add_argument("--codec-rounds", type=int, default=5, help="проходов по корпусу value")
+    parser.add_argument("--output", default="-", help="файл JSON с результатами (по умолчанию stdout)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    # Лог конвейера не выводится: запись в stdout искажала бы объем записи
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    config = Config()
+    config.LAYOUT = args.layout
+    config.RESUMABLE_SYNC = not args.no_resume
+    config.BATCH_SIZE = args.batch_size
+
+    runs = []
+    if args.codec:
+        if args.replay:
+            cache = ResponseCache(args.replay)
+            rules = (rule for page in cache.iter_pages(config.ENDPOINTS['discount_rules'])
+                     for rule in page.get('data') or [])
+            label = {'source': 'replay', 'replay_dir': args.replay}
+        else:
+            size = int(args.sizes.split(',')[0])
+            catalog = MockCatalog(**{name: value for name, value in catalog_sizes(size).items()})
+            rules = (catalog.rule(rule_id) for rule_id in range(1, size + 1))
+            label = {'source': 'mock', 'size': size}
+        values = [value for rule in rules for value in condition_values(rule) if value]
+        runs.append(dict(label, **benchmark_codec(values, args.codec_rounds)))
+    elif args.replay:
+        config.REPLAY_DIR = args.replay
+        runs += benchmark_source(config, {'source': 'replay', 'replay_dir': args.replay}, args.incremental)
+    else:
+        # Без --rate-limit замеряется ETL, а не разгон ограничителя частоты
+        config.RATE_LIMIT = args.rate_limit
+        for rules in (int(size) for size in args.sizes.split(',') if size.strip()):
+            sizes = catalog_sizes(rules)
+            with MockServerProcess(sizes, args.latency, args.error_rate) as server:
+                config.BASE_URL = server.base_url
+                runs += benchmark_source(config, {'source': 'mock', 'size': rules, 'catalog': sizes},
+                                         args.incremental)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'layout': config.LAYOUT,
+            'resumable_sync': config.RESUMABLE_SYNC,
+            'batch_size': config.BATCH_SIZE,
+            'fetch_concurrency': config.FETCH_CONCURRENCY,
+            'sku_details_concurrency': config.SKU_DETAILS_CONCURRENCY,
+        },
+        'runs': runs,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        Path(args.output).write_text(output, encoding='utf-8')
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Командная строка ETL: python -m discount_etl [параметры]
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from typing import List, Optional
+
+from .config import Config
+from .layouts import LAYOUTS
+from .pipeline import ETLPipeline
+
+
+def setup_logging(level: str = "INFO", log_file: Optional[str] = None):
+    """Логирование в консоль и (опционально) в файл с UTF-8"""
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+
+    logging.basicConfig(
+        level=getattr(logging, level.upper(), logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m discount_etl",
+        description="Загрузка правил скидок и справочников из API в SQLite"
+    )
+    parser.add_argument("--db", default=Config.DB_PATH, help="путь к файлу SQLite")
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default=Config.LAYOUT,
+                        help="схема хранения правил (по умолчанию %(default)s)")
+    parser.add_argument("--full", action="store_true",
+                        help="полная перезагрузка вместо инкрементальной синхронизации")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="писать страницы API сразу в таблицы, без staging и продолжения прерванной загрузки")
+    parser.add_argument("--sequential", action="store_true",
+                        help="загружать страницы списков последовательно")
+    parser.add_argument("--base-url", default=Config.BASE_URL, help="адрес API")
+    parser.add_argument("--batch-size", type=int, default=Config.BATCH_SIZE,
+                        help="размер страницы API (по умолчанию %(default)s)")
+    parser.add_argument("--fetch-concurrency", type=int, default=Config.FETCH_CONCURRENCY,
+                        help="одновременных запросов страниц (по умолчанию %(default)s)")
+    parser.add_argument("--sku-concurrency", type=int, default=Config.SKU_DETAILS_CONCURRENCY,
+                        help="одновременных запросов /skuSet/get (по умолчанию %(default)s)")
+    parser.add_argument("--pool-per-host", type=int, default=Config.HTTP_POOL_LIMIT_PER_HOST,
+                        help="соединений к API в пуле (по умолчанию %(default)s)")
+    parser.add_argument("--no-compression", action="store_true",
+                        help="не запрашивать сжатие ответов API")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--record", metavar="DIR",
+                             help="сохранять ответы API в каталог DIR")
+    cache_group.add_argument("--replay", metavar="DIR",
+                             help="загружать ответы из каталога DIR (записанного --record) без обращения к API")
+    parser.add_argument("--metrics-file", default=Config.METRICS_FILE,
+                        help="файл метрик запуска: *.json - JSON, иначе формат Prometheus")
+    parser.add_argument("--metrics-sql-trace", action="store_true",
+                        help="считать команды SQLite по типам (замедляет запись)")
+    parser.add_argument("--log-level", default="INFO", help="уровень логирования")
+    parser.add_argument("--log-file", default=Config.LOG_FILE,
+                        help="файл лога (пустая строка - без файла)")
+    return parser
+
+
+def config_from_args(args: argparse.Namespace) -> Config:
+    config = Config()
+    config.DB_PATH = args.db
+    config.LAYOUT = args.layout
+    config.INCREMENTAL_SYNC = not args.full
+    config.CONCURRENT_PAGING = not args.sequential
+    config.RESUMABLE_SYNC = not args.no_resume
+    config.BASE_URL = args.base_url
+    config.BATCH_SIZE = args.batch_size
+    config.FETCH_CONCURRENCY = args.fetch_concurrency
+    config.SKU_DETAILS_CONCURRENCY = args.sku_concurrency
+    config.HTTP_POOL_LIMIT_PER_HOST = args.pool_per_host
+    config.HTTP_POOL_LIMIT = max(config.HTTP_POOL_LIMIT, args.pool_per_host)
+    config.HTTP_COMPRESSION = not args.no_compression
+    config.RECORD_DIR = args.record
+    config.REPLAY_DIR = args.replay
+    config.METRICS_FILE = args.metrics_file
+    config.METRICS_SQL_TRACE = args.metrics_sql_trace
+    return config
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Главная функция"""
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log_level, args.log_file or None)
+
+    pipeline = ETLPipeline(config_from_args(args))
+    try:
+        asyncio.run(pipeline.run())
+    except KeyboardInterrupt:
+        print("\nОстановка...")
+        return 130
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        return 1
+    return 0
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Нормализация поля value условий правил
+
+API отдает value JSON-строкой: {"ids": [...], "descs": [...]} для списков
+терминалов, магазинов и т.п., {"id": ..., "desc": ...} для одного объекта,
+{"value": ...} для чисел. В таблицы пишется только значимая часть:
+JSON-массив id, id или значение строкой.
+
+Строка разбирается orjson за один проход, результат собирается сразу из
+разобранных значений: список целых id форматируется join'ом, без повторной
+сериализации json.dumps. Вывод совпадает с прежним json.loads + json.dumps
+символ в символ (иначе инкрементальная синхронизация оставила бы в БД
+значения в двух форматах). Одинаковые value у разных правил встречаются
+часто, поэтому результаты кешируются.
+
+Без orjson и для того, что orjson разбирает иначе (NaN, целые больше 64 бит),
+используется стандартный json.
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+VALUE_CACHE_SIZE = 65536
+
+# Целые длиннее 18 цифр orjson не разбирает или (старые версии) превращает во float
+LONG_NUMBER = re.compile(r'\d{19}')
+
+
+def _format_ids(ids: Any) -> str:
+    """JSON-массив id в формате json.dumps по умолчанию ("[1, 2, 3]")"""
+    if type(ids) is list and all(type(item) is int for item in ids):
+        return "[" + ", ".join(map(str, ids)) + "]"
+    return json.dumps(ids)
+
+
+def _normalize(value_obj: Any) -> str:
+    if isinstance(value_obj, dict):
+        if 'ids' in value_obj:
+            return _format_ids(value_obj['ids'])
+        if 'id' in value_obj:
+            return str(value_obj['id'])
+        if 'value' in value_obj:
+            return str(value_obj['value'])
+    return json.dumps(value_obj)
+
+
+def _loads(text: str) -> Any:
+    if orjson is not None and not LONG_NUMBER.search(text):
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+@lru_cache(maxsize=VALUE_CACHE_SIZE)
+def normalize_value(value_str: str) -> str:
+    """Значимая часть value; ошибка разбора поднимается как ValueError"""
+    return _normalize(_loads(value_str))
+
+
+@lru_cache(maxsize=VALUE_CACHE_SIZE)
+def int_values(text: Optional[str]) -> Tuple[int, ...]:
+    """Целые значения нормализованного value ("[1, 2]" -> (1, 2), "7" -> (7,))
+
+    Для rule_condition_values: остальные значения (строки, дробные, объекты)
+    не индексируются и дают пустой кортеж.
+    """
+    if not text:
+        return ()
+    try:
+        value = _loads(text)
+    except ValueError:
+        return ()
+    items = value if type(value) is list else (value,)
+    return tuple(item for item in items if type(item) is int)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Конфигурация ETL: подключение к API, БД и параметры производительности
+"""
+
+
+class Config:
+    """Конфигурация подключения к API и БД
+
+    Значения по умолчанию заданы атрибутами класса; CLI создает экземпляр
+    и переопределяет нужные атрибуты на нем.
+    """
+
+    # API Configuration
+    BASE_URL = "https://89.105.216.114"
+    USERNAME = "Yulia"
+    PASSWORD = "SY1804$@"
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+    # Database
+    DB_PATH = "discount_rules.db"
+
+    # Часовой пояс правил: в нем движок расчета определяет время суток,
+    # день недели и день года для условий по моменту корзины
+    TIMEZONE = "Europe/Kyiv"
+
+    # Схема хранения правил: 'normalized' (таблицы условий и результатов)
+    # или 'json' (группы условий и результаты JSON-строками в discount_rules)
+    LAYOUT = "normalized"
+
+    # API Endpoints
+    ENDPOINTS = {
+        'login': '/api/login',
+        'discount_rules': '/discountRule/list',
+        'sku_sets': '/skuSet/list',
+        'sku_set_details': '/skuSet/get',
+        'locations': '/location/list',
+        'merchants': '/merchant/list',
+        'terminals': '/terminal/list'
+    }
+
+    # HTTP клиент: пул соединений (keep-alive переиспользует TLS-сессии между
+    # запросами), кеш DNS и сжатие ответов (Accept-Encoding)
+    HTTP_POOL_LIMIT = 64
+    HTTP_POOL_LIMIT_PER_HOST = 32
+    HTTP_KEEPALIVE_TIMEOUT = 30
+    HTTP_DNS_CACHE_TTL = 300
+    HTTP_COMPRESSION = True
+    
+    # Таймауты запроса (секунды) и повторы с экспоненциальной задержкой и jitter
+    # для 429/5xx, таймаутов, обрывов соединения и неполного JSON
+    HTTP_TIMEOUT = 60
+    HTTP_CONNECT_TIMEOUT = 10
+    RETRY_ATTEMPTS = 6
+    RETRY_BACKOFF_BASE = 0.5
+    RETRY_BACKOFF_MAX = 30
+    
+    # Адаптивное ограничение частоты запросов (запросов в секунду): скорость
+    # растет, пока сервер отвечает нормально, и падает вдвое на 429/5xx
+    RATE_LIMIT = True
+    RATE_LIMIT_INITIAL = 50
+    RATE_LIMIT_MIN = 1
+    RATE_LIMIT_MAX = 1000
+    RATE_LIMIT_BURST = 16
+    
+    # Pagination
+    BATCH_SIZE = 100
+
+    # Параллельная загрузка страниц: после первой страницы остальные
+    # offset запрашиваются одновременно (не более FETCH_CONCURRENCY запросов)
+    CONCURRENT_PAGING = True
+    FETCH_CONCURRENCY = 8
+
+    # Параллельная загрузка деталей SKU set (/skuSet/get): число воркеров
+    # и размер очереди между воркерами и записью в SQLite
+    SKU_DETAILS_CONCURRENCY = 16
+    SKU_DETAILS_QUEUE_SIZE = 64
+
+    # Инкрементальная синхронизация: перезаписываются только записи,
+    # у которых изменился хеш содержимого (хранится в sync_hashes)
+    INCREMENTAL_SYNC = True
+
+    # Размер очередей между стадиями конвейера (в страницах по BATCH_SIZE)
+    PIPELINE_QUEUE_SIZE = 4
+    
+    # Возобновляемая синхронизация: страницы API сначала сохраняются в staging
+    # (sync_staging_* в той же БД), прерванный запуск продолжается с недостающих
+    # страниц, а публикация в рабочие таблицы идет одной транзакцией.
+    # Сохраненное старше STAGING_MAX_AGE_HOURS загружается заново.
+    RESUMABLE_SYNC = True
+    STAGING_MAX_AGE_HOURS = 12
+
+    # Запись ответов API в каталог (RECORD_DIR) и загрузка из записанных
+    # ответов без сети (REPLAY_DIR) - для замеров и повторных прогонов
+    RECORD_DIR = None
+    REPLAY_DIR = None
+
+    # Метрики запуска (время запросов и стадий, объем ответов, команды SQLite):
+    # файл *.json - JSON, иначе текстовый формат Prometheus; None - не выгружать.
+    # METRICS_SQL_TRACE - счетчик команд SQLite по типам через trace callback
+    # (вызов Python на каждую строку executemany, замедляет запись примерно на треть)
+    METRICS_FILE = None
+    METRICS_SQL_TRACE = False
+
+    # Логирование
+    LOG_FILE = "discount_rules_etl.log"
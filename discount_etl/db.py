@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+"""
+Работа с SQLite: подключение, общая схема, справочники маппинга, хеши синхронизации
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+import aiosqlite
+
+from .mappings import MappingLoader
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteManager:
+    """Менеджер для работы с SQLite базой данных"""
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn: Optional[aiosqlite.Connection] = None
+    
+    async def connect(self):
+        """Открытие соединения с БД"""
+        self.conn = await aiosqlite.connect(self.db_path)
+        self.conn.row_factory = aiosqlite.Row
+        await self.conn.execute("PRAGMA foreign_keys = OFF")
+        await self.conn.execute("PRAGMA journal_mode = WAL")
+        await self.conn.commit()
+        logger.info(f"Подключено к БД: {self.db_path}")
+    
+    async def enable_foreign_keys(self):
+        """Включение проверки внешних ключей после загрузки"""
+        await self.conn.execute("PRAGMA foreign_keys = ON")
+        await self.conn.commit()
+        logger.info("Внешние ключи включены")
+    
+    async def close(self):
+        """Закрытие соединения"""
+        if self.conn:
+            await self.conn.close()
+            logger.info("Соединение с БД закрыто")
+    
+    async def create_schema(self):
+        """Создание общей схемы БД (маппинги, справочники, хеши синхронизации)
+        
+        Таблицы правил создает выбранная схема хранения (см. layouts).
+        """
+        
+        # 1. Справочные таблицы маппинга (создаются первыми)
+        await self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS mapping_comparison_type (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+
+            CREATE TABLE IF NOT EXISTS mapping_discount_value_type (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            -- Справочник статусов
+            CREATE TABLE IF NOT EXISTS mapping_status (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник уровней изоляции
+            CREATE TABLE IF NOT EXISTS mapping_isolation_level (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник режимов применения
+            CREATE TABLE IF NOT EXISTS mapping_apply_mode (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник режимов планирования
+            CREATE TABLE IF NOT EXISTS mapping_scheduling_mode (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник типов данных для условий правил
+            CREATE TABLE IF NOT EXISTS mapping_data_values (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник операторов сравнения
+            CREATE TABLE IF NOT EXISTS mapping_operators (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник типов продуктовых условий
+            CREATE TABLE IF NOT EXISTS mapping_product_values (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник типов условий
+            CREATE TABLE IF NOT EXISTS mapping_cond_values (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник режимов группового применения
+            CREATE TABLE IF NOT EXISTS mapping_group_apply_mode (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник типов результатов
+            CREATE TABLE IF NOT EXISTS mapping_result_type (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            -- Справочник типов значений
+            CREATE TABLE IF NOT EXISTS mapping_value_type (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            
+            
+            -- Справочник типов времени скидки
+            CREATE TABLE IF NOT EXISTS mapping_discount_time_type (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+        """)
+        
+        # 2. Справочники торговых сетей, локаций, терминалов
+        await self.conn.executescript("""
+            -- Справочник торговых сетей
+            CREATE TABLE IF NOT EXISTS merchants (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                ext_code TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_merchants_name ON merchants(name);
+            
+            -- Справочник локаций
+            CREATE TABLE IF NOT EXISTS locations (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                merchant_id INTEGER,
+                merchant_name TEXT,
+                ext_code TEXT,
+                address TEXT,
+                FOREIGN KEY (merchant_id) REFERENCES merchants(id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_locations_name ON locations(name);
+            CREATE INDEX IF NOT EXISTS idx_locations_merchant ON locations(merchant_id);
+            
+            -- Справочник терминалов
+            CREATE TABLE IF NOT EXISTS terminals (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                location_id INTEGER,
+                ext_code TEXT,
+                FOREIGN KEY (location_id) REFERENCES locations(id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_terminals_name ON terminals(name);
+            CREATE INDEX IF NOT EXISTS idx_terminals_location ON terminals(location_id);
+            
+            -- Справочник наборов товаров
+            CREATE TABLE IF NOT EXISTS sku_sets (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                ext_code TEXT,
+                skus TEXT,
+                removed INTEGER DEFAULT 0,
+                only_product INTEGER DEFAULT 0,
+                only_fuel INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_sku_sets_name ON sku_sets(name);
+        """)
+        
+        # У sku_sets из старых p.py и p2.py вместо skus была pos_name. Справочник
+        # перезаписывается при каждой загрузке, поэтому достаточно добавить колонку
+        if 'skus' not in await self.get_columns('sku_sets'):
+            await self.conn.execute("ALTER TABLE sku_sets ADD COLUMN skus TEXT")
+        
+        # 3. Хеши содержимого для инкрементальной синхронизации
+        await self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sync_hashes (
+                entity TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (entity, id)
+            ) WITHOUT ROWID;
+        """)
+        
+        # 4. Состав наборов товаров: по строке на (набор, SKU), обратный индекс по SKU
+        async with self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sku_set_items'"
+        ) as cursor:
+            items_table_exists = await cursor.fetchone() is not None
+        
+        await self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sku_set_items (
+                sku_set_id INTEGER NOT NULL,
+                sku_id INTEGER NOT NULL,
+                PRIMARY KEY (sku_set_id, sku_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_sku_set_items_sku ON sku_set_items(sku_id, sku_set_id);
+        """)
+        
+        if not items_table_exists:
+            # БД, созданная до появления sku_set_items: заполняем из JSON-колонки skus,
+            # иначе инкрементальная синхронизация не перезапишет неизменные наборы.
+            # У БД старых p.py и p2.py колонка skus добавлена выше и пуста - они
+            # получат состав наборов при загрузке
+            await self.conn.execute("""
+                INSERT OR IGNORE INTO sku_set_items (sku_set_id, sku_id)
+                SELECT s.id, j.value FROM sku_sets s, json_each(s.skus) j
+                WHERE s.skus IS NOT NULL
+            """)
+        
+        # 5. Периоды действия правил в миллисекундах Unix (для любой схемы хранения)
+        async with self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rule_time_windows'"
+        ) as cursor:
+            windows_table_exists = await cursor.fetchone() is not None
+        
+        await self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS rule_time_windows (
+                rule_id INTEGER PRIMARY KEY,
+                status INTEGER,
+                begin_ts INTEGER,
+                end_ts INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_rule_time_windows_begin ON rule_time_windows(status, begin_ts);
+            CREATE INDEX IF NOT EXISTS idx_rule_time_windows_end ON rule_time_windows(status, end_ts);
+        """)
+        
+        if not windows_table_exists:
+            # Для БД, созданной раньше, периоды заполнятся при следующей синхронизации:
+            # сбрасываем хеши правил, чтобы все правила переписались
+            await self.clear_hashes('discount_rules')
+        
+        # 6. Сводка для отчета: пересчитывается в транзакции загрузки (refresh_summary),
+        # отчет читает несколько строк вместо подсчета по всем таблицам
+        await self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS report_table_counts (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            
+            CREATE TABLE IF NOT EXISTS report_status_counts (
+                status INTEGER PRIMARY KEY,
+                rule_count INTEGER NOT NULL
+            );
+            
+            CREATE TABLE IF NOT EXISTS report_sku_set_usage (
+                sku_set_id INTEGER PRIMARY KEY,
+                usage_count INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_report_sku_set_usage_count ON report_sku_set_usage(usage_count);
+            
+            -- Id запуска ETL, последним изменившего таблицу (ключ кеша разделов отчета)
+            CREATE TABLE IF NOT EXISTS report_table_versions (
+                table_name TEXT PRIMARY KEY,
+                sync_run_id INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        
+        await self.conn.commit()
+        logger.info("Общая схема БД создана")
+    
+    async def load_mapping_tables(self):
+        """Загрузка справочных таблиц маппинга"""
+        mappings = MappingLoader.get_mappings()
+        
+        for table_suffix, data in mappings.items():
+            table_name = f"mapping_{table_suffix}"
+            
+            # Очистка таблицы
+            await self.conn.execute(f"DELETE FROM {table_name}")
+            
+            # Вставка данных
+            await self.conn.executemany(
+                f"INSERT OR REPLACE INTO {table_name} (id, name) VALUES (?, ?)",
+                list(data.items())
+            )
+            
+            logger.debug(f"Загружено {len(data)} записей в {table_name}")
+        
+        await self.conn.commit()
+    
+    async def get_columns(self, table_name: str) -> List[str]:
+        """Колонки таблицы (пустой список, если таблицы нет)"""
+        async with self.conn.execute(f"PRAGMA table_info({table_name})") as cursor:
+            return [row[1] async for row in cursor]
+    
+    async def get_hashes(self, entity: str) -> Dict[int, str]:
+        """Сохраненные хеши содержимого для сущности"""
+        async with self.conn.execute(
+            "SELECT id, content_hash FROM sync_hashes WHERE entity = ?", (entity,)
+        ) as cursor:
+            return {row[0]: row[1] async for row in cursor}
+    
+    async def get_ids(self, table_name: str) -> set:
+        """Множество id, которые сейчас есть в таблице"""
+        async with self.conn.execute(f"SELECT id FROM {table_name}") as cursor:
+            return {row[0] async for row in cursor}
+    
+    async def save_hashes(self, entity: str, hashes: Dict[int, str], removed_ids=()):
+        """Запись хешей измененных записей и удаление хешей удаленных (без commit)"""
+        await self.conn.executemany(
+            "INSERT OR REPLACE INTO sync_hashes (entity, id, content_hash) VALUES (?, ?, ?)",
+            [(entity, id_val, hash_val) for id_val, hash_val in hashes.items()]
+        )
+        await self.conn.executemany(
+            "DELETE FROM sync_hashes WHERE entity = ? AND id = ?",
+            [(entity, id_val) for id_val in removed_ids]
+        )
+    
+    async def save_sku_set_items(self, sku_set_id: int, skus: List[int]):
+        """Замена состава набора товаров (без commit)"""
+        await self.conn.execute("DELETE FROM sku_set_items WHERE sku_set_id = ?", (sku_set_id,))
+        await self.conn.executemany(
+            "INSERT OR IGNORE INTO sku_set_items (sku_set_id, sku_id) VALUES (?, ?)",
+            [(sku_set_id, sku_id) for sku_id in skus]
+        )
+    
+    async def delete_sku_set_items(self, sku_set_ids):
+        """Удаление состава удаленных наборов (без commit)"""
+        await self.conn.executemany(
+            "DELETE FROM sku_set_items WHERE sku_set_id = ?", [(id_val,) for id_val in sku_set_ids]
+        )
+    
+    async def get_sku_sets_containing(self, sku_id: int) -> List[int]:
+        """Id наборов, в которые входит SKU (по индексу idx_sku_set_items_sku)"""
+        async with self.conn.execute(
+            "SELECT sku_set_id FROM sku_set_items WHERE sku_id = ? ORDER BY sku_set_id", (sku_id,)
+        ) as cursor:
+            return [row[0] async for row in cursor]
+    
+    async def save_time_windows(self, rows: List[tuple], removed_ids=()):
+        """Запись периодов (rule_id, status, begin_ts, end_ts) и удаление периодов удаленных правил (без commit)"""
+        await self.conn.executemany(
+            "INSERT OR REPLACE INTO rule_time_windows (rule_id, status, begin_ts, end_ts) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        await self.conn.executemany(
+            "DELETE FROM rule_time_windows WHERE rule_id = ?", [(id_val,) for id_val in removed_ids]
+        )
+    
+    async def refresh_summary(self, table_names, sku_set_usage_sql: str, changed_tables=(), sync_run_id: int = 0):
+        """Пересчет сводки для отчета (без commit, в транзакции загрузки)
+        
+        Число строк таблиц, правил по статусам (по rule_time_windows, там статус
+        кодом для любой схемы) и результатов правил по наборам товаров.
+        Для changed_tables в report_table_versions записывается sync_run_id.
+        """
+        await self.conn.executemany(
+            "INSERT OR REPLACE INTO report_table_versions (table_name, sync_run_id) VALUES (?, ?)",
+            [(table_name, sync_run_id) for table_name in sorted(changed_tables)]
+        )
+        
+        await self.conn.execute("DELETE FROM report_table_counts")
+        for table_name in table_names:
+            await self.conn.execute(
+                f"INSERT INTO report_table_counts (table_name, row_count) SELECT ?, COUNT(*) FROM {table_name}",
+                (table_name,)
+            )
+        
+        await self.conn.execute("DELETE FROM report_status_counts")
+        await self.conn.execute("""
+            INSERT INTO report_status_counts (status, rule_count)
+            SELECT status, COUNT(*) FROM rule_time_windows
+            WHERE status IS NOT NULL
+            GROUP BY status
+        """)
+        
+        await self.conn.execute("DELETE FROM report_sku_set_usage")
+        if sku_set_usage_sql:
+            await self.conn.execute(
+                f"INSERT INTO report_sku_set_usage (sku_set_id, usage_count) {sku_set_usage_sql}"
+            )
+    
+    async def clear_hashes(self, entity: str):
+        """Удаление всех хешей сущности (полная перезагрузка, без commit)"""
+        await self.conn.execute("DELETE FROM sync_hashes WHERE entity = ?", (entity,))
@@ -0,0 +1,671 @@
+# -*- coding: utf-8 -*-
+"""
+Движок расчета скидок по локальной БД (нормализованная схема)
+
+Правила загружаются из SQLite один раз и компилируются в кортежи условий,
+после чего расчет корзины идет только в памяти:
+
+    engine = RuleEngine.from_db("discount_rules.db")
+    result = engine.evaluate(Basket(terminal_id=15, items=[BasketItem(101, 2, 35.5)]))
+    ...
+    engine.refresh()  # после очередной синхронизации: только изменения
+
+Принятые допущения о семантике правил:
+- правило действует, если status = 1 (Активно) и момент корзины попадает
+  в [begin_date, end_date] (миллисекунды, пустая граница - без ограничения);
+- время суток, день недели и день года берутся в часовом поясе движка
+  (Config.TIMEZONE, по умолчанию Europe/Kyiv), а не в UTC;
+- условия rule_conditions и order_conditions объединяются по И: ETL хранит
+  только requiredConditions групп, min_match_count к ним не относится;
+- условие по атрибуту, которого нет в корзине, не выполнено (кроме != и NOT IN);
+- результат со шкалой (result_type != 9) применяется, если метрика корзины
+  удовлетворяет comparison_type/value; из нескольких подходящих шкал одного
+  правила берется дающая наибольшую скидку;
+- правила перебираются по убыванию priority; правило с isolation_level
+  "Ізольований" применяется только если до него ничего не применено и
+  останавливает перебор, "Високий" останавливает перебор всегда;
+- apply_mode "Застосувати кращу" оставляет лучший результат правила,
+  остальные режимы применяют все подходящие результаты.
+"""
+
+import json
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+import pytz
+
+from .config import Config
+from .rule_index import (
+    COND_LOCATION, COND_MERCHANT, COND_TERMINAL, COND_TERMINAL_GROUP, RuleIndex
+)
+from .sku_index import SkuSetIndex
+from .time_index import TimeWindowIndex
+
+# Коды mapping_data_values, которые вычисляются из момента корзины
+COND_DAY_OF_YEAR = 8
+COND_WEEKDAY = 10
+COND_TIME = 11
+
+# Коды mapping_product_values (условия на чек)
+ORDER_TOTAL_QUANTITY = 1
+ORDER_POSITIONS = 2
+ORDER_SKU_PRESENT = 5
+ORDER_AMOUNT_WITH_DISCOUNT_AND_BONUS = 6
+ORDER_AMOUNT_WITHOUT_DISCOUNT = 9
+ORDER_SKU_ABSENT = 15
+ORDER_AMOUNT_WITH_DISCOUNT = 19
+
+# Коды mapping_result_type
+RESULT_PLAIN = 9
+RESULT_AMOUNT = 3
+RESULT_TOTAL_QUANTITY = 4
+RESULT_POSITIONS = 5
+RESULT_AMOUNT_WITH_DISCOUNT = 10
+
+# Коды mapping_cond_values (условия внутри результата)
+ITEM_COND_EXACT_QUANTITY = 0
+ITEM_COND_MAX_QUANTITY = 1
+ITEM_COND_MAX_AMOUNT = 2
+ITEM_COND_POSITIONS = 3
+ITEM_COND_MIN_QUANTITY = 6
+
+# Коды mapping_discount_value_type
+DISCOUNT_PERCENT = 0
+DISCOUNT_CHECK_AMOUNT = 1
+DISCOUNT_PRICE_AMOUNT = 2
+
+STATUS_ACTIVE = 1
+ISOLATION_ISOLATED = 1
+ISOLATION_HIGH = 2
+APPLY_BEST = 1
+
+MISSING = object()
+
+
+class BasketItem:
+    """Позиция корзины"""
+
+    __slots__ = ('sku_id', 'quantity', 'price')
+
+    def __init__(self, sku_id: int, quantity: float, price: float):
+        self.sku_id = sku_id
+        self.quantity = quantity
+        self.price = price
+
+    @property
+    def amount(self) -> float:
+        return self.quantity * self.price
+
+
+class Basket:
+    """Корзина для расчета
+
+    attributes - значения условий карты/клиента по кодам mapping_data_values
+    (например {4: 1} - статус картки, {3: [7, 9]} - категорії картки).
+    location_id и merchant_id при отсутствии берутся из справочников по терминалу.
+    timestamp - миллисекунды Unix или datetime; по умолчанию текущий момент.
+    datetime с tzinfo переводится в часовой пояс движка, datetime без tzinfo
+    считается уже заданным в нем.
+    """
+
+    __slots__ = ('terminal_id', 'location_id', 'merchant_id', 'terminal_groups',
+                 'items', 'attributes', 'timestamp')
+
+    def __init__(self, terminal_id: Optional[int] = None, items: Iterable[BasketItem] = (),
+                 location_id: Optional[int] = None, merchant_id: Optional[int] = None,
+                 terminal_groups: Iterable[int] = (), attributes: Optional[Dict[int, Any]] = None,
+                 timestamp: Any = None):
+        self.terminal_id = terminal_id
+        self.location_id = location_id
+        self.merchant_id = merchant_id
+        self.terminal_groups = frozenset(terminal_groups)
+        self.items = list(items)
+        self.attributes = attributes or {}
+        self.timestamp = timestamp
+
+
+class AppliedDiscount:
+    """Скидка одного правила: сумма и ее разнесение по SKU"""
+
+    __slots__ = ('rule_id', 'name', 'priority', 'amount', 'lines')
+
+    def __init__(self, rule_id: int, name: str, priority: Optional[int], amount: float,
+                 lines: Dict[int, float]):
+        self.rule_id = rule_id
+        self.name = name
+        self.priority = priority
+        self.amount = amount
+        self.lines = lines
+
+    def __repr__(self):
+        return f"AppliedDiscount(rule_id={self.rule_id}, amount={self.amount:.2f})"
+
+
+class EvaluationResult:
+    """Результат расчета корзины: примененные правила в порядке приоритета"""
+
+    __slots__ = ('discounts',)
+
+    def __init__(self, discounts: List[AppliedDiscount]):
+        self.discounts = discounts
+
+    @property
+    def total(self) -> float:
+        return sum(discount.amount for discount in self.discounts)
+
+    @property
+    def rule_ids(self) -> List[int]:
+        return [discount.rule_id for discount in self.discounts]
+
+
+def parse_condition_value(value: Optional[str]) -> Any:
+    """Значение из колонки value: множество ids, число или строка"""
+    if value is None:
+        return None
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        return value
+
+    if isinstance(parsed, list):
+        return frozenset(parsed)
+    return parsed
+
+
+def _as_number(value: Any) -> Any:
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _contains(expected: Any, actual: Any) -> bool:
+    """actual (значение или множество значений) входит в expected"""
+    if isinstance(expected, frozenset):
+        if isinstance(actual, (frozenset, set, list, tuple)):
+            return not expected.isdisjoint(actual)
+        return actual in expected
+    if isinstance(actual, (frozenset, set, list, tuple)):
+        return expected in actual
+    return actual == expected or _as_number(actual) == _as_number(expected)
+
+
+def _ordered(op: int, actual: Any, expected: Any) -> bool:
+    try:
+        actual = _as_number(actual)
+        expected = _as_number(expected)
+        if op == 2:
+            return actual > expected
+        if op == 3:
+            return actual < expected
+        if op == 4:
+            return actual >= expected
+        return actual <= expected
+    except TypeError:
+        return False
+
+
+def compare_operator(op: int, actual: Any, expected: Any) -> bool:
+    """Сравнение по mapping_operators (условия правил и чека)"""
+    if actual is MISSING:
+        return op in (1, 7)
+    if op in (0, 6):
+        return _contains(expected, actual)
+    if op in (1, 7):
+        return not _contains(expected, actual)
+    if op in (2, 3, 4, 5):
+        return _ordered(op, actual, expected)
+    return False
+
+
+def compare_result(op: Optional[int], actual: Any, expected: Any) -> bool:
+    """Сравнение по mapping_comparison_type (шкалы результатов)"""
+    if op is None or op == 12:
+        return True
+    if actual is MISSING:
+        return op in (1, 9)
+    if op == 13:
+        return actual is not None
+    if op in (0, 8):
+        return _contains(expected, actual)
+    if op in (1, 9):
+        return not _contains(expected, actual)
+    if op in (2, 3, 4, 5):
+        return _ordered(op, actual, expected)
+    if op in (6, 7):
+        bounds = sorted(_as_number(v) for v in expected) if isinstance(expected, frozenset) else None
+        if not bounds:
+            return False
+        inside = bounds[0] <= _as_number(actual) <= bounds[-1]
+        return inside if op == 6 else not inside
+    return False
+
+
+class CompiledResult:
+    """Результат правила, подготовленный к расчету"""
+
+    __slots__ = ('result_type', 'comparison_type', 'value', 'value_type', 'fixed_value',
+                 'discount_value_type', 'sku_set_id', 'conditions')
+
+    def __init__(self, row: sqlite3.Row, conditions: List[tuple]):
+        self.result_type = row['result_type']
+        self.comparison_type = row['comparison_type']
+        self.value = parse_condition_value(row['value'])
+        self.value_type = row['value_type']
+        self.fixed_value = row['fixed_value']
+        self.discount_value_type = row['discount_value_type']
+        self.sku_set_id = row['sku_set_id']
+        self.conditions = conditions
+
+
+class CompiledRule:
+    """Правило, подготовленное к расчету"""
+
+    __slots__ = ('id', 'name', 'priority', 'begin_date', 'end_date', 'isolation_level',
+                 'apply_mode', 'exclude_sku_set_id', 'conditions',
+                 'order_conditions', 'results', 'sort_key')
+
+    def __init__(self, row: sqlite3.Row):
+        self.id = row['id']
+        self.name = row['name']
+        self.priority = row['priority'] or 0
+        self.begin_date = row['begin_date']
+        self.end_date = row['end_date']
+        self.isolation_level = row['isolation_level'] or 0
+        self.apply_mode = row['apply_mode'] or 0
+        self.exclude_sku_set_id = row['exclude_sku_set_id']
+        self.conditions: List[tuple] = []
+        self.order_conditions: List[tuple] = []
+        self.results: List[CompiledResult] = []
+        # Порядок перебора: по убыванию приоритета, затем по id
+        self.sort_key = (-self.priority, self.id)
+
+
+class RuleEngine:
+    """Расчет применимых скидок для корзины по правилам из локальной БД
+
+    Состояние обновляется инкрементально: refresh() сравнивает хеши из
+    sync_hashes с запомненными при прошлой загрузке и перекомпилирует
+    только измененные правила, SKU set и справочники.
+    """
+
+    # Сущности sync_hashes, которые держит движок, в порядке обновления
+    ENTITIES = ('terminals', 'locations', 'sku_sets', 'discount_rules')
+
+    def __init__(self, db_path: Optional[str] = None, timezone: Optional[str] = None):
+        self.db_path = db_path
+        # Часовой пояс условий по времени суток, дню недели и дню года
+        self.timezone = pytz.timezone(timezone or Config.TIMEZONE)
+        self.rules: Dict[int, CompiledRule] = {}
+        self.index = RuleIndex()
+        self.time_index = TimeWindowIndex()
+        self.sku_index = SkuSetIndex()
+        self.terminal_locations: Dict[int, int] = {}
+        self.location_merchants: Dict[int, int] = {}
+        # Хеши sync_hashes на момент последней загрузки: сущность -> {id: хеш}
+        self.known_hashes: Dict[str, Dict[int, str]] = {}
+
+    @classmethod
+    def from_db(cls, db_path: str, timezone: Optional[str] = None) -> 'RuleEngine':
+        """Загрузка и компиляция активных правил из БД"""
+        engine = cls(db_path, timezone)
+        engine.refresh()
+        return engine
+
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection, timezone: Optional[str] = None) -> 'RuleEngine':
+        engine = cls(timezone=timezone)
+        engine.refresh(conn)
+        return engine
+
+    def refresh(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+        """Подгрузка изменений после синхронизации
+
+        Возвращает число измененных и удаленных записей по сущностям.
+        Все чтения идут в одной транзакции, то есть из одного снимка БД.
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+
+        stats = {}
+        own_transaction = not conn.in_transaction
+        try:
+            if own_transaction:
+                conn.execute("BEGIN")
+            for entity in self.ENTITIES:
+                changed_ids, removed_ids = self._diff_hashes(conn, entity)
+                getattr(self, f"_refresh_{entity}")(conn, changed_ids, removed_ids)
+                stats[entity] = len(changed_ids) + len(removed_ids)
+        finally:
+            if own_conn:
+                conn.close()
+            elif own_transaction and conn.in_transaction:
+                conn.rollback()
+        return stats
+
+    def _diff_hashes(self, conn: sqlite3.Connection, entity: str) -> tuple:
+        hashes = {
+            row[0]: row[1]
+            for row in conn.execute("SELECT id, content_hash FROM sync_hashes WHERE entity = ?", (entity,))
+        }
+        known = self.known_hashes.get(entity, {})
+        changed_ids = [id_val for id_val, hash_val in hashes.items() if known.get(id_val) != hash_val]
+        removed_ids = [id_val for id_val in known if id_val not in hashes]
+        self.known_hashes[entity] = hashes
+        return changed_ids, removed_ids
+
+    @staticmethod
+    def _select_by_ids(conn: sqlite3.Connection, sql: str, column: str, ids: List[int], order_by: str = ""):
+        """Выборка строк по списку id одним запросом (список передается JSON-массивом)"""
+        return conn.execute(
+            f"{sql} WHERE {column} IN (SELECT value FROM json_each(?)) {order_by}", (json.dumps(ids),)
+        )
+
+    def _refresh_terminals(self, conn, changed_ids, removed_ids):
+        for id_val in removed_ids:
+            self.terminal_locations.pop(id_val, None)
+        if changed_ids:
+            for row in self._select_by_ids(conn, "SELECT id, location_id FROM terminals", "id", changed_ids):
+                self.terminal_locations[row['id']] = row['location_id']
+
+    def _refresh_locations(self, conn, changed_ids, removed_ids):
+        for id_val in removed_ids:
+            self.location_merchants.pop(id_val, None)
+        if changed_ids:
+            for row in self._select_by_ids(conn, "SELECT id, merchant_id FROM locations", "id", changed_ids):
+                self.location_merchants[row['id']] = row['merchant_id']
+
+    def _refresh_sku_sets(self, conn, changed_ids, removed_ids):
+        for id_val in [*removed_ids, *changed_ids]:
+            self.sku_index.remove(id_val)
+        if not changed_ids:
+            return
+
+        members: Dict[int, List[int]] = {}
+        for row in self._select_by_ids(
+            conn, "SELECT sku_set_id, sku_id FROM sku_set_items", "sku_set_id", changed_ids,
+            "ORDER BY sku_set_id, sku_id"
+        ):
+            members.setdefault(row['sku_set_id'], []).append(row['sku_id'])
+        for sku_set_id, skus in members.items():
+            self.sku_index.set_members(sku_set_id, skus)
+
+    def _refresh_discount_rules(self, conn, changed_ids, removed_ids):
+        for rule_id in [*removed_ids, *changed_ids]:
+            self.rules.pop(rule_id, None)
+            self.index.remove(rule_id)
+            self.time_index.remove(rule_id)
+
+        if not changed_ids:
+            return
+        for rule in self._compile_rules(conn, changed_ids).values():
+            self.rules[rule.id] = rule
+            self.index.add(rule.id, rule.conditions)
+            self.time_index.add(rule.id, rule.begin_date, rule.end_date)
+
+    def _compile_rules(self, conn: sqlite3.Connection, rule_ids: List[int]) -> Dict[int, CompiledRule]:
+        """Компиляция активных правил из списка id со всеми дочерними строками"""
+        rules: Dict[int, CompiledRule] = {}
+        for row in self._select_by_ids(conn, "SELECT * FROM discount_rules", "id", rule_ids):
+            if row['status'] == STATUS_ACTIVE:
+                rules[row['id']] = CompiledRule(row)
+        rule_ids = list(rules)
+        if not rule_ids:
+            return rules
+
+        for row in self._select_by_ids(
+            conn, "SELECT discount_rule_id, condition_type, comparison_type, value FROM rule_conditions",
+            "discount_rule_id", rule_ids
+        ):
+            rules[row['discount_rule_id']].conditions.append(
+                (row['condition_type'], row['comparison_type'], parse_condition_value(row['value']))
+            )
+
+        for row in self._select_by_ids(
+            conn, "SELECT discount_rule_id, condition_type, comparison_type, value FROM order_conditions",
+            "discount_rule_id", rule_ids
+        ):
+            rules[row['discount_rule_id']].order_conditions.append(
+                (row['condition_type'], row['comparison_type'], parse_condition_value(row['value']))
+            )
+
+        item_conditions: Dict[int, List[tuple]] = {}
+        for row in self._select_by_ids(
+            conn,
+            """SELECT c.result_item_id, c.condition_type, c.value
+               FROM result_item_conditions c JOIN result_items r ON r.id = c.result_item_id""",
+            "r.discount_rule_id", rule_ids
+        ):
+            item_conditions.setdefault(row['result_item_id'], []).append(
+                (row['condition_type'], parse_condition_value(row['value']))
+            )
+
+        for row in self._select_by_ids(conn, "SELECT * FROM result_items", "discount_rule_id", rule_ids,
+                                      "ORDER BY id"):
+            rules[row['discount_rule_id']].results.append(
+                CompiledResult(row, item_conditions.get(row['id'], []))
+            )
+
+        return rules
+
+    # ------------------------------------------------------------------ #
+    # Расчет
+
+    def _timestamp_ms(self, timestamp: Any) -> int:
+        if timestamp is None:
+            return int(time.time() * 1000)
+        if isinstance(timestamp, datetime):
+            if timestamp.tzinfo is None:
+                timestamp = self.timezone.localize(timestamp)
+            return int(timestamp.timestamp() * 1000)
+        return int(timestamp)
+
+    def _context(self, basket: Basket, timestamp_ms: int) -> Dict[int, Any]:
+        """Значения условий правил для корзины по кодам mapping_data_values"""
+        location_id = basket.location_id
+        if location_id is None and basket.terminal_id is not None:
+            location_id = self.terminal_locations.get(basket.terminal_id)
+        merchant_id = basket.merchant_id
+        if merchant_id is None and location_id is not None:
+            merchant_id = self.location_merchants.get(location_id)
+
+        moment = datetime.fromtimestamp(timestamp_ms / 1000, tz=self.timezone)
+        context = {
+            COND_DAY_OF_YEAR: moment.timetuple().tm_yday,
+            COND_WEEKDAY: moment.isoweekday(),
+            COND_TIME: moment.hour * 60 + moment.minute,
+        }
+        if basket.terminal_id is not None:
+            context[COND_TERMINAL] = basket.terminal_id
+        if location_id is not None:
+            context[COND_LOCATION] = location_id
+        if merchant_id is not None:
+            context[COND_MERCHANT] = merchant_id
+        if basket.terminal_groups:
+            context[COND_TERMINAL_GROUP] = basket.terminal_groups
+        context.update(basket.attributes)
+        return context
+
+    @staticmethod
+    def _order_metrics(items: List[BasketItem]) -> Dict[int, Any]:
+        amount = sum(item.amount for item in items)
+        return {
+            ORDER_TOTAL_QUANTITY: sum(item.quantity for item in items),
+            ORDER_POSITIONS: len(items),
+            ORDER_AMOUNT_WITH_DISCOUNT_AND_BONUS: amount,
+            ORDER_AMOUNT_WITHOUT_DISCOUNT: amount,
+            ORDER_AMOUNT_WITH_DISCOUNT: amount,
+        }
+
+    @staticmethod
+    def _conditions_match(conditions: List[tuple], values: Dict[int, Any]) -> bool:
+        for condition_type, op, expected in conditions:
+            if not compare_operator(op, values.get(condition_type, MISSING), expected):
+                return False
+        return True
+
+    @staticmethod
+    def _order_conditions_match(conditions: List[tuple], metrics: Dict[int, Any], skus: FrozenSet[int]) -> bool:
+        for condition_type, op, expected in conditions:
+            if condition_type in (ORDER_SKU_PRESENT, ORDER_SKU_ABSENT):
+                present = _contains(expected, skus) if expected is not None else bool(skus)
+                if present != (condition_type == ORDER_SKU_PRESENT):
+                    return False
+            elif not compare_operator(op, metrics.get(condition_type, MISSING), expected):
+                return False
+        return True
+
+    @staticmethod
+    def _result_metric(result_type: int, lines: List[BasketItem]) -> Any:
+        if result_type in (RESULT_AMOUNT, RESULT_AMOUNT_WITH_DISCOUNT):
+            return sum(item.amount for item in lines)
+        if result_type == RESULT_TOTAL_QUANTITY:
+            return sum(item.quantity for item in lines)
+        if result_type == RESULT_POSITIONS:
+            return len(lines)
+        return MISSING
+
+    @staticmethod
+    def _item_conditions_match(conditions: List[tuple], lines: List[BasketItem]) -> bool:
+        for condition_type, expected in conditions:
+            expected = _as_number(expected)
+            if not isinstance(expected, (int, float)):
+                continue
+            if condition_type == ITEM_COND_MIN_QUANTITY:
+                if sum(item.quantity for item in lines) < expected:
+                    return False
+            elif condition_type == ITEM_COND_MAX_QUANTITY:
+                if sum(item.quantity for item in lines) > expected:
+                    return False
+            elif condition_type == ITEM_COND_MAX_AMOUNT:
+                if sum(item.amount for item in lines) > expected:
+                    return False
+            elif condition_type == ITEM_COND_EXACT_QUANTITY:
+                if any(item.quantity != expected for item in lines):
+                    return False
+            elif condition_type == ITEM_COND_POSITIONS:
+                if len(lines) < expected:
+                    return False
+        return True
+
+    def _apply_result(self, result: CompiledResult, lines: List[BasketItem],
+                      remaining: Dict[int, float]) -> Dict[int, float]:
+        """Скидка результата по позициям (с учетом уже примененных скидок)"""
+        if result.value_type not in (None, 0) or result.fixed_value is None:
+            return {}
+
+        value = result.fixed_value
+        discounts: Dict[int, float] = {}
+        if result.discount_value_type in (None, DISCOUNT_PERCENT):
+            for item in lines:
+                discounts[item.sku_id] = discounts.get(item.sku_id, 0.0) + item.amount * value / 100
+        elif result.discount_value_type == DISCOUNT_PRICE_AMOUNT:
+            for item in lines:
+                discounts[item.sku_id] = discounts.get(item.sku_id, 0.0) + item.quantity * min(value, item.price)
+        elif result.discount_value_type == DISCOUNT_CHECK_AMOUNT:
+            total = sum(item.amount for item in lines)
+            if total > 0:
+                for item in lines:
+                    discounts[item.sku_id] = discounts.get(item.sku_id, 0.0) + value * item.amount / total
+        else:
+            return {}
+
+        # Скидка не может превышать остаток суммы позиции
+        return {
+            sku_id: min(amount, remaining.get(sku_id, 0.0))
+            for sku_id, amount in discounts.items()
+            if remaining.get(sku_id, 0.0) > 0
+        }
+
+    def active_rules(self, timestamp_ms: Optional[int] = None) -> List[CompiledRule]:
+        """Правила, действующие в момент timestamp_ms (по умолчанию сейчас), по приоритету"""
+        active = self.time_index.active_at(self._timestamp_ms(timestamp_ms))
+        return sorted((self.rules[rule_id] for rule_id in active), key=lambda rule: rule.sort_key)
+
+    def upcoming_events(self, hours: float = 24, now: Any = None) -> List[tuple]:
+        """Начала и окончания действия правил в ближайшие hours часов"""
+        return self.time_index.upcoming_events(self._timestamp_ms(now), hours)
+
+    def candidate_rules(self, context: Dict[int, Any], timestamp_ms: int) -> List[CompiledRule]:
+        """Правила для проверки в порядке приоритета: кандидаты по точке,
+        действующие в момент корзины"""
+        rules = self.rules
+        candidates = self.index.candidates(context) & self.time_index.active_at(timestamp_ms)
+        return sorted((rules[rule_id] for rule_id in candidates), key=lambda rule: rule.sort_key)
+
+    def evaluate(self, basket: Basket) -> EvaluationResult:
+        """Применимые правила и рассчитанные скидки в порядке приоритета"""
+        timestamp_ms = self._timestamp_ms(basket.timestamp)
+        context = self._context(basket, timestamp_ms)
+        metrics = self._order_metrics(basket.items)
+        skus = frozenset(item.sku_id for item in basket.items)
+        # Наборы каждой позиции: дальше принадлежность проверяется за O(1)
+        sku_sets = {sku_id: self.sku_index.sets_containing(sku_id) for sku_id in skus}
+
+        remaining: Dict[int, float] = {}
+        for item in basket.items:
+            remaining[item.sku_id] = remaining.get(item.sku_id, 0.0) + item.amount
+
+        applied: List[AppliedDiscount] = []
+        for rule in self.candidate_rules(context, timestamp_ms):
+            if rule.isolation_level == ISOLATION_ISOLATED and applied:
+                continue
+            if not self._conditions_match(rule.conditions, context):
+                continue
+            if not self._order_conditions_match(rule.order_conditions, metrics, skus):
+                continue
+
+            items = basket.items
+            if rule.exclude_sku_set_id is not None:
+                excluded = rule.exclude_sku_set_id
+                items = [item for item in items if excluded not in sku_sets[item.sku_id]]
+
+            plain: List[Dict[int, float]] = []
+            best_scale: Dict[int, float] = {}
+            for result in rule.results:
+                if result.sku_set_id is None:
+                    lines = items
+                else:
+                    sku_set_id = result.sku_set_id
+                    lines = [item for item in items if sku_set_id in sku_sets[item.sku_id]]
+                if not lines or not self._item_conditions_match(result.conditions, lines):
+                    continue
+                if result.result_type != RESULT_PLAIN and not compare_result(
+                    result.comparison_type, self._result_metric(result.result_type, lines), result.value
+                ):
+                    continue
+
+                line_discounts = self._apply_result(result, lines, remaining)
+                if not line_discounts:
+                    continue
+                if result.result_type == RESULT_PLAIN:
+                    plain.append(line_discounts)
+                elif sum(line_discounts.values()) > sum(best_scale.values()):
+                    best_scale = line_discounts
+
+            outcomes = plain + ([best_scale] if best_scale else [])
+            if not outcomes:
+                continue
+            if rule.apply_mode == APPLY_BEST:
+                outcomes = [max(outcomes, key=lambda lines: sum(lines.values()))]
+
+            rule_lines: Dict[int, float] = {}
+            for line_discounts in outcomes:
+                for sku_id, amount in line_discounts.items():
+                    amount = min(amount, remaining[sku_id])
+                    remaining[sku_id] -= amount
+                    rule_lines[sku_id] = rule_lines.get(sku_id, 0.0) + amount
+
+            applied.append(AppliedDiscount(
+                rule.id, rule.name, rule.priority, sum(rule_lines.values()), rule_lines
+            ))
+            if rule.isolation_level in (ISOLATION_ISOLATED, ISOLATION_HIGH):
+                break
+
+        return EvaluationResult(applied)
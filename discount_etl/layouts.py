@@ -0,0 +1,728 @@
+# -*- coding: utf-8 -*-
+"""
+Схемы хранения правил скидок
+
+Общая часть конвейера (загрузка страниц, хеши, очереди) одна для всех схем;
+схема отвечает только за таблицы правил: создание, преобразование правила
+в строки и пакетную запись через executemany.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+import aiosqlite
+
+from .codec import int_values
+from .mappings import MappingLoader
+from .processing import DataProcessor
+
+
+class RuleLayout:
+    """Базовый класс схемы хранения правил
+    
+    SQL схемы пишется с обычными именами таблиц; экземпляр с shadow=True
+    подставляет к именам из TABLES суффикс SHADOW_SUFFIX. Полная перезагрузка
+    пишет в теневые таблицы без индексов, а publish_shadow одной транзакцией
+    строит индексы и подменяет ими рабочие таблицы.
+    """
+    
+    name = ''
+    # Колонка discount_rules, по которой узнается схема уже созданной БД
+    MARKER_COLUMN = ''
+    # Колонки, обязательные в уже существующих таблицах правил: без них запись
+    # упала бы на середине загрузки, после commit части справочников
+    REQUIRED_COLUMNS: Dict[str, tuple] = {}
+    # Таблицы правил в порядке удаления (дочерние первыми)
+    TABLES = ('discount_rules',)
+    # CREATE TABLE и CREATE INDEX таблиц правил
+    SCHEMA_SQL = ''
+    INDEX_SQL = ''
+    # (sku_set_id, число результатов правил с этим набором) для report_sku_set_usage
+    SKU_SET_USAGE_SQL = ''
+    
+    SHADOW_SUFFIX = '__shadow'
+    
+    def __init__(self, conn: aiosqlite.Connection, shadow: bool = False):
+        self.conn = conn
+        self.suffix = self.SHADOW_SUFFIX if shadow else ''
+        self._table_pattern = re.compile(r'\b(' + '|'.join(self.TABLES) + r')\b')
+        self._reset()
+    
+    def _sql(self, sql: str) -> str:
+        """SQL с именами таблиц этого экземпляра (теневыми при shadow=True)"""
+        if not self.suffix:
+            return sql
+        return self._table_pattern.sub(lambda match: match.group(1) + self.suffix, sql)
+    
+    @staticmethod
+    def _statements(script: str) -> List[str]:
+        return [statement.strip() for statement in script.split(';') if statement.strip()]
+    
+    def _reset(self):
+        self.rules: List[tuple] = []
+    
+    def __len__(self):
+        return len(self.rules)
+    
+    async def create_schema(self):
+        """Создание таблиц правил с индексами"""
+        await self.conn.executescript(self.SCHEMA_SQL)
+        await self.conn.executescript(self.INDEX_SQL)
+        await self.conn.commit()
+    
+    async def create_shadow(self):
+        """Пустые теневые таблицы без индексов (остатки прерванного запуска удаляются)
+        
+        Без commit: при атомарной публикации создание откатывается вместе с ней.
+        """
+        if not self.conn.in_transaction:
+            await self.conn.execute("BEGIN")
+        await self.drop_shadow()
+        for statement in self._statements(self.SCHEMA_SQL):
+            await self.conn.execute(self._sql(statement))
+    
+    async def drop_shadow(self):
+        """Удаление теневых таблиц (без commit)"""
+        for table_name in self.TABLES:
+            await self.conn.execute(f"DROP TABLE IF EXISTS {table_name}{self.SHADOW_SUFFIX}")
+    
+    async def publish_shadow(self):
+        """Подмена рабочих таблиц теневыми (без commit, в транзакции вызывающего)
+        
+        Рабочие таблицы удаляются вместе с индексами, индексы строятся на
+        заполненных теневых таблицах, затем те переименовываются. Ссылки
+        FOREIGN KEY между таблицами правил SQLite переписывает при RENAME.
+        """
+        # DDL не открывает транзакцию неявно: без BEGIN каждая команда фиксировалась бы сразу
+        if not self.conn.in_transaction:
+            await self.conn.execute("BEGIN")
+        for table_name in self.TABLES:
+            await self.conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+        for statement in self._statements(self.INDEX_SQL):
+            await self.conn.execute(self._sql(statement))
+        for table_name in self.TABLES:
+            await self.conn.execute(
+                f"ALTER TABLE {table_name}{self.SHADOW_SUFFIX} RENAME TO {table_name}"
+            )
+    
+    async def _columns(self, table_name: str) -> List[str]:
+        async with self.conn.execute(f"PRAGMA table_info({table_name})") as cursor:
+            return [row[1] async for row in cursor]
+    
+    async def check_schema(self):
+        """Проверка до любой записи, что таблицы правил в БД созданы этой же схемой"""
+        columns = await self._columns('discount_rules')
+        if columns and self.MARKER_COLUMN not in columns:
+            raise RuntimeError(
+                f"Таблица discount_rules создана другой схемой хранения, "
+                f"ожидалась '{self.name}'. Укажите другой файл БД."
+            )
+        
+        for table_name, required in self.REQUIRED_COLUMNS.items():
+            columns = await self._columns(table_name)
+            missing = [column for column in required if column not in columns]
+            if columns and missing:
+                raise RuntimeError(
+                    f"Таблица {table_name} создана другой схемой хранения (нет колонок: {', '.join(missing)}), "
+                    f"ожидалась '{self.name}'. Укажите другой файл БД."
+                )
+    
+    async def prepare(self):
+        """Подготовка перед add_rule (например, следующий свободный id)"""
+    
+    def add_rule(self, rule: Dict):
+        raise NotImplementedError
+    
+    def take_batch(self) -> Dict[str, List[tuple]]:
+        raise NotImplementedError
+    
+    async def write_batch(self, batch: Dict[str, List[tuple]]):
+        raise NotImplementedError
+    
+    async def delete_rule_children(self, rule_ids):
+        """Удаление дочерних строк правил без commit (если они есть у схемы)"""
+    
+    async def delete_rules(self, rule_ids):
+        """Удаление правил вместе с дочерними строками без commit"""
+        await self.delete_rule_children(rule_ids)
+        await self.conn.executemany(
+            self._sql("DELETE FROM discount_rules WHERE id = ?"), [(rule_id,) for rule_id in rule_ids]
+        )
+
+
+class NormalizedLayout(RuleLayout):
+    """Нормализованная схема: discount_rules + условия и результаты отдельными таблицами
+    
+    Строки всех таблиц копятся в памяти по страницам правил и сбрасываются
+    через executemany в одной транзакции. id для rule_conditions и
+    result_items назначаются заранее, поэтому дочерние строки не требуют
+    lastrowid.
+    
+    Целые значения условий применения (id терминалов, магазинов, групп и т.п.
+    из rule_conditions.value) дублируются строками rule_condition_values,
+    так что "какие правила нацелены на магазин X" - поиск по индексу, без
+    разбора JSON. Значения order_conditions и result_item_conditions -
+    одиночные числа, отдельная таблица для них не нужна.
+    """
+    
+    name = 'normalized'
+    MARKER_COLUMN = 'min_match_count'
+    # БД старого p2.py проходит проверку MARKER_COLUMN, но в ее result_items нет value
+    REQUIRED_COLUMNS = {'result_items': ('value',)}
+    TABLES = ('rule_condition_values', 'result_item_conditions', 'result_items', 'order_conditions',
+              'rule_conditions', 'discount_rules')
+    
+    RULE_SQL = """INSERT OR REPLACE INTO discount_rules (
+                id, name, comment, pos_message, description, operator_message,
+                operator_id, operator_id_desc, begin_date, end_date, status, priority,
+                isolation_level, apply_mode, only_message_mode, scheduling_mode,
+                is_for_dc_gen, exclude_sku_set_id, exclude_sku_set_id_desc,
+                ext_code, min_match_count
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+    
+    RULE_CONDITION_SQL = """INSERT INTO rule_conditions 
+               (id, discount_rule_id, condition_type, comparison_type, value, group_name)
+               VALUES (?, ?, ?, ?, ?, ?)"""
+    
+    RULE_CONDITION_VALUE_SQL = """INSERT OR IGNORE INTO rule_condition_values
+               (discount_rule_id, condition_id, condition_type, int_value)
+               VALUES (?, ?, ?, ?)"""
+    
+    ORDER_CONDITION_SQL = """INSERT INTO order_conditions 
+               (discount_rule_id, condition_type, comparison_type, value, group_name)
+               VALUES (?, ?, ?, ?, ?)"""
+    
+    RESULT_ITEM_SQL = """INSERT INTO result_items (
+                id, discount_rule_id, result_type, comparison_type, value,
+                value_type, fixed_value, expression, discount_value_type,
+                discount_time_type, sku_set_id, group_apply_mode, sort_items_mode
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+    
+    RESULT_ITEM_CONDITION_SQL = """INSERT INTO result_item_conditions 
+               (result_item_id, condition_type, value)
+               VALUES (?, ?, ?)"""
+    
+    SCHEMA_SQL = """
+        -- Основная таблица правил скидок (с FK на справочники)
+        CREATE TABLE IF NOT EXISTS discount_rules (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            comment TEXT,
+            pos_message TEXT,
+            description TEXT,
+            operator_message TEXT,
+            operator_id INTEGER,
+            operator_id_desc TEXT,
+            begin_date TIMESTAMP,
+            end_date TIMESTAMP,
+            status INTEGER NOT NULL DEFAULT 0,
+            priority INTEGER,
+            isolation_level INTEGER,
+            apply_mode INTEGER,
+            only_message_mode INTEGER DEFAULT 0,
+            scheduling_mode INTEGER,
+            is_for_dc_gen INTEGER DEFAULT 0,
+            exclude_sku_set_id INTEGER,
+            exclude_sku_set_id_desc TEXT,
+            ext_code TEXT,
+            min_match_count INTEGER,
+            FOREIGN KEY (status) REFERENCES mapping_status(id),
+            FOREIGN KEY (isolation_level) REFERENCES mapping_isolation_level(id),
+            FOREIGN KEY (apply_mode) REFERENCES mapping_apply_mode(id),
+            FOREIGN KEY (scheduling_mode) REFERENCES mapping_scheduling_mode(id)
+        );
+        
+        -- Условия применения правил
+        CREATE TABLE IF NOT EXISTS rule_conditions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            discount_rule_id INTEGER NOT NULL,
+            condition_type INTEGER NOT NULL,
+            comparison_type INTEGER NOT NULL,
+            value TEXT,
+            group_name TEXT,
+            FOREIGN KEY (discount_rule_id) REFERENCES discount_rules(id) ON DELETE CASCADE,
+            FOREIGN KEY (condition_type) REFERENCES mapping_data_values(id),
+            FOREIGN KEY (comparison_type) REFERENCES mapping_operators(id)
+        );
+        
+        -- Целые значения условий применения (по строке на id из value)
+        CREATE TABLE IF NOT EXISTS rule_condition_values (
+            discount_rule_id INTEGER NOT NULL,
+            condition_id INTEGER NOT NULL,
+            condition_type INTEGER NOT NULL,
+            int_value INTEGER NOT NULL,
+            PRIMARY KEY (discount_rule_id, condition_id, int_value),
+            FOREIGN KEY (condition_id) REFERENCES rule_conditions(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+        
+        -- Условия на чек/товары
+        CREATE TABLE IF NOT EXISTS order_conditions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            discount_rule_id INTEGER NOT NULL,
+            condition_type INTEGER NOT NULL,
+            comparison_type INTEGER NOT NULL,
+            value TEXT,
+            group_name TEXT,
+            FOREIGN KEY (discount_rule_id) REFERENCES discount_rules(id) ON DELETE CASCADE,
+            FOREIGN KEY (condition_type) REFERENCES mapping_product_values(id),
+            FOREIGN KEY (comparison_type) REFERENCES mapping_operators(id)
+        );
+        
+        -- Результаты применения скидок
+        CREATE TABLE IF NOT EXISTS result_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            discount_rule_id INTEGER NOT NULL,
+            result_type INTEGER NOT NULL,
+            comparison_type INTEGER,
+            value TEXT,
+            value_type INTEGER,
+            fixed_value FLOAT,
+            expression TEXT,
+            discount_value_type INTEGER,
+            discount_time_type INTEGER,
+            sku_set_id INTEGER,
+            group_apply_mode INTEGER,
+            sort_items_mode INTEGER,
+            FOREIGN KEY (discount_rule_id) REFERENCES discount_rules(id) ON DELETE CASCADE,
+            FOREIGN KEY (result_type) REFERENCES mapping_result_type(id),
+            FOREIGN KEY (value_type) REFERENCES mapping_value_type(id),
+            FOREIGN KEY (discount_time_type) REFERENCES mapping_discount_time_type(id),
+            FOREIGN KEY (sku_set_id) REFERENCES sku_sets(id),
+            FOREIGN KEY (group_apply_mode) REFERENCES mapping_group_apply_mode(id)
+        );
+        
+        -- Условия внутри результатов
+        CREATE TABLE IF NOT EXISTS result_item_conditions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            result_item_id INTEGER NOT NULL,
+            condition_type INTEGER NOT NULL,
+            value TEXT,
+            FOREIGN KEY (result_item_id) REFERENCES result_items(id) ON DELETE CASCADE,
+            FOREIGN KEY (condition_type) REFERENCES mapping_cond_values(id)
+        );
+    """
+    
+    INDEX_SQL = """
+        CREATE INDEX IF NOT EXISTS idx_discount_rules_name ON discount_rules(name);
+        CREATE INDEX IF NOT EXISTS idx_discount_rules_status ON discount_rules(status);
+        CREATE INDEX IF NOT EXISTS idx_discount_rules_dates ON discount_rules(begin_date, end_date);
+        CREATE INDEX IF NOT EXISTS idx_rule_conditions_rule ON rule_conditions(discount_rule_id);
+        CREATE INDEX IF NOT EXISTS idx_rule_condition_values_value
+            ON rule_condition_values(condition_type, int_value, discount_rule_id);
+        CREATE INDEX IF NOT EXISTS idx_order_conditions_rule ON order_conditions(discount_rule_id);
+        CREATE INDEX IF NOT EXISTS idx_result_items_rule ON result_items(discount_rule_id);
+        CREATE INDEX IF NOT EXISTS idx_result_item_conditions_item ON result_item_conditions(result_item_id);
+    """
+    
+    SKU_SET_USAGE_SQL = """
+        SELECT sku_set_id, COUNT(*) FROM result_items
+        WHERE sku_set_id IS NOT NULL
+        GROUP BY sku_set_id
+    """
+    
+    def __init__(self, conn: aiosqlite.Connection, shadow: bool = False):
+        super().__init__(conn, shadow)
+        self.next_rule_condition_id: Optional[int] = None
+        self.next_result_item_id: Optional[int] = None
+    
+    def _reset(self):
+        self.rules: List[tuple] = []
+        self.rule_conditions: List[tuple] = []
+        self.rule_condition_values: List[tuple] = []
+        self.order_conditions: List[tuple] = []
+        self.result_items: List[tuple] = []
+        self.result_item_conditions: List[tuple] = []
+    
+    async def create_schema(self):
+        """Создание таблиц; rule_condition_values в старой БД заполняется из rule_conditions"""
+        async with self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rule_condition_values'"
+        ) as cursor:
+            values_table_exists = await cursor.fetchone() is not None
+        
+        await self.conn.executescript(self.SCHEMA_SQL)
+        if not values_table_exists:
+            async with self.conn.execute(
+                "SELECT id, discount_rule_id, condition_type, value FROM rule_conditions"
+            ) as cursor:
+                rows = [
+                    (rule_id, condition_id, condition_type, int_value)
+                    async for condition_id, rule_id, condition_type, value in cursor
+                    for int_value in int_values(value)
+                ]
+            await self.conn.executemany(self.RULE_CONDITION_VALUE_SQL, rows)
+        await self.conn.executescript(self.INDEX_SQL)
+        await self.conn.commit()
+    
+    async def prepare(self):
+        """Следующие свободные id для rule_conditions и result_items (вызывается до add_rule)"""
+        for table_name, attribute in (('rule_conditions', 'next_rule_condition_id'),
+                                      ('result_items', 'next_result_item_id')):
+            async with self.conn.execute(
+                self._sql(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table_name}")
+            ) as cursor:
+                row = await cursor.fetchone()
+            setattr(self, attribute, row[0])
+    
+    def add_rule(self, rule: Dict):
+        """Преобразование правила в строки таблиц (без записи в БД)
+        
+        Строки правила добавляются в пакет только если преобразование прошло
+        целиком, чтобы ошибка в одном правиле не оставляла его частично.
+        """
+        rule_id = rule.get('id')
+        rule_condition_group = rule.get('ruleConditionGroup')
+        
+        rule_row = (
+            rule_id,
+            rule.get('name'),
+            rule.get('comment'),
+            rule.get('posMessage'),
+            rule.get('description'),
+            rule.get('operatorMessage'),
+            rule.get('operatorId'),
+            rule.get('operatorIdDesc'),
+            rule.get('beginDate'),
+            rule.get('endDate'),
+            rule.get('status', 0),
+            rule.get('priority'),
+            rule.get('isolationLevel'),
+            rule.get('applyMode'),
+            rule.get('onlyMessageMode', 0),
+            rule.get('schedulingMode'),
+            1 if rule.get('isForDcGen') else 0,
+            rule.get('excludeSkuSetId'),
+            rule.get('excludeSkuSetIdDesc'),
+            rule.get('extCode'),
+            rule_condition_group.get('minMatchCount') if rule_condition_group else None
+        )
+        
+        # Условия применения правил (ruleConditionGroup) и их целые значения
+        rule_conditions = []
+        rule_condition_values = []
+        rule_condition_id = self.next_rule_condition_id
+        if rule_condition_group:
+            for cond in rule_condition_group.get('requiredConditions', []) or []:
+                condition_type = cond.get('type')
+                value = DataProcessor.parse_value_field(cond.get('value'))
+                rule_conditions.append((
+                    rule_condition_id,
+                    rule_id,
+                    condition_type,
+                    cond.get('comparsionType'),
+                    value,
+                    cond.get('group', '0')
+                ))
+                for int_value in int_values(value):
+                    rule_condition_values.append((rule_id, rule_condition_id, condition_type, int_value))
+                rule_condition_id += 1
+        
+        # Условия на чек (orderConditionGroup)
+        order_conditions = []
+        order_condition_group = rule.get('orderConditionGroup')
+        if order_condition_group:
+            for cond in order_condition_group.get('requiredConditions', []) or []:
+                order_conditions.append((
+                    rule_id,
+                    cond.get('type'),
+                    cond.get('comparsionType'),
+                    DataProcessor.parse_value_field(cond.get('value')),
+                    cond.get('group', '0')
+                ))
+        
+        # Результаты (resultScaleItems) и условия внутри результатов
+        result_items = []
+        result_item_conditions = []
+        result_item_id = self.next_result_item_id
+        for scale_item in rule.get('resultScaleItems', []) or []:
+            result_type = scale_item.get('type')
+            comparison_type = scale_item.get('comparsionType')
+            value = scale_item.get('value')
+            
+            for result in scale_item.get('results', []) or []:
+                restriction = result.get('restriction') or {}
+                
+                result_items.append((
+                    result_item_id,
+                    rule_id,
+                    result_type,
+                    comparison_type,
+                    value,
+                    result.get('valueType'),
+                    result.get('fixedValue'),
+                    result.get('expression'),
+                    result.get('discountValueType'),
+                    result.get('discountTimeType'),
+                    restriction.get('skuSetId'),
+                    restriction.get('groupApplyMode'),
+                    restriction.get('sortItemsMode')
+                ))
+                
+                for cond in restriction.get('conditions', []) or []:
+                    result_item_conditions.append((
+                        result_item_id,
+                        cond.get('type'),
+                        DataProcessor.parse_value_field(cond.get('value'))
+                    ))
+                
+                result_item_id += 1
+        
+        self.next_rule_condition_id = rule_condition_id
+        self.next_result_item_id = result_item_id
+        self.rules.append(rule_row)
+        self.rule_conditions.extend(rule_conditions)
+        self.rule_condition_values.extend(rule_condition_values)
+        self.order_conditions.extend(order_conditions)
+        self.result_items.extend(result_items)
+        self.result_item_conditions.extend(result_item_conditions)
+    
+    def take_batch(self) -> Dict[str, List[tuple]]:
+        """Забрать накопленные строки (по таблицам) и начать новый пакет"""
+        batch = {
+            'discount_rules': self.rules,
+            'rule_conditions': self.rule_conditions,
+            'rule_condition_values': self.rule_condition_values,
+            'order_conditions': self.order_conditions,
+            'result_items': self.result_items,
+            'result_item_conditions': self.result_item_conditions
+        }
+        self._reset()
+        return batch
+    
+    async def write_batch(self, batch: Dict[str, List[tuple]]):
+        """Запись пакета через executemany (без commit)"""
+        await self.conn.executemany(self._sql(self.RULE_SQL), batch['discount_rules'])
+        await self.conn.executemany(self._sql(self.RULE_CONDITION_SQL), batch['rule_conditions'])
+        await self.conn.executemany(self._sql(self.RULE_CONDITION_VALUE_SQL), batch['rule_condition_values'])
+        await self.conn.executemany(self._sql(self.ORDER_CONDITION_SQL), batch['order_conditions'])
+        await self.conn.executemany(self._sql(self.RESULT_ITEM_SQL), batch['result_items'])
+        await self.conn.executemany(self._sql(self.RESULT_ITEM_CONDITION_SQL), batch['result_item_conditions'])
+    
+    async def delete_rule_children(self, rule_ids):
+        """Удаление дочерних строк правил (условия, результаты) без commit"""
+        params = [(rule_id,) for rule_id in rule_ids]
+        if not params:
+            return
+        
+        await self.conn.executemany(
+            self._sql("""DELETE FROM result_item_conditions WHERE result_item_id IN
+               (SELECT id FROM result_items WHERE discount_rule_id = ?)"""),
+            params
+        )
+        await self.conn.executemany(self._sql("DELETE FROM result_items WHERE discount_rule_id = ?"), params)
+        await self.conn.executemany(self._sql("DELETE FROM order_conditions WHERE discount_rule_id = ?"), params)
+        await self.conn.executemany(self._sql("DELETE FROM rule_condition_values WHERE discount_rule_id = ?"), params)
+        await self.conn.executemany(self._sql("DELETE FROM rule_conditions WHERE discount_rule_id = ?"), params)
+    
+    async def find_rules_by_condition_value(self, condition_type: int, value: int) -> List[int]:
+        """Id правил, условие condition_type которых содержит значение value
+        
+        Например, правила, нацеленные на магазин 42:
+        find_rules_by_condition_value(COND_LOCATION, 42). Поиск по индексу
+        idx_rule_condition_values_value; оператор условия (IN / NOT IN) не
+        учитывается.
+        """
+        async with self.conn.execute(
+            self._sql("""SELECT DISTINCT discount_rule_id FROM rule_condition_values
+               WHERE condition_type = ? AND int_value = ? ORDER BY discount_rule_id"""),
+            (condition_type, value)
+        ) as cursor:
+            return [row[0] async for row in cursor]
+
+
+class JsonBlobLayout(RuleLayout):
+    """Схема с JSON-строками: одна строка discount_rules на правило
+    
+    Группы условий, результаты и ограничения хранятся JSON-строками, коды
+    типов и операторов заменены названиями из справочников, даты - строками
+    YYYY-MM-DD-HH-MM, статус - названием.
+    """
+    
+    name = 'json'
+    MARKER_COLUMN = 'result_scale_items'
+    TABLES = ('discount_rules',)
+    
+    RULE_SQL = """INSERT OR REPLACE INTO discount_rules (
+                id, name, comment, pos_message, description, operator_message,
+                operator_id, operator_id_desc, begin_date, end_date, status,
+                priority, isolation_level, apply_mode, only_message_mode,
+                scheduling_mode, is_for_dc_gen, exclude_sku_set_id,
+                exclude_sku_set_id_desc, ext_code, rule_condition_group,
+                order_condition_group, result_scale_items, restrictions, rules_to_block
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+    
+    SCHEMA_SQL = """
+        CREATE TABLE IF NOT EXISTS discount_rules (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            comment TEXT,
+            pos_message TEXT,
+            description TEXT,
+            operator_message TEXT,
+            operator_id INTEGER,
+            operator_id_desc TEXT,
+            begin_date TEXT,
+            end_date TEXT,
+            status TEXT,
+            priority INTEGER,
+            isolation_level INTEGER,
+            apply_mode INTEGER,
+            only_message_mode INTEGER,
+            scheduling_mode INTEGER,
+            is_for_dc_gen INTEGER,
+            exclude_sku_set_id INTEGER,
+            exclude_sku_set_id_desc TEXT,
+            ext_code TEXT,
+            rule_condition_group TEXT,
+            order_condition_group TEXT,
+            result_scale_items TEXT,
+            restrictions TEXT,
+            rules_to_block TEXT,
+            FOREIGN KEY (exclude_sku_set_id) REFERENCES sku_sets(id) ON DELETE SET NULL
+        );
+    """
+    
+    INDEX_SQL = """
+        CREATE INDEX IF NOT EXISTS idx_discount_rules_name ON discount_rules(name);
+        CREATE INDEX IF NOT EXISTS idx_discount_rules_status ON discount_rules(status);
+        CREATE INDEX IF NOT EXISTS idx_discount_rules_begin_date ON discount_rules(begin_date);
+        CREATE INDEX IF NOT EXISTS idx_discount_rules_end_date ON discount_rules(end_date);
+    """
+    
+    # Набор результата - restriction.skuSetId в results элементов result_scale_items
+    SKU_SET_USAGE_SQL = """
+        SELECT json_extract(result.value, '$.restriction.skuSetId') AS sku_set_id, COUNT(*)
+        FROM discount_rules rule,
+             json_each(rule.result_scale_items) item,
+             json_each(item.value, '$.results') result
+        WHERE rule.result_scale_items IS NOT NULL AND sku_set_id IS NOT NULL
+        GROUP BY sku_set_id
+    """
+    
+    def __init__(self, conn: aiosqlite.Connection, shadow: bool = False):
+        super().__init__(conn, shadow)
+        self.mappings = MappingLoader.get_mappings()
+    
+    @staticmethod
+    def _dumps(value: Any) -> Optional[str]:
+        return json.dumps(value, ensure_ascii=False) if value is not None else None
+    
+    @staticmethod
+    def _decode_value(value_str: Optional[str]) -> Any:
+        """Значение условия как объект: список ids, id или исходное значение"""
+        if not value_str:
+            return None
+        try:
+            parsed = json.loads(value_str)
+        except (TypeError, ValueError):
+            return value_str
+        
+        if isinstance(parsed, dict):
+            if 'ids' in parsed:
+                return parsed['ids']
+            if 'id' in parsed:
+                return parsed['id']
+        return parsed
+    
+    def _map_conditions(self, conditions: Optional[List[Dict]], type_map: Dict[int, str]) -> Optional[List[Dict]]:
+        """Замена кодов типа и оператора названиями, разбор value"""
+        if not conditions:
+            return conditions
+        
+        operators = self.mappings['operators']
+        processed = []
+        for condition in conditions:
+            new_cond = dict(condition)
+            if 'type' in new_cond:
+                new_cond['type'] = type_map.get(new_cond['type'], new_cond['type'])
+            if 'comparsionType' in new_cond:
+                new_cond['comparsionType'] = operators.get(new_cond['comparsionType'], new_cond['comparsionType'])
+            if 'value' in new_cond:
+                new_cond['value'] = self._decode_value(new_cond['value'])
+            processed.append(new_cond)
+        return processed
+    
+    def _map_group(self, group: Optional[Dict], type_map: Dict[int, str]) -> Optional[str]:
+        if not group:
+            return None
+        group = dict(group)
+        if 'requiredConditions' in group:
+            group['requiredConditions'] = self._map_conditions(group['requiredConditions'], type_map)
+        return self._dumps(group)
+    
+    def _map_result_scale_items(self, items: Optional[List[Dict]]) -> Optional[str]:
+        if not items:
+            return None
+        
+        group_apply_mode = self.mappings['group_apply_mode']
+        processed_items = []
+        for item in items:
+            item = dict(item)
+            results = []
+            for result in item.get('results') or []:
+                result = dict(result)
+                restriction = result.get('restriction')
+                if isinstance(restriction, dict):
+                    restriction = dict(restriction)
+                    if restriction.get('conditions'):
+                        restriction['conditions'] = self._map_conditions(
+                            restriction['conditions'], self.mappings['cond_values']
+                        )
+                    if 'groupApplyMode' in restriction:
+                        restriction['groupApplyMode'] = group_apply_mode.get(
+                            restriction['groupApplyMode'], restriction['groupApplyMode']
+                        )
+                    result['restriction'] = restriction
+                results.append(result)
+            if 'results' in item:
+                item['results'] = results
+            processed_items.append(item)
+        return self._dumps(processed_items)
+    
+    def add_rule(self, rule: Dict):
+        """Преобразование правила в строку discount_rules (без записи в БД)"""
+        status = rule.get('status')
+        self.rules.append((
+            rule.get('id'),
+            rule.get('name'),
+            rule.get('comment'),
+            rule.get('posMessage'),
+            rule.get('description'),
+            rule.get('operatorMessage'),
+            rule.get('operatorId'),
+            rule.get('operatorIdDesc'),
+            DataProcessor.timestamp_to_datetime(rule.get('beginDate')),
+            DataProcessor.timestamp_to_datetime(rule.get('endDate')),
+            self.mappings['status'].get(status, str(status)),
+            rule.get('priority'),
+            rule.get('isolationLevel'),
+            rule.get('applyMode'),
+            rule.get('onlyMessageMode'),
+            rule.get('schedulingMode'),
+            rule.get('isForDcGen'),
+            rule.get('excludeSkuSetId'),
+            rule.get('excludeSkuSetIdDesc'),
+            rule.get('extCode'),
+            self._map_group(rule.get('ruleConditionGroup'), self.mappings['data_values']),
+            self._map_group(rule.get('orderConditionGroup'), self.mappings['product_values']),
+            self._map_result_scale_items(rule.get('resultScaleItems')),
+            self._dumps(rule.get('restrictions')),
+            self._dumps(rule.get('rulesToBlock'))
+        ))
+    
+    def take_batch(self) -> Dict[str, List[tuple]]:
+        """Забрать накопленные строки и начать новый пакет"""
+        batch = {'discount_rules': self.rules}
+        self._reset()
+        return batch
+    
+    async def write_batch(self, batch: Dict[str, List[tuple]]):
+        """Запись пакета через executemany (без commit)"""
+        await self.conn.executemany(self._sql(self.RULE_SQL), batch['discount_rules'])
+
+
+LAYOUTS = {
+    NormalizedLayout.name: NormalizedLayout,
+    JsonBlobLayout.name: JsonBlobLayout,
+}
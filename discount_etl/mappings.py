@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Справочники маппинга кодов API в названия
+"""
+
+from typing import Dict
+
+
+class MappingLoader:
+    """Загрузчик справочных таблиц маппинга"""
+    
+    @staticmethod
+    def get_mappings() -> Dict[str, Dict[int, str]]:
+        """Возвращает все маппинги"""
+        return {
+            'data_values': {
+                2: "POS-термінал",
+                5: "Емітент",
+                0: "Організація",
+                1: "Підрозділ",
+                22: "Термінальна група",
+                27: "Анкетні дані",
+                13: "Вік",
+                9: "День народження",
+                6: "Категорія контрагента",
+                7: "Контрагент",
+                30: "Кіл-ть днів до ДН",
+                31: "Кіл-ть днів після ДН",
+                16: "Кількість балів",
+                26: "Сегмент / цільова група",
+                21: "Соціальна група",
+                12: "Стать",
+                8: "День в році",
+                10: "День тижня",
+                11: "Час",
+                35: "Без картки",
+                3: "Категорія картки",
+                28: "Можливості картки",
+                15: "Стаж картки в системі, років",
+                4: "Статус картки",
+                34: "Кіл-ть днів після останньої покупки ПММ",
+                24: "Кіл-ть днів після останньої покупки товарів",
+                25: "Кіл-ть днів після першої покупки",
+                17: "Кількість бонусів",
+                14: "Статистика покупок",
+                32: "Статистика покупок ПММ",
+                23: "Статистика покупок товарів",
+                33: "Випадковий чек (ймовірність по підрозділах, %)",
+                29: "Випадковий чек (ймовірність, %)",
+                20: "Тип чека",
+                19: "Форма оплати"
+            },
+            'operators': {
+                0: "=",
+                1: "!=",
+                2: ">",
+                3: "<",
+                4: ">=",
+                5: "<=",
+                6: "IN",
+                7: "NOT IN"
+            },
+            'product_values': {
+                18: "Група товарів",
+                20: "Заправка до повного бака",
+                17: "Знижка,%",
+                2: "Кількість позицій",
+                15: "Не присутній",
+                5: "Присутній",
+                1: "Сума кількості товарів",
+                4: "Сума оплати бонусами, грн",
+                16: "Сума оплати бонусами,%",
+                9: "Сума товарів без урахування знижки і оплат бонусами, грн",
+                19: "Сума товарів з урахуванням знижки але без оплат бонусами, грн",
+                6: "Сума товарів з урахуванням знижки та оплат бонусами, грн"
+            },
+            'cond_values': {
+                0: "Кількість кожної номенклатури (точний збіг)",
+                1: "Сума кількості номенклатури не більше",
+                2: "На суму не більше",
+                3: "Кількість позицій",
+                4: "Позиції без застосованих знижок",
+                5: "Купон по товару",
+                6: "Сума кількості номенклатури не менше"
+            },
+            'status': {
+                0: "Не активно",
+                1: "Активно",
+                2: "Архів",
+                3: "На затверджені",
+                4: "Тестування"
+            },
+            'group_apply_mode': {
+                0: "До всіх відібраних позицій чека",
+                1: "Окремо по номенклатурі"
+            },
+            'isolation_level': {
+                0: "Нормальний",
+                1: "Ізольований",
+                2: "Високий"
+            },
+            'apply_mode': {
+                0: "Застосувати всі",
+                1: "Застосувати кращу",
+                2: "Комбінований"
+            },
+            'scheduling_mode': {
+                0: "Весь час",
+                1: "За розкладом"
+            },
+            'result_type': {
+                9: " ",
+                1: "Категорія картки",
+                2: "Категорія контрагента",
+                5: "Кількість позицій",
+                7: "Статистика покупок",
+                13: "Статистика покупок ПММ",
+                12: "Статистика покупок товарів",
+                0: "Статус картки",
+                4: "Сума кількості товарів",
+                8: "Сума оплати бонусами",
+                10: "Сума товарів включаючи знижки і оплату бонусами",
+                3: "Сума товарів не включаючи знижки і оплату бонусами"
+            },
+            'comparison_type': {
+                0: "=",
+                1: "!=",
+                2: ">",
+                3: "<",
+                4: ">=",
+                5: "<=",
+                6: "В діапазоні",
+                7: "Поза діапазоном",
+                8: "В списку",
+                9: "Не в списку",
+                12: "Не вказано",
+                13: "Вказано"
+            },
+            'discount_value_type': {
+                0: "%",
+                1: "На весь чек, грн",
+                2: "На ціну, грн",
+                3: "За типом ціни"
+            },
+            'value_type': {
+                0: "Фікс. значення",
+                1: "Вираз",
+                2: "За ціною номенклатури"
+            },
+            'discount_time_type': {
+                0: "Поточний чек",
+                1: "Відкладене знижка",
+                2: "Промо-код"
+            },
+        }
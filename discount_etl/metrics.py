@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики запуска ETL: счетчики, гистограммы и значения (gauge)
+
+Реестр - обычные словари без блокировок и фоновых потоков: увеличение
+счетчика или наблюдение в гистограмме стоит доли микросекунды, поэтому
+метрики собираются всегда, а выгружаются в конце запуска (config.METRICS_FILE)
+в текстовом формате Prometheus (для node_exporter textfile collector) или
+в JSON, если имя файла заканчивается на .json.
+
+Имена и метки следуют соглашениям Prometheus: discount_etl_<что>_<единица>,
+счетчики с суффиксом _total, время в секундах, объем в байтах.
+"""
+
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм по умолчанию, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FAST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Метрики ETL: имя -> (описание, границы корзин для гистограмм)
+ETL_METRICS = {
+    'discount_etl_http_request_seconds': ("Время HTTP-запроса к API по endpoint и статусу ответа", LATENCY_BUCKETS),
+    'discount_etl_http_response_bytes_total': ("Получено байт в ответах API (после распаковки)", None),
+    'discount_etl_http_retries_total': ("Повторы запросов к API после временных ошибок", None),
+    'discount_etl_json_parse_seconds': ("Время разбора JSON ответа API", FAST_BUCKETS),
+    'discount_etl_rule_transform_seconds': ("Время преобразования одного правила в строки таблиц", FAST_BUCKETS),
+    'discount_etl_rows_changed_total': ("Записано новых и измененных строк по таблицам", None),
+    'discount_etl_rows_removed_total': ("Удалено строк, пропавших из API, по таблицам", None),
+    'discount_etl_sqlite_statements_total': ("Выполнено SQL-команд по типу (INSERT, DELETE, ...)", None),
+    'discount_etl_sqlite_changes_total': ("Строк, вставленных, измененных и удаленных в SQLite", None),
+    'discount_etl_sqlite_commit_seconds': ("Время COMMIT в SQLite", FAST_BUCKETS + (0.5, 1.0, 5.0)),
+    'discount_etl_stage_seconds': ("Время стадии последнего запуска", None),
+    'discount_etl_last_run_success': ("1, если последний запуск завершился успешно", None),
+    'discount_etl_last_run_timestamp_seconds': ("Время окончания последнего запуска (Unix)", None),
+}
+
+
+class Histogram:
+    """Кумулятивная гистограмма в стиле Prometheus"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, накопленное число наблюдений), последняя корзина - +Inf"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return result
+
+
+class MetricsRegistry:
+    """Метрики одного запуска"""
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.help: Dict[str, str] = {}
+        self.bucket_bounds: Dict[str, Sequence[float]] = {}
+        for name, (help_text, buckets) in ETL_METRICS.items():
+            self.describe(name, help_text, buckets)
+
+    def describe(self, name: str, help_text: str, buckets: Optional[Sequence[float]] = None):
+        """Описание метрики (HELP) и границы корзин гистограммы"""
+        self.help[name] = help_text
+        if buckets is not None:
+            self.bucket_bounds[name] = buckets
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> LabelKey:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = self._key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        self.gauges.setdefault(name, {})[self._key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = self._key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.bucket_bounds.get(name, LATENCY_BUCKETS))
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Наблюдение длительности блока в гистограмме name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # ------------------------------------------------------------------ #
+    # Выгрузка
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = key + extra
+        if not pairs:
+            return ""
+        return "{" + ",".join(
+            '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in pairs
+        ) + "}"
+
+    def to_prometheus(self) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        lines = []
+
+        def header(name: str, metric_type: str):
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for name in sorted(self.counters):
+            header(name, 'counter')
+            for key, value in sorted(self.counters[name].items()):
+                lines.append(f"{name}{self._format_labels(key)} {value}")
+        for name in sorted(self.gauges):
+            header(name, 'gauge')
+            for key, value in sorted(self.gauges[name].items()):
+                lines.append(f"{name}{self._format_labels(key)} {value}")
+        for name in sorted(self.histograms):
+            header(name, 'histogram')
+            for key, histogram in sorted(self.histograms[name].items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(f"{name}_bucket{self._format_labels(key, (('le', bound),))} {count}")
+                lines.append(f"{name}_sum{self._format_labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{self._format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict:
+        """Метрики как JSON-совместимый словарь"""
+        def series(values: Dict[LabelKey, object], convert):
+            return [dict(labels=dict(key), **convert(value)) for key, value in sorted(values.items())]
+
+        return {
+            'counters': {name: series(values, lambda value: {'value': value})
+                         for name, values in sorted(self.counters.items())},
+            'gauges': {name: series(values, lambda value: {'value': value})
+                       for name, values in sorted(self.gauges.items())},
+            'histograms': {
+                name: series(values, lambda histogram: {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': dict(histogram.cumulative()),
+                })
+                for name, values in sorted(self.histograms.items())
+            },
+        }
+
+    def write(self, path: str):
+        """Запись в файл: JSON для *.json, иначе формат Prometheus
+
+        Пишется во временный файл и переименовывается, чтобы textfile
+        collector не прочитал файл наполовину.
+        """
+        if path.endswith('.json'):
+            content = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        else:
+            content = self.to_prometheus()
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temp_path, path)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный сервер-заглушка API правил скидок для нагрузочных прогонов ETL
+
+Реализует /api/login, списки */list с семантикой count / offset / sort и
+/skuSet/get. Каталог синтетический и задается размерами (например, 100 тыс.
+правил и 1 млн SKU): записи строятся по id детерминированно (по seed) в
+момент запроса, поэтому память не растет с размером каталога, а повторные
+запуски отдают те же данные.
+
+Задержка ответа (latency + случайный jitter) и доля ошибок 429/500/503 с
+Retry-After настраиваются, чтобы проверять параллельную загрузку, повторы
+и адаптивное ограничение частоты на одной машине.
+
+Запуск:
+    python -m discount_etl.mockserver --rules 100000 --skus 1000000 --latency 0.02
+    python -m discount_etl --base-url http://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = "JSESSIONID"
+ERROR_STATUSES = (429, 500, 503)
+MAX_PAGE_SIZE = 1000
+# Самое раннее начало периода действия правил (мс)
+BASE_TIMESTAMP = 1_700_000_000_000
+DAY_MS = 24 * 3600 * 1000
+
+
+class MockCatalog:
+    """Синтетический каталог: записи по id, сортировка по полям списка"""
+
+    def __init__(self, rules: int = 1000, sku_sets: int = 200, skus: int = 10000,
+                 merchants: int = 10, locations: int = 200, terminals: int = 1000,
+                 seed: int = 1):
+        self.sizes = {
+            'discountRule': rules,
+            'skuSet': sku_sets,
+            'merchant': merchants,
+            'location': locations,
+            'terminal': terminals,
+        }
+        self.skus = skus
+        self.seed = seed
+        self.builders: Dict[str, Callable[[int], Dict]] = {
+            'discountRule': self.rule,
+            'skuSet': self.sku_set,
+            'merchant': self.merchant,
+            'location': self.location,
+            'terminal': self.terminal,
+        }
+        # (список, поле сортировки) -> id в порядке сортировки
+        self._orders: Dict[tuple, List[int]] = {}
+
+    def _random(self, kind: str, item_id: int) -> random.Random:
+        return random.Random(f"{self.seed}:{kind}:{item_id}")
+
+    # ------------------------------------------------------------------ #
+    # Записи
+
+    def merchant(self, item_id: int) -> Dict:
+        return {'id': item_id, 'name': f"Merchant {item_id:06d}", 'extCode': f"M{item_id}"}
+
+    def location(self, item_id: int) -> Dict:
+        return {
+            'id': item_id,
+            'name': f"Location {item_id:06d}",
+            'extCode': f"L{item_id}",
+            'address': f"Street {item_id}",
+            'merchantId': (item_id - 1) % max(1, self.sizes['merchant']) + 1,
+        }
+
+    def terminal(self, item_id: int) -> Dict:
+        return {
+            'id': item_id,
+            'name': f"Terminal {item_id:07d}",
+            'extCode': f"T{item_id}",
+            'locationId': (item_id - 1) % max(1, self.sizes['location']) + 1,
+        }
+
+    def sku_set(self, item_id: int) -> Dict:
+        return {'id': item_id, 'name': f"SKU set {item_id:06d}", 'extCode': f"S{item_id}"}
+
+    def sku_set_members(self, sku_set_id: int) -> range:
+        """SKU набора: каталог SKU разбит между наборами по остатку от деления"""
+        return range(sku_set_id, self.skus + 1, max(1, self.sizes['skuSet']))
+
+    def _sku_set_id(self, rnd: random.Random) -> Optional[int]:
+        return rnd.randint(1, self.sizes['skuSet']) if self.sizes['skuSet'] else None
+
+    def rule(self, item_id: int) -> Dict:
+        rnd = self._random('discountRule', item_id)
+        begin = BASE_TIMESTAMP + rnd.randrange(0, 365) * DAY_MS
+        terminals = max(1, self.sizes['terminal'])
+        terminal_ids = sorted(rnd.sample(range(1, terminals + 1), min(terminals, rnd.randint(1, 3))))
+        exclude_sku_set_id = self._sku_set_id(rnd) if rnd.random() < 0.2 else None
+
+        return {
+            'id': item_id,
+            'name': f"Rule {item_id:07d}",
+            'status': rnd.choice((0, 1, 1, 1, 2)),
+            'priority': rnd.randint(0, 100),
+            'beginDate': begin,
+            'endDate': begin + rnd.randint(1, 180) * DAY_MS if rnd.random() < 0.7 else None,
+            'isolationLevel': rnd.randint(0, 2),
+            'applyMode': rnd.randint(0, 2),
+            'excludeSkuSetId': exclude_sku_set_id,
+            'ruleConditionGroup': {
+                'minMatchCount': 1,
+                'requiredConditions': [
+                    {'type': 2, 'comparsionType': 6, 'group': '0',
+                     'value': json.dumps({'ids': terminal_ids, 'descs': [f"T{i}" for i in terminal_ids]})},
+                ],
+            },
+            'orderConditionGroup': {
+                'requiredConditions': [
+                    {'type': 6, 'comparsionType': 4, 'value': json.dumps({'value': rnd.choice((0, 100, 500))})},
+                ],
+            },
+            'resultScaleItems': [{
+                'type': 9,
+                'comparsionType': 0,
+                'value': None,
+                'results': [{
+                    'valueType': 0,
+                    'fixedValue': rnd.randint(1, 30),
+                    'discountValueType': 0,
+                    'discountTimeType': 0,
+                    'restriction': {
+                        'skuSetId': self._sku_set_id(rnd),
+                        'groupApplyMode': 0,
+                        'conditions': [{'type': 6, 'value': json.dumps({'value': 1})}],
+                    },
+                }],
+            }],
+        }
+
+    # ------------------------------------------------------------------ #
+    # Списки
+
+    def _order(self, kind: str, sort_field: str) -> List[int]:
+        """Id списка в порядке сортировки (строится один раз на поле)"""
+        key = (kind, sort_field)
+        order = self._orders.get(key)
+        if order is None:
+            ids = range(1, self.sizes[kind] + 1)
+            if sort_field in ('id', 'name'):
+                # Имена построены с ведущими нулями: порядок совпадает с id
+                order = list(ids)
+            else:
+                builder = self.builders[kind]
+                values = {item_id: builder(item_id).get(sort_field) for item_id in ids}
+                # Пустые значения в конце, при равенстве - по id
+                order = sorted(ids, key=lambda item_id: (values[item_id] is None, values[item_id] or 0, item_id))
+            self._orders[key] = order
+        return order
+
+    def page(self, kind: str, offset: int, count: int, sort_field: str = 'id') -> Dict:
+        order = self._order(kind, sort_field)
+        builder = self.builders[kind]
+        return {
+            'data': [builder(item_id) for item_id in order[offset:offset + count]],
+            'count': len(order),
+        }
+
+
+class MockServer:
+    """aiohttp-приложение над MockCatalog с задержкой и ошибками"""
+
+    def __init__(self, catalog: MockCatalog, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, retry_after: float = 0.1, seed: Optional[int] = None):
+        self.catalog = catalog
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.faults])
+        app.router.add_post('/api/login', self.login)
+        for kind in self.catalog.sizes:
+            app.router.add_post(f'/{kind}/list', self.list_handler(kind))
+        app.router.add_post('/skuSet/get', self.sku_set_details)
+        return app
+
+    @web.middleware
+    async def faults(self, request: web.Request, handler):
+        """Задержка и ошибки для всех запросов, кроме авторизации"""
+        if request.path == '/api/login':
+            return await handler(request)
+
+        self.requests += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=self.random.choice(ERROR_STATUSES),
+                                headers={'Retry-After': str(self.retry_after)})
+
+        if SESSION_COOKIE not in request.cookies:
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        return await handler(request)
+
+    async def login(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if not body.get('username'):
+            return web.json_response({'error': 'username required'}, status=401)
+        response = web.json_response({'success': True})
+        response.set_cookie(SESSION_COOKIE, f"mock-{self.random.getrandbits(32):08x}")
+        return response
+
+    def list_handler(self, kind: str):
+        async def handler(request: web.Request) -> web.Response:
+            body = await request.json()
+            offset = max(0, int(body.get('offset', 0)))
+            count = min(MAX_PAGE_SIZE, max(0, int(body.get('count', 100))))
+            fields = (body.get('sort') or {}).get('fields') or [{}]
+            sort_field = fields[0].get('field') or 'id'
+            return web.json_response(self.catalog.page(kind, offset, count, sort_field))
+        return handler
+
+    async def sku_set_details(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        sku_set_id = int(body.get('id') or 0)
+        if not 1 <= sku_set_id <= self.catalog.sizes['skuSet']:
+            return web.json_response({'error': 'not found'}, status=404)
+
+        details = self.catalog.sku_set(sku_set_id)
+        details['skus'] = [{'id': sku_id} for sku_id in self.catalog.sku_set_members(sku_set_id)]
+        return web.json_response({'data': details})
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m discount_etl.mockserver",
+        description="Локальная заглушка API правил скидок с синтетическим каталогом"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rules", type=int, default=1000, help="правил скидок (по умолчанию %(default)s)")
+    parser.add_argument("--sku-sets", type=int, default=200, help="наборов товаров (по умолчанию %(default)s)")
+    parser.add_argument("--skus", type=int, default=10000, help="SKU во всех наборах (по умолчанию %(default)s)")
+    parser.add_argument("--merchants", type=int, default=10)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--terminals", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1, help="seed синтетических данных")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, секунды")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="доля ответов 429/500/503 (0..1)")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After в ответах с ошибкой, секунды")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    catalog = MockCatalog(
+        rules=args.rules, sku_sets=args.sku_sets, skus=args.skus,
+        merchants=args.merchants, locations=args.locations, terminals=args.terminals,
+        seed=args.seed
+    )
+    server = MockServer(catalog, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, retry_after=args.retry_after)
+    logger.info(f"Заглушка API: http://{args.host}:{args.port} "
+                f"(правил {args.rules}, наборов {args.sku_sets}, SKU {args.skus})")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
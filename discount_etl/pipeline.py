@@ -0,0 +1,685 @@
+# -*- coding: utf-8 -*-
+"""
+ETL конвейер: справочники и правила скидок из API в SQLite
+"""
+
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+import aiohttp
+
+from .api import DiscountRulesAPI
+from .config import Config
+from .db import SQLiteManager
+from .layouts import LAYOUTS, RuleLayout
+from .metrics import MetricsRegistry
+from .processing import DataProcessor
+from .replay import RecordingAPI, ReplayAPI, ResponseCache
+from .staging import SyncStaging
+
+logger = logging.getLogger(__name__)
+
+
+class ETLPipeline:
+    """Главный класс для управления ETL процессом
+    
+    connector - общий пул соединений aiohttp для нескольких запусков: без него
+    каждый run() создает свой пул и закрывает его в конце. Пул привязан к циклу
+    событий, поэтому все запуски с ним должны идти в одном цикле, а закрывает
+    его вызывающий код:
+    
+        async def main():
+            connector = DiscountRulesAPI.create_connector(config)
+            pipeline = ETLPipeline(config, connector=connector)
+            try:
+                for _ in range(runs):
+                    await pipeline.run()
+            finally:
+                await connector.close()
+        
+        asyncio.run(main())
+    
+    CLI выполняет один запуск на вызов (asyncio.run), общий пул там не нужен.
+    """
+    
+    REFERENCE_TABLES = ('merchants', 'locations', 'terminals', 'sku_sets')
+    # Справочник -> справочники, которые должны быть записаны до него
+    # (locations.merchant_name берется из загруженных merchants)
+    REFERENCE_DEPENDENCIES = {'locations': ('merchants',)}
+    
+    def __init__(self, config: Optional[Config] = None,
+                 connector: Optional[aiohttp.TCPConnector] = None):
+        self.config = config or Config()
+        self.connector = connector
+        self.db = SQLiteManager(self.config.DB_PATH)
+        self.layout: Optional[RuleLayout] = None
+        self.staging: Optional[SyncStaging] = None
+        # Публикация одной транзакцией: промежуточные commit загрузчиков откладываются
+        self.atomic = False
+        # Время стадий последнего запуска, секунды. Стадии вложены: загрузка
+        # таблиц (merchants, ..., discount_rules) входит в publish или load
+        self.stage_times: Dict[str, float] = {}
+        # Метрики последнего запуска (выгружаются в config.METRICS_FILE)
+        self.metrics = MetricsRegistry()
+        # Id запуска (мс Unix) и таблицы, в которых он что-то изменил:
+        # по ним в report_table_versions отчет понимает, какие разделы устарели
+        self.sync_run_id = 0
+        self.changed_tables: Set[str] = set()
+        self.reference_cache = {
+            'locations': {},
+            'merchants': {},
+            'terminals': {},
+            'sku_sets': {}
+        }
+    
+    async def run(self):
+        """Запуск ETL процесса"""
+        self.stage_times = {}
+        self.metrics = MetricsRegistry()
+        self.sync_run_id = int(time.time() * 1000)
+        self.changed_tables = set()
+        started = time.perf_counter()
+        success = False
+        sqlite_changes = 0
+        try:
+            logger.info(f"СТАРТ ETL ПРОЦЕССА (схема: {self.config.LAYOUT}, "
+                        f"режим: {'инкрементальный' if self.config.INCREMENTAL_SYNC else 'полный'})")
+            
+            # 1. Подключение к БД
+            await self.db.connect()
+            if self.config.METRICS_SQL_TRACE:
+                await self.db.conn.set_trace_callback(self._count_statement)
+            
+            # 2. Создание схемы
+            with self.timed('schema'):
+                self.layout = LAYOUTS[self.config.LAYOUT](self.db.conn)
+                await self.layout.check_schema()
+                await self.db.create_schema()
+                await self.layout.create_schema()
+            
+            # 3. Загрузка справочников маппинга
+            with self.timed('mappings'):
+                await self.db.load_mapping_tables()
+            
+            # 4. Работа с API
+            async with self.create_api() as api:
+                if self.config.RESUMABLE_SYNC:
+                    # 5. Сохранение страниц API в staging (с продолжением прерванной загрузки)
+                    with self.timed('fetch'):
+                        await self.stage_sources(api)
+                else:
+                    with self.timed('load'):
+                        # 5. Загрузка справочников
+                        await self.load_references(api)
+                        
+                        # 6. Загрузка правил скидок
+                        with self.timed('discount_rules'):
+                            await self.load_discount_rules(api)
+            
+            if self.config.RESUMABLE_SYNC:
+                # 6. Публикация справочников и правил из staging одной транзакцией
+                with self.timed('publish'):
+                    await self.publish_staged()
+            
+            # 7. Включаем FK после загрузки всех данных
+            with self.timed('foreign_keys'):
+                await self.db.enable_foreign_keys()
+            
+            success = True
+            logger.info("ETL ПРОЦЕСС ЗАВЕРШЕН УСПЕШНО")
+            
+        except Exception as e:
+            logger.error(f"Ошибка в ETL процессе: {e}")
+            raise
+        finally:
+            if self.db.conn is not None:
+                sqlite_changes = self.db.conn.total_changes
+            await self.db.close()
+            self.stage_times['total'] = time.perf_counter() - started
+            self.export_metrics(success, sqlite_changes)
+    
+    @contextmanager
+    def timed(self, stage: str):
+        """Замер времени стадии в stage_times (повторные замеры суммируются)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + time.perf_counter() - started
+    
+    def _count_statement(self, sql: str):
+        """Trace callback SQLite: счетчик команд по первому слову
+        
+        Вызывается в потоке aiosqlite; серии этого счетчика больше никто не
+        меняет, поэтому блокировка не нужна.
+        """
+        sql = sql.lstrip()
+        while sql.startswith('--'):
+            # Комментарии в начале скриптов схемы
+            sql = sql.partition('\n')[2].lstrip()
+        words = sql.split(None, 1)
+        self.metrics.inc('discount_etl_sqlite_statements_total', statement=words[0].upper() if words else '')
+    
+    def export_metrics(self, success: bool, sqlite_changes: int):
+        """Итоговые значения запуска и выгрузка метрик в config.METRICS_FILE"""
+        self.metrics.inc('discount_etl_sqlite_changes_total', sqlite_changes)
+        for stage, seconds in self.stage_times.items():
+            self.metrics.set('discount_etl_stage_seconds', seconds, stage=stage)
+        self.metrics.set('discount_etl_last_run_success', int(success))
+        self.metrics.set('discount_etl_last_run_timestamp_seconds', time.time())
+        
+        if self.config.METRICS_FILE:
+            try:
+                self.metrics.write(self.config.METRICS_FILE)
+            except OSError as e:
+                logger.warning(f"Не удалось записать метрики в {self.config.METRICS_FILE}: {e}")
+    
+    def create_api(self) -> DiscountRulesAPI:
+        """Источник данных: API, API с записью ответов или записанные ответы"""
+        if self.config.REPLAY_DIR:
+            return ReplayAPI(self.config, ResponseCache(self.config.REPLAY_DIR), metrics=self.metrics)
+        if self.config.RECORD_DIR:
+            return RecordingAPI(self.config, ResponseCache(self.config.RECORD_DIR),
+                                connector=self.connector, metrics=self.metrics)
+        return DiscountRulesAPI(self.config, connector=self.connector, metrics=self.metrics)
+    
+    async def commit(self):
+        """Commit пакета загрузчика; при атомарной публикации откладывается до ее конца"""
+        if not self.atomic:
+            with self.metrics.timer('discount_etl_sqlite_commit_seconds'):
+                await self.db.conn.commit()
+    
+    async def stage_sources(self, api: DiscountRulesAPI):
+        """Сохранение всех списков и деталей SKU set в staging
+        
+        Уже сохраненное в прерванном запуске повторно не запрашивается.
+        """
+        self.staging = SyncStaging(self.db.conn, self.config.BATCH_SIZE, self.config.STAGING_MAX_AGE_HOURS)
+        await self.staging.create_schema()
+        await self.staging.discard_stale()
+        
+        async def stage_sku_sets():
+            await self.stage_endpoint(api, 'sku_sets')
+            await self.stage_sku_details(api)
+        
+        # Списки независимы и загружаются одновременно; детали SKU set - после списка наборов
+        await self.run_stages(
+            *(self.stage_endpoint(api, table_name) for table_name in ('merchants', 'locations', 'terminals')),
+            stage_sku_sets(),
+            self.stage_endpoint(api, 'discount_rules', sort_field='priority')
+        )
+    
+    async def stage_endpoint(self, api: DiscountRulesAPI, name: str, sort_field: str = "name"):
+        """Догрузка недостающих страниц списка в staging"""
+        endpoint = self.config.ENDPOINTS[name]
+        total_count, complete, done_offsets = await self.staging.get_state(endpoint)
+        if complete:
+            logger.info(f"{name}: список уже сохранен в staging")
+            return
+        if done_offsets:
+            logger.info(f"{name}: продолжение загрузки, сохранено страниц: {len(done_offsets)}")
+        
+        async for offset, items, page_total in api.iter_missing_pages(endpoint, done_offsets, total_count, sort_field):
+            await self.staging.save_page(endpoint, offset, items, page_total)
+        await self.staging.mark_complete(endpoint)
+    
+    async def stage_sku_details(self, api: DiscountRulesAPI):
+        """Догрузка деталей SKU set в staging пулом воркеров (config.SKU_DETAILS_CONCURRENCY)"""
+        staged_ids = await self.staging.get_sku_detail_ids()
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.config.SKU_DETAILS_QUEUE_SIZE)
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.config.SKU_DETAILS_QUEUE_SIZE)
+        worker_count = max(1, self.config.SKU_DETAILS_CONCURRENCY)
+        
+        async def feed():
+            async for page in self.staging.iter_pages(self.config.ENDPOINTS['sku_sets']):
+                for sku_set in page:
+                    sku_set_id = sku_set.get('id')
+                    if sku_set_id and sku_set_id not in staged_ids:
+                        await pending.put(sku_set_id)
+            for _ in range(worker_count):
+                await pending.put(None)
+        
+        async def worker():
+            while True:
+                sku_set_id = await pending.get()
+                if sku_set_id is None:
+                    break
+                await results.put((sku_set_id, await api.fetch_sku_set_details(sku_set_id)))
+        
+        async def run_workers():
+            await asyncio.gather(*(worker() for _ in range(worker_count)))
+            await results.put(None)
+        
+        async def write():
+            details = {}
+            while True:
+                entry = await results.get()
+                if entry is not None:
+                    details[entry[0]] = entry[1]
+                if details and (entry is None or len(details) >= self.config.SKU_DETAILS_QUEUE_SIZE):
+                    await self.staging.save_sku_details(details)
+                    details = {}
+                if entry is None:
+                    break
+        
+        if staged_ids:
+            logger.info(f"sku_sets: детали уже сохранены для {len(staged_ids)} наборов")
+        await self.run_stages(feed(), run_workers(), write())
+    
+    async def publish_staged(self):
+        """Перенос данных из staging в рабочие таблицы одной транзакцией
+        
+        Читатели в режиме WAL до commit видят прежнее состояние БД, после -
+        новое целиком. При ошибке транзакция откатывается, staging сохраняется.
+        """
+        self.atomic = True
+        try:
+            await self.load_references(self.staging)
+            with self.timed('discount_rules'):
+                await self.load_discount_rules(self.staging)
+            await self.staging.clear()
+            with self.metrics.timer('discount_etl_sqlite_commit_seconds'):
+                await self.db.conn.commit()
+        except BaseException:
+            await self.db.conn.rollback()
+            raise
+        finally:
+            self.atomic = False
+        logger.info("Данные из staging опубликованы")
+    
+    @staticmethod
+    async def run_stages(*stages):
+        """Одновременный запуск стадий конвейера; при ошибке одной остальные отменяются"""
+        tasks = [asyncio.create_task(stage) for stage in stages]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    
+    @staticmethod
+    async def produce_pages(pages: AsyncIterator[List[Dict]], queue: asyncio.Queue):
+        """Стадия-источник: страницы API в очередь, в конце None"""
+        async for page in pages:
+            await queue.put(page)
+        await queue.put(None)
+    
+    async def load_references(self, api: DiscountRulesAPI):
+        """Загрузка справочников: все списки запрашиваются одновременно
+        
+        Порядок соблюдается только при записи (REFERENCE_DEPENDENCIES): страницы
+        locations загружаются сразу, а пишутся после merchants, так как
+        merchant_name берется из reference_cache. Поэтому время загрузки -
+        примерно время самого медленного списка, а не сумма.
+        
+        Таблицы пишутся через одно соединение вперемешку, поэтому commit
+        откладывается до конца: иначе commit одной таблицы фиксировал бы
+        наполовину записанную другую.
+        """
+        loaded = {table_name: asyncio.Event() for table_name in self.REFERENCE_TABLES}
+        
+        async def dependencies_written(table_name: str):
+            for dependency in self.REFERENCE_DEPENDENCIES.get(table_name, ()):
+                await loaded[dependency].wait()
+        
+        async def load(table_name: str, loader):
+            logger.info(f"Загрузка {table_name}...")
+            with self.timed(table_name):
+                count = await loader(lambda: dependencies_written(table_name))
+            loaded[table_name].set()
+            logger.info(f"Загружено {count} {table_name}")
+        
+        loaders = {
+            'merchants': lambda ready: self.sync_reference(
+                api, 'merchants',
+                ('id', 'name', 'ext_code'),
+                lambda merchant: (merchant.get('id'), merchant.get('name'), merchant.get('extCode')),
+                ready
+            ),
+            'locations': lambda ready: self.sync_reference(
+                api, 'locations',
+                ('id', 'name', 'merchant_id', 'merchant_name', 'ext_code', 'address'),
+                lambda location: (
+                    location.get('id'),
+                    location.get('name'),
+                    location.get('merchantId'),
+                    self.reference_cache['merchants'].get(location.get('merchantId')),
+                    location.get('extCode'),
+                    location.get('address')
+                ),
+                ready
+            ),
+            'terminals': lambda ready: self.sync_reference(
+                api, 'terminals',
+                ('id', 'name', 'location_id', 'ext_code'),
+                lambda terminal: (terminal.get('id'), terminal.get('name'), terminal.get('locationId'), terminal.get('extCode')),
+                ready
+            ),
+            'sku_sets': lambda ready: self.load_sku_sets(api, ready),
+        }
+        
+        atomic = self.atomic
+        self.atomic = True
+        try:
+            await self.run_stages(*(load(table_name, loaders[table_name]) for table_name in self.REFERENCE_TABLES))
+        finally:
+            self.atomic = atomic
+        await self.commit()
+    
+    def count_rows(self, table_name: str, changed: int, removed: int):
+        self.metrics.inc('discount_etl_rows_changed_total', changed, table=table_name)
+        self.metrics.inc('discount_etl_rows_removed_total', removed, table=table_name)
+        if changed or removed:
+            self.changed_tables.add(table_name)
+    
+    def changed_report_tables(self) -> Set[str]:
+        """Измененные таблицы вместе с производными (дочерние таблицы правил, периоды, состав наборов)"""
+        changed = set(self.changed_tables)
+        if 'discount_rules' in changed:
+            changed.update(self.layout.TABLES)
+            changed.add('rule_time_windows')
+        if 'sku_sets' in changed:
+            changed.add('sku_set_items')
+        return changed
+    
+    async def discard_shadow(self, writer: RuleLayout):
+        """Удаление теневых таблиц после ошибки полной перезагрузки
+        
+        Рабочие таблицы не менялись. При атомарной публикации теневые таблицы
+        созданы в ее транзакции и исчезнут при откате.
+        """
+        if self.atomic:
+            return
+        await self.db.conn.rollback()
+        await writer.drop_shadow()
+        await self.db.conn.commit()
+    
+    async def begin_entity_sync(self, table_name: str) -> tuple:
+        """Подготовка к синхронизации таблицы: (сохраненные хеши, id в таблице)
+        
+        В полном режиме таблица и ее хеши очищаются, и возвращаются пустые значения.
+        """
+        if self.config.INCREMENTAL_SYNC:
+            return await self.db.get_hashes(table_name), await self.db.get_ids(table_name)
+        
+        await self.db.conn.execute(f"DELETE FROM {table_name}")
+        await self.db.clear_hashes(table_name)
+        return {}, set()
+    
+    async def sync_reference(self, api: DiscountRulesAPI, table_name: str, columns: tuple, to_row,
+                             ready: Optional[Callable[[], Awaitable]] = None) -> int:
+        """Потоковая запись справочника (id - первая колонка)
+        
+        Страницы API пишутся по мере получения. В инкрементальном режиме пишутся
+        только строки с изменившимся хешем, строки, пропавшие из API, удаляются.
+        Иначе таблица перезаливается целиком. Запись начинается после ready(),
+        страницы до этого копятся в очереди.
+        """
+        placeholders = ", ".join("?" for _ in columns)
+        insert_sql = f"INSERT OR REPLACE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+        
+        stored_hashes, existing_ids = await self.begin_entity_sync(table_name)
+        seen_ids = set()
+        changed_count = 0
+        pages: asyncio.Queue = asyncio.Queue(maxsize=self.config.PIPELINE_QUEUE_SIZE)
+        
+        async def write():
+            nonlocal changed_count
+            if ready is not None:
+                await ready()
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                
+                changed_rows = []
+                new_hashes = {}
+                for item in page:
+                    row = to_row(item)
+                    seen_ids.add(row[0])
+                    self.reference_cache[table_name][row[0]] = row[1]
+                    row_hash = DataProcessor.content_hash(row)
+                    if stored_hashes.get(row[0]) != row_hash:
+                        changed_rows.append(row)
+                        new_hashes[row[0]] = row_hash
+                
+                await self.db.conn.executemany(insert_sql, changed_rows)
+                await self.db.save_hashes(table_name, new_hashes)
+                changed_count += len(changed_rows)
+        
+        await self.run_stages(
+            self.produce_pages(api.iter_pages(self.config.ENDPOINTS[table_name]), pages),
+            write()
+        )
+        
+        removed_ids = existing_ids - seen_ids
+        await self.db.conn.executemany(f"DELETE FROM {table_name} WHERE id = ?", [(id_val,) for id_val in removed_ids])
+        await self.db.save_hashes(table_name, {}, removed_ids)
+        await self.commit()
+        
+        self.count_rows(table_name, changed_count, len(removed_ids))
+        if self.config.INCREMENTAL_SYNC:
+            logger.info(f"{table_name}: изменено {changed_count}, удалено {len(removed_ids)}")
+        return len(seen_ids)
+    
+    async def load_sku_sets(self, api: DiscountRulesAPI, ready: Optional[Callable[[], Awaitable]] = None) -> int:
+        """Загрузка SKU set с деталями пулом воркеров и записью в БД по мере готовности
+        
+        Страницы /skuSet/list раздаются воркерам (config.SKU_DETAILS_CONCURRENCY)
+        через ограниченную очередь, воркеры запрашивают /skuSet/get и кладут
+        результат во вторую ограниченную очередь, из которой читает запись в SQLite.
+        Так запросы и вставки идут одновременно, а память не растет.
+        Строки, хеш которых не изменился, не перезаписываются.
+        Состав набора пишется и в sku_sets.skus (JSON), и в sku_set_items.
+        """
+        stored_hashes, existing_ids = await self.begin_entity_sync('sku_sets')
+        if not self.config.INCREMENTAL_SYNC:
+            await self.db.conn.execute("DELETE FROM sku_set_items")
+        seen_ids = set()
+        changed_count = 0
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.config.SKU_DETAILS_QUEUE_SIZE)
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.config.SKU_DETAILS_QUEUE_SIZE)
+        worker_count = max(1, self.config.SKU_DETAILS_CONCURRENCY)
+        
+        async def feed():
+            async for page in api.iter_pages(self.config.ENDPOINTS['sku_sets']):
+                for sku_set in page:
+                    await pending.put(sku_set)
+            for _ in range(worker_count):
+                await pending.put(None)
+        
+        async def worker():
+            while True:
+                sku_set = await pending.get()
+                if sku_set is None:
+                    break
+                
+                sku_set_id = sku_set.get('id')
+                skus = []
+                if sku_set_id:
+                    skus = await api.fetch_sku_set_details(sku_set_id)
+                await results.put((sku_set, skus))
+        
+        async def run_workers():
+            await asyncio.gather(*(worker() for _ in range(worker_count)))
+            await results.put(None)
+        
+        async def write():
+            nonlocal changed_count
+            if ready is not None:
+                await ready()
+            while True:
+                entry = await results.get()
+                if entry is None:
+                    break
+                
+                sku_set, skus = entry
+                sku_set_id = sku_set.get('id')
+                row = (
+                    sku_set_id,
+                    sku_set.get('name'),
+                    sku_set.get('extCode'),
+                    json.dumps(skus) if skus else None,  # ← JSON массив
+                    sku_set.get('removed', 0),
+                    sku_set.get('onlyProduct', 0),
+                    sku_set.get('onlyFuel', 0)
+                )
+                seen_ids.add(sku_set_id)
+                
+                row_hash = DataProcessor.content_hash(row)
+                if stored_hashes.get(sku_set_id) != row_hash:
+                    await self.db.conn.execute(
+                        """INSERT OR REPLACE INTO sku_sets 
+                        (id, name, ext_code, skus, removed, only_product, only_fuel)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        row
+                    )
+                    await self.db.save_sku_set_items(sku_set_id, skus)
+                    await self.db.save_hashes('sku_sets', {sku_set_id: row_hash})
+                    changed_count += 1
+                
+                if len(seen_ids) % 10 == 0:
+                    logger.debug(f"Обработано {len(seen_ids)} sku_sets")
+                
+                self.reference_cache['sku_sets'][sku_set_id] = sku_set.get('name')
+        
+        await self.run_stages(feed(), run_workers(), write())
+        
+        removed_ids = existing_ids - seen_ids
+        await self.db.conn.executemany("DELETE FROM sku_sets WHERE id = ?", [(id_val,) for id_val in removed_ids])
+        await self.db.delete_sku_set_items(removed_ids)
+        await self.db.save_hashes('sku_sets', {}, removed_ids)
+        await self.commit()
+        self.count_rows('sku_sets', changed_count, len(removed_ids))
+        logger.info(f"sku_sets: изменено {changed_count}, удалено {len(removed_ids)}")
+        return len(seen_ids)
+    
+    async def load_discount_rules(self, api: DiscountRulesAPI):
+        """Загрузка правил скидок
+        
+        Трехстадийный конвейер: страницы API -> преобразование в строки таблиц ->
+        запись в SQLite. Стадии связаны ограниченными очередями
+        (config.PIPELINE_QUEUE_SIZE), поэтому сеть, CPU и диск работают
+        одновременно, а в памяти держится только несколько страниц.
+        """
+        logger.info("Загрузка discount_rules...")
+        
+        if self.config.INCREMENTAL_SYNC:
+            stored_hashes = await self.db.get_hashes('discount_rules')
+            existing_ids = await self.db.get_ids('discount_rules')
+            writer = self.layout
+        else:
+            # Полная перезагрузка пишет в теневые таблицы без индексов, рабочие
+            # таблицы до подмены в конце остаются прежними и видны читателям
+            stored_hashes = {}
+            existing_ids = set()
+            writer = LAYOUTS[self.config.LAYOUT](self.db.conn, shadow=True)
+            await writer.create_shadow()
+            await self.commit()
+        
+        await writer.prepare()
+        # В полном режиме хеши и периоды публикуются вместе с подменой таблиц
+        deferred_hashes = {}
+        deferred_windows = []
+        
+        seen_ids = set()
+        stats = {'fetched': 0, 'written': 0}
+        pages: asyncio.Queue = asyncio.Queue(maxsize=self.config.PIPELINE_QUEUE_SIZE)
+        batches: asyncio.Queue = asyncio.Queue(maxsize=self.config.PIPELINE_QUEUE_SIZE)
+        
+        async def transform():
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                
+                new_hashes = {}
+                time_windows = []
+                for rule in page:
+                    started = time.perf_counter()
+                    rule_id = rule.get('id')
+                    seen_ids.add(rule_id)
+                    rule_hash = DataProcessor.content_hash(rule)
+                    if stored_hashes.get(rule_id) == rule_hash:
+                        continue
+                    
+                    try:
+                        writer.add_rule(rule)
+                    except Exception as e:
+                        # Хеш не сохраняем, чтобы правило переобработалось при следующем запуске
+                        logger.error(f"Ошибка обработки правила {rule_id}: {e}")
+                        continue
+                    new_hashes[rule_id] = rule_hash
+                    time_windows.append((rule_id, rule.get('status'), rule.get('beginDate'), rule.get('endDate')))
+                    self.metrics.observe('discount_etl_rule_transform_seconds', time.perf_counter() - started)
+                
+                stats['fetched'] += len(page)
+                await batches.put((writer.take_batch(), new_hashes, time_windows))
+            
+            await batches.put(None)
+        
+        async def write():
+            while True:
+                entry = await batches.get()
+                if entry is None:
+                    break
+                
+                batch, new_hashes, time_windows = entry
+                if self.config.INCREMENTAL_SYNC:
+                    # Дочерние строки переписываются только у измененных правил
+                    await writer.delete_rule_children(new_hashes.keys())
+                    await writer.write_batch(batch)
+                    await self.db.save_time_windows(time_windows)
+                    await self.db.save_hashes('discount_rules', new_hashes)
+                else:
+                    await writer.write_batch(batch)
+                    deferred_hashes.update(new_hashes)
+                    deferred_windows.extend(time_windows)
+                await self.commit()
+                
+                stats['written'] += len(batch['discount_rules'])
+                logger.info(f"Обработано {stats['fetched']} правил, записано {stats['written']}")
+        
+        try:
+            await self.run_stages(
+                self.produce_pages(api.iter_pages(self.config.ENDPOINTS['discount_rules'], sort_field='priority'), pages),
+                transform(),
+                write()
+            )
+            
+            removed_ids = existing_ids - seen_ids
+            if self.config.INCREMENTAL_SYNC:
+                await writer.delete_rules(removed_ids)
+                await self.db.save_time_windows([], removed_ids)
+                await self.db.save_hashes('discount_rules', {}, removed_ids)
+            else:
+                await writer.publish_shadow()
+                await self.db.conn.execute("DELETE FROM rule_time_windows")
+                await self.db.save_time_windows(deferred_windows)
+                await self.db.clear_hashes('discount_rules')
+                await self.db.save_hashes('discount_rules', deferred_hashes)
+                logger.info("Таблицы правил заменены загруженными теневыми таблицами")
+        except BaseException:
+            if not self.config.INCREMENTAL_SYNC:
+                await self.discard_shadow(writer)
+            raise
+        
+        self.count_rows('discount_rules', stats['written'], len(removed_ids))
+        with self.timed('summary'):
+            await self.db.refresh_summary(
+                self.REFERENCE_TABLES + ('sku_set_items',) + self.layout.TABLES,
+                self.layout.SKU_SET_USAGE_SQL,
+                self.changed_report_tables(),
+                self.sync_run_id
+            )
+        await self.commit()
+        
+        if self.config.INCREMENTAL_SYNC:
+            logger.info(f"discount_rules: изменено {stats['written']}, удалено {len(removed_ids)}")
+        logger.info(f"Обработано {len(seen_ids)} правил скидок")
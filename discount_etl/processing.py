@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Преобразование значений из API: хеши содержимого, даты, поля value условий
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Any, Optional
+
+import pytz
+
+from .codec import normalize_value
+
+logger = logging.getLogger(__name__)
+
+
+class DataProcessor:
+    """Обработчик данных для трансформации и очистки"""
+    
+    @staticmethod
+    def content_hash(obj: Any) -> str:
+        """Стабильный хеш содержимого записи для инкрементальной синхронизации"""
+        payload = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    
+    @staticmethod
+    def timestamp_to_datetime(timestamp: Optional[int]) -> Optional[str]:
+        """Конвертация Unix timestamp в формат YYYY-MM-DD-HH-MM"""
+        if not timestamp:
+            return None
+        
+        try:
+            dt = datetime.fromtimestamp(timestamp / 1000, tz=pytz.UTC)
+            return dt.strftime("%Y-%m-%d-%H-%M")
+        except Exception as e:
+            logger.warning(f"Ошибка конвертации timestamp {timestamp}: {e}")
+            return None
+    
+    @staticmethod
+    def parse_value_field(value_str: Optional[str]) -> Optional[str]:
+        """Парсинг поля value для извлечения ids или сохранения как JSON"""
+        if not value_str:
+            return None
+        
+        try:
+            # ids - JSON массивом, id или value - строкой, иначе весь объект как JSON
+            return normalize_value(value_str)
+        except Exception as e:
+            logger.warning(f"Ошибка парсинга value: {value_str[:100] if value_str else 'None'}... - {e}")
+            return value_str
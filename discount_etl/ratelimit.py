@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Адаптивный ограничитель частоты запросов (token bucket)
+
+Каждый запрос забирает токен; токены пополняются со скоростью rate в секунду
+до емкости burst. Скорость подстраивается под сервер:
+- успешные ответы увеличивают rate в (1 + increase) раз, до max_rate;
+- 429, 5xx, таймаут или ошибка соединения делят rate пополам (до min_rate)
+  и обнуляют накопленные токены; Retry-After из ответа приостанавливает
+  выдачу токенов всем запросам на указанное время.
+
+Снижение срабатывает не чаще раза в cooldown секунд: запросы, отправленные
+до снижения, обычно отказывают пачкой, и считать их по отдельности значило
+бы уронить скорость до минимума из-за одного всплеска. Рост тоже идет не
+чаще раза в cooldown (и не раньше cooldown после снижения): иначе при
+сотнях ответов в секунду скорость за доли секунды уходила бы в max_rate.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+
+class AdaptiveRateLimiter:
+    """Token bucket с мультипликативным ростом и снижением скорости"""
+
+    def __init__(self, rate: float, min_rate: float, max_rate: float,
+                 burst: float = 1, increase: float = 0.05, decrease: float = 0.5,
+                 cooldown: float = 1.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = max(1.0, burst)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.decreased_at = float('-inf')
+        self.increased_at = float('-inf')
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Дождаться токена"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        """Сервер справляется: повысить скорость, не чаще раза в cooldown"""
+        now = time.monotonic()
+        if now - max(self.increased_at, self.decreased_at) >= self.cooldown:
+            self.rate = min(self.max_rate, self.rate * (1 + self.increase))
+            self.increased_at = now
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Сервер перегружен: снизить скорость, при Retry-After - пауза для всех"""
+        now = time.monotonic()
+        self._refill(now)
+        if now - self.decreased_at >= self.cooldown:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.decreased_at = now
+        self.tokens = 0.0
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
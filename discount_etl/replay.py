@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Запись и воспроизведение ответов API
+
+RecordingAPI работает как обычный клиент и дополнительно сохраняет каждый
+полученный ответ (страницу списка или детали SKU set) сжатым файлом в
+каталоге кеша. ReplayAPI отдает те же ответы из кеша без сети, поэтому весь
+ETLPipeline можно прогнать офлайн: замерить и профилировать преобразование
+и запись в SQLite отдельно от API и повторять загрузку без обращения к
+рабочему серверу.
+
+Структура каталога:
+    manifest.json                     - BATCH_SIZE, адрес API, время записи
+    <endpoint>/<offset>.json.<codec>  - ответ на запрос страницы
+    sku_set/<id>.json.<codec>         - ответ /skuSet/get (null - набора нет, 404)
+
+В файл пишется тело ответа как оно получено (байты, без повторной
+сериализации) и сжимается zstd, если установлен пакет zstandard, иначе gzip;
+при чтении формат определяется по расширению.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from .api import APIError, APIResponse, DiscountRulesAPI, decode_json
+from .config import Config
+from .metrics import MetricsRegistry
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+SKU_SET_DIR = "sku_set"
+# Ответ для набора, которого нет на сервере (404)
+MISSING_RESPONSE = b"null"
+
+
+class ResponseCache:
+    """Каталог сжатых ответов API"""
+
+    def __init__(self, path: str, codec: Optional[str] = None):
+        self.path = Path(path)
+        self.codec = codec or ('zst' if zstandard is not None else 'gz')
+        if self.codec == 'zst' and zstandard is None:
+            raise ValueError("Для сжатия zstd нужен пакет zstandard")
+
+    @staticmethod
+    def endpoint_dir(endpoint: str) -> str:
+        """Имя каталога списка: '/discountRule/list' -> 'discountRule_list'"""
+        return endpoint.strip('/').replace('/', '_')
+
+    def _page_stem(self, endpoint: str, offset: int) -> Path:
+        return self.path / self.endpoint_dir(endpoint) / f"{offset}.json"
+
+    def _sku_set_stem(self, sku_set_id: int) -> Path:
+        return self.path / SKU_SET_DIR / f"{sku_set_id}.json"
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == 'zst':
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def _decompress(path: Path) -> bytes:
+        data = path.read_bytes()
+        if path.suffix == '.zst':
+            if zstandard is None:
+                raise APIError(f"{path}: для чтения zstd нужен пакет zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def _write(self, stem: Path, body: bytes):
+        """Запись через временный файл: прерванная запись не оставляет битый ответ"""
+        stem.parent.mkdir(parents=True, exist_ok=True)
+        target = stem.with_name(f"{stem.name}.{self.codec}")
+        temp = target.with_name(target.name + '.tmp')
+        temp.write_bytes(self._compress(body))
+        os.replace(temp, target)
+
+    @staticmethod
+    def _find(stem: Path) -> Optional[Path]:
+        for codec in ('zst', 'gz'):
+            path = stem.with_name(f"{stem.name}.{codec}")
+            if path.exists():
+                return path
+        return None
+
+    def write_manifest(self, config: Config):
+        self.path.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "batch_size": config.BATCH_SIZE,
+            "base_url": config.BASE_URL,
+            "codec": self.codec,
+            "recorded_at": time.time(),
+        }
+        (self.path / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+
+    def read_manifest(self) -> Dict:
+        manifest_path = self.path / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise APIError(f"{self.path}: не найден {MANIFEST_FILE}, это не каталог записанных ответов")
+        return json.loads(manifest_path.read_text(encoding='utf-8'))
+
+    def save_page(self, endpoint: str, offset: int, body: bytes):
+        self._write(self._page_stem(endpoint, offset), body)
+
+    def load_page(self, endpoint: str, offset: int) -> Optional[Dict]:
+        path = self._find(self._page_stem(endpoint, offset))
+        return decode_json(self._decompress(path)) if path else None
+
+    def iter_pages(self, endpoint: str) -> Iterator[Dict]:
+        """Все записанные ответы списка в порядке offset"""
+        offsets = sorted(
+            int(path.name.split('.', 1)[0])
+            for path in (self.path / self.endpoint_dir(endpoint)).glob('*.json.*')
+            if not path.name.endswith('.tmp')
+        )
+        for offset in offsets:
+            yield self.load_page(endpoint, offset)
+
+    def save_sku_set(self, sku_set_id: int, body: Optional[bytes]):
+        self._write(self._sku_set_stem(sku_set_id), MISSING_RESPONSE if body is None else body)
+
+    def load_sku_set(self, sku_set_id: int) -> Optional[Dict]:
+        path = self._find(self._sku_set_stem(sku_set_id))
+        if path is None:
+            raise APIError(f"SKU set {sku_set_id}: ответ не записан в {self.path}", 404)
+        return decode_json(self._decompress(path))
+
+
+class RecordingAPI(DiscountRulesAPI):
+    """Клиент API, сохраняющий все полученные ответы в ResponseCache"""
+
+    def __init__(self, config: Config, cache: ResponseCache, connector=None,
+                 metrics: Optional[MetricsRegistry] = None):
+        super().__init__(config, connector, metrics)
+        self.cache = cache
+        # Сохраняются исходные байты ответа, без повторной сериализации
+        self.keep_raw = True
+
+    async def __aenter__(self):
+        self.cache.write_manifest(self.config)
+        logger.info(f"Ответы API записываются в {self.cache.path}")
+        return await super().__aenter__()
+
+    async def _request_page(self, endpoint: str, offset: int, sort_field: str) -> APIResponse:
+        response = await super()._request_page(endpoint, offset, sort_field)
+        self.cache.save_page(endpoint, offset, response.raw)
+        return response
+
+    async def _request_sku_set(self, sku_set_id: int) -> Optional[APIResponse]:
+        response = await super()._request_sku_set(sku_set_id)
+        self.cache.save_sku_set(sku_set_id, response.raw if response is not None else None)
+        return response
+
+
+class ReplayAPI(DiscountRulesAPI):
+    """Источник данных с интерфейсом DiscountRulesAPI, отдающий записанные ответы
+
+    Сеть не используется: нет сессии, авторизации и ограничения частоты.
+    Пагинация (iter_pages, iter_offsets, ...) та же, что у клиента, поэтому
+    BATCH_SIZE должен совпадать с размером страницы при записи.
+    """
+
+    def __init__(self, config: Config, cache: ResponseCache, metrics: Optional[MetricsRegistry] = None):
+        super().__init__(config, metrics=metrics)
+        self.cache = cache
+        self.limiter = None
+
+    async def __aenter__(self):
+        manifest = self.cache.read_manifest()
+        if manifest.get('batch_size') != self.config.BATCH_SIZE:
+            raise APIError(
+                f"Ответы в {self.cache.path} записаны с BATCH_SIZE={manifest.get('batch_size')}, "
+                f"а задан {self.config.BATCH_SIZE}"
+            )
+        logger.info(f"Воспроизведение ответов API из {self.cache.path} "
+                    f"(записаны с {manifest.get('base_url')})")
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def login(self):
+        pass
+
+    async def _request_page(self, endpoint: str, offset: int, sort_field: str) -> APIResponse:
+        response = self.cache.load_page(endpoint, offset)
+        if response is None:
+            if offset == 0:
+                raise APIError(f"{endpoint}: список не записан в {self.cache.path}", 404)
+            # Страница за концом списка (при записи в другом режиме пагинации не запрашивалась)
+            logger.debug(f"{endpoint} (offset: {offset}) нет в записи, считается пустой страницей")
+            return APIResponse({"data": [], "count": 0})
+        return APIResponse(response)
+
+    async def _request_sku_set(self, sku_set_id: int) -> Optional[APIResponse]:
+        response = self.cache.load_sku_set(sku_set_id)
+        return APIResponse(response) if response is not None else None
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Инвертированный индекс правил по торговой точке
+
+Для каждого правила выбирается одно "ключевое" условие из rule_conditions на
+POS-термінал, Підрозділ, Організація или Термінальна група с оператором
+= / IN, и правило регистрируется под каждым значением этого условия
+(все условия правила обязательны, поэтому правило не может подойти точке,
+не совпавшей с ключом). Правила без такого условия попадают в unrestricted
+и проверяются всегда.
+
+Кандидаты для корзины собираются объединением нескольких словарных
+обращений, то есть за O(подходящих правил), а не O(всех правил).
+Окончательную проверку условий выполняет RuleEngine.
+"""
+
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+# Коды mapping_data_values, по которым строится индекс
+COND_MERCHANT = 0
+COND_LOCATION = 1
+COND_TERMINAL = 2
+COND_TERMINAL_GROUP = 22
+
+INDEXED_CONDITION_TYPES = (COND_TERMINAL, COND_LOCATION, COND_MERCHANT, COND_TERMINAL_GROUP)
+
+# Коды mapping_operators, при которых условие сужает набор точек
+POSITIVE_OPERATORS = (0, 6)
+
+
+class RuleIndex:
+    """Индекс id правил по значениям условий торговой точки"""
+
+    def __init__(self):
+        self.postings: Dict[int, Dict[Any, Set[int]]] = {
+            condition_type: {} for condition_type in INDEXED_CONDITION_TYPES
+        }
+        self.unrestricted: Set[int] = set()
+        # Ключ, под которым зарегистрировано правило: (тип условия, значения) или None
+        self.keys: Dict[int, Optional[Tuple[int, FrozenSet]]] = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, rule_id: int) -> bool:
+        return rule_id in self.keys
+
+    @staticmethod
+    def choose_key(conditions: Iterable[tuple]) -> Optional[Tuple[int, FrozenSet]]:
+        """Самое избирательное (с наименьшим числом значений) условие правила"""
+        best = None
+        for condition_type, op, expected in conditions:
+            if condition_type not in INDEXED_CONDITION_TYPES or op not in POSITIVE_OPERATORS:
+                continue
+            if expected is None:
+                continue
+            values = expected if isinstance(expected, frozenset) else frozenset((expected,))
+            if best is None or len(values) < len(best[1]):
+                best = (condition_type, values)
+        return best
+
+    def add(self, rule_id: int, conditions: Iterable[tuple]):
+        """Регистрация (или перерегистрация) правила"""
+        if rule_id in self.keys:
+            self.remove(rule_id)
+
+        key = self.choose_key(conditions)
+        self.keys[rule_id] = key
+        if key is None:
+            self.unrestricted.add(rule_id)
+            return
+
+        condition_type, values = key
+        postings = self.postings[condition_type]
+        for value in values:
+            postings.setdefault(value, set()).add(rule_id)
+
+    def remove(self, rule_id: int):
+        """Удаление правила из индекса (отсутствующее правило игнорируется)"""
+        if rule_id not in self.keys:
+            return
+
+        key = self.keys.pop(rule_id)
+        if key is None:
+            self.unrestricted.discard(rule_id)
+            return
+
+        condition_type, values = key
+        postings = self.postings[condition_type]
+        for value in values:
+            rule_ids = postings.get(value)
+            if rule_ids is not None:
+                rule_ids.discard(rule_id)
+                if not rule_ids:
+                    del postings[value]
+
+    def candidates(self, context: Dict[int, Any]) -> Set[int]:
+        """Id правил, которые могут подойти точке (context - значения по кодам data_values)"""
+        result = set(self.unrestricted)
+        for condition_type in INDEXED_CONDITION_TYPES:
+            value = context.get(condition_type)
+            if value is None:
+                continue
+            postings = self.postings[condition_type]
+            if isinstance(value, (frozenset, set, list, tuple)):
+                for item in value:
+                    rule_ids = postings.get(item)
+                    if rule_ids:
+                        result |= rule_ids
+            else:
+                rule_ids = postings.get(value)
+                if rule_ids:
+                    result |= rule_ids
+        return result
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс состава наборов товаров (SKU set)
+
+Состав каждого набора хранится отсортированным массивом array('q')
+(8 байт на SKU вместо ~60 у элемента frozenset), проверка "SKU в наборе" -
+двоичный поиск, O(log n). Обратный индекс SKU -> наборы позволяет один раз
+на корзину получить наборы каждой позиции и дальше проверять принадлежность
+за O(1).
+
+Источник данных - таблица sku_set_items (PRIMARY KEY (sku_set_id, sku_id)),
+поэтому выборка с ORDER BY sku_set_id, sku_id сразу дает отсортированные массивы.
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, FrozenSet, Iterable, Set
+
+EMPTY_SET: FrozenSet[int] = frozenset()
+
+
+class SkuSetIndex:
+    """Состав наборов товаров и обратный индекс SKU -> наборы"""
+
+    def __init__(self):
+        self.members: Dict[int, array] = {}
+        self.containing: Dict[int, Set[int]] = {}
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, sku_set_id: int) -> bool:
+        return sku_set_id in self.members
+
+    def set_members(self, sku_set_id: int, skus: Iterable[int]):
+        """Замена состава набора"""
+        self.remove(sku_set_id)
+
+        members = array('q', sorted(set(skus)))
+        self.members[sku_set_id] = members
+        for sku_id in members:
+            self.containing.setdefault(sku_id, set()).add(sku_set_id)
+
+    def remove(self, sku_set_id: int):
+        """Удаление набора (отсутствующий набор игнорируется)"""
+        members = self.members.pop(sku_set_id, None)
+        if members is None:
+            return
+
+        for sku_id in members:
+            sets = self.containing.get(sku_id)
+            if sets is not None:
+                sets.discard(sku_set_id)
+                if not sets:
+                    del self.containing[sku_id]
+
+    def contains(self, sku_set_id: int, sku_id: int) -> bool:
+        """Входит ли SKU в набор (неизвестный набор считается пустым)"""
+        members = self.members.get(sku_set_id)
+        if not members:
+            return False
+        position = bisect_left(members, sku_id)
+        return position < len(members) and members[position] == sku_id
+
+    def sets_containing(self, sku_id: int) -> FrozenSet[int]:
+        """Id наборов, в которые входит SKU"""
+        sets = self.containing.get(sku_id)
+        return frozenset(sets) if sets else EMPTY_SET
+
+    def members_of(self, sku_set_id: int) -> array:
+        """Отсортированный состав набора"""
+        return self.members.get(sku_set_id, array('q'))
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Промежуточное хранилище (staging) для возобновляемой синхронизации
+
+Страницы списков API и детали SKU set сначала сохраняются как есть
+(JSON-строками) в таблицы sync_staging_* той же БД, каждая страница - своим
+commit. Если процесс прервался, следующий запуск запрашивает только
+недостающие offset и недостающие детали.
+
+Когда все списки получены полностью, конвейер читает страницы из staging
+вместо API (SyncStaging повторяет интерфейс iter_pages / fetch_sku_set_details
+клиента) и публикует их в рабочие таблицы одной транзакцией вместе с
+очисткой staging.
+
+Сохраненные данные отбрасываются, если они старше STAGING_MAX_AGE_HOURS
+или получены с другим BATCH_SIZE (offset страниц тогда не совпадут).
+"""
+
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import aiosqlite
+
+from .api import IncompleteDataError
+
+logger = logging.getLogger(__name__)
+
+
+class SyncStaging:
+    """Страницы API и детали SKU set, сохраненные до публикации"""
+
+    def __init__(self, conn: aiosqlite.Connection, batch_size: int, max_age_hours: float):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.max_age_seconds = max_age_hours * 3600
+
+    async def create_schema(self):
+        await self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sync_staging_endpoints (
+                endpoint TEXT PRIMARY KEY,
+                batch_size INTEGER NOT NULL,
+                total_count INTEGER,
+                complete INTEGER NOT NULL DEFAULT 0,
+                started_at REAL NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS sync_staging_pages (
+                endpoint TEXT NOT NULL,
+                page_offset INTEGER NOT NULL,
+                item_count INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (endpoint, page_offset)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS sync_staging_sku_details (
+                sku_set_id INTEGER PRIMARY KEY,
+                skus TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+        """)
+        await self.conn.commit()
+
+    async def discard_stale(self):
+        """Удаление устаревших данных и данных с другим размером страницы"""
+        min_started_at = time.time() - self.max_age_seconds
+        async with self.conn.execute(
+            "SELECT endpoint FROM sync_staging_endpoints WHERE started_at < ? OR batch_size != ?",
+            (min_started_at, self.batch_size)
+        ) as cursor:
+            stale = [row[0] async for row in cursor]
+
+        for endpoint in stale:
+            await self.discard(endpoint)
+        await self.conn.execute("DELETE FROM sync_staging_sku_details WHERE fetched_at < ?", (min_started_at,))
+        await self.conn.commit()
+        if stale:
+            logger.info(f"Устаревшие данные staging отброшены: {', '.join(stale)}")
+
+    async def discard(self, endpoint: str):
+        """Удаление сохраненных страниц списка (без commit)"""
+        await self.conn.execute("DELETE FROM sync_staging_pages WHERE endpoint = ?", (endpoint,))
+        await self.conn.execute("DELETE FROM sync_staging_endpoints WHERE endpoint = ?", (endpoint,))
+
+    async def get_state(self, endpoint: str) -> tuple:
+        """(total_count или None, получен ли список полностью, множество сохраненных offset)"""
+        async with self.conn.execute(
+            "SELECT total_count, complete FROM sync_staging_endpoints WHERE endpoint = ?", (endpoint,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None, False, set()
+
+        async with self.conn.execute(
+            "SELECT page_offset FROM sync_staging_pages WHERE endpoint = ?", (endpoint,)
+        ) as cursor:
+            done_offsets = {page_row[0] async for page_row in cursor}
+        return row[0], bool(row[1]), done_offsets
+
+    async def save_page(self, endpoint: str, offset: int, items: List[Dict], total_count: int):
+        """Сохранение страницы и count списка (с commit - это и есть контрольная точка)"""
+        await self.conn.execute(
+            """INSERT INTO sync_staging_endpoints (endpoint, batch_size, total_count, started_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(endpoint) DO UPDATE SET total_count = excluded.total_count""",
+            (endpoint, self.batch_size, total_count, time.time())
+        )
+        # Пустые страницы не сохраняются: иначе при возобновлении они не будут перезапрошены
+        if items:
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO sync_staging_pages (endpoint, page_offset, item_count, payload) VALUES (?, ?, ?, ?)",
+                (endpoint, offset, len(items), json.dumps(items, ensure_ascii=False))
+            )
+        await self.conn.commit()
+
+    async def mark_complete(self, endpoint: str):
+        """Отметка, что список получен полностью
+
+        Если сохранено меньше записей, чем count, страницы списка отбрасываются
+        (данные на сервере сдвинулись) и поднимается IncompleteDataError.
+        """
+        async with self.conn.execute(
+            """SELECT e.total_count, COALESCE(SUM(p.item_count), 0)
+               FROM sync_staging_endpoints e
+               LEFT JOIN sync_staging_pages p ON p.endpoint = e.endpoint
+               WHERE e.endpoint = ?""",
+            (endpoint,)
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        total_count, received = (row[0] or 0, row[1]) if row else (0, 0)
+        if received < total_count:
+            await self.discard(endpoint)
+            await self.conn.commit()
+            raise IncompleteDataError(f"{endpoint}: получено {received} записей из {total_count}")
+
+        await self.conn.execute(
+            "UPDATE sync_staging_endpoints SET complete = 1 WHERE endpoint = ?", (endpoint,)
+        )
+        await self.conn.commit()
+
+    async def get_sku_detail_ids(self) -> Set[int]:
+        async with self.conn.execute("SELECT sku_set_id FROM sync_staging_sku_details") as cursor:
+            return {row[0] async for row in cursor}
+
+    async def save_sku_details(self, details: Dict[int, List[int]]):
+        """Сохранение деталей пачки SKU set (с commit)"""
+        now = time.time()
+        await self.conn.executemany(
+            "INSERT OR REPLACE INTO sync_staging_sku_details (sku_set_id, skus, fetched_at) VALUES (?, ?, ?)",
+            [(sku_set_id, json.dumps(skus), now) for sku_set_id, skus in details.items()]
+        )
+        await self.conn.commit()
+
+    async def clear(self):
+        """Очистка staging (без commit: выполняется в транзакции публикации)"""
+        await self.conn.execute("DELETE FROM sync_staging_pages")
+        await self.conn.execute("DELETE FROM sync_staging_endpoints")
+        await self.conn.execute("DELETE FROM sync_staging_sku_details")
+
+    # ------------------------------------------------------------------ #
+    # Интерфейс источника данных (как у DiscountRulesAPI)
+
+    async def iter_pages(self, endpoint: str, sort_field: str = "name",
+                         concurrent: Optional[bool] = None) -> AsyncIterator[List[Dict]]:
+        """Сохраненные страницы списка в порядке offset"""
+        async with self.conn.execute(
+            "SELECT payload FROM sync_staging_pages WHERE endpoint = ? ORDER BY page_offset", (endpoint,)
+        ) as cursor:
+            async for row in cursor:
+                yield json.loads(row[0])
+
+    async def fetch_sku_set_details(self, sku_set_id: int) -> List[int]:
+        async with self.conn.execute(
+            "SELECT skus FROM sync_staging_sku_details WHERE sku_set_id = ?", (sku_set_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return json.loads(row[0]) if row else []
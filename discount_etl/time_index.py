@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс периодов действия правил (begin_date / end_date)
+
+Время везде - миллисекунды Unix (как beginDate/endDate в API), период
+включает обе границы, пустая граница - без ограничения. В БД те же значения
+для любой схемы хранения лежат в таблице rule_time_windows.
+
+- active_at(ts): правила, действующие в момент ts. Запрос к центрированному
+  дереву интервалов - O(log n + k); результат кешируется до следующей
+  границы периода, поэтому поток корзин "около сейчас" обходится одним
+  bisect на запрос.
+- events(start, end) / upcoming_events(now, hours): начала и окончания
+  действия правил в окне времени по отсортированным массивам границ.
+
+Изменения (add/remove) помечают индекс устаревшим, дерево перестраивается
+при следующем запросе.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+NEG_INF = float('-inf')
+POS_INF = float('inf')
+
+EVENT_ACTIVATE = 'activate'
+EVENT_EXPIRE = 'expire'
+
+HOUR_MS = 3600 * 1000
+
+
+class TimeWindowIndex:
+    """Периоды действия правил и запросы "что действует в момент T" """
+
+    def __init__(self):
+        # rule_id -> (начало, конец) с бесконечностями вместо пустых границ
+        self.windows: Dict[int, Tuple[float, float]] = {}
+        self._dirty = True
+        self._tree = None
+        self._begins: List[Tuple[float, int]] = []
+        self._ends: List[Tuple[float, int]] = []
+        self._boundaries: List[float] = []
+        self._cached_segment: Optional[int] = None
+        self._cached_active: FrozenSet[int] = frozenset()
+
+    def __len__(self):
+        return len(self.windows)
+
+    def add(self, rule_id: int, begin_ts: Optional[int], end_ts: Optional[int]):
+        """Регистрация (или замена) периода правила"""
+        self.windows[rule_id] = (
+            NEG_INF if begin_ts is None else begin_ts,
+            POS_INF if end_ts is None else end_ts
+        )
+        self._dirty = True
+
+    def remove(self, rule_id: int):
+        if self.windows.pop(rule_id, None) is not None:
+            self._dirty = True
+
+    # ------------------------------------------------------------------ #
+    # Построение
+
+    def _rebuild(self):
+        intervals = [(begin, end, rule_id) for rule_id, (begin, end) in self.windows.items() if begin <= end]
+        self._tree = self._build_tree(intervals)
+        self._begins = sorted((begin, rule_id) for begin, _, rule_id in intervals if begin != NEG_INF)
+        self._ends = sorted((end, rule_id) for _, end, rule_id in intervals if end != POS_INF)
+        # Точки, в которых меняется набор действующих правил: начало и момент после конца
+        self._boundaries = sorted(
+            {begin for begin, _ in self._begins} | {end + 1 for end, _ in self._ends}
+        )
+        self._cached_segment = None
+        self._dirty = False
+
+    @staticmethod
+    def _build_tree(intervals: List[Tuple[float, float, int]]):
+        """Центрированное дерево: (центр, по началу, по концу убыв., левое, правое)"""
+        if not intervals:
+            return None
+
+        points = sorted(point for begin, end, _ in intervals for point in (begin, end))
+        center = points[len(points) // 2]
+        left = [interval for interval in intervals if interval[1] < center]
+        right = [interval for interval in intervals if interval[0] > center]
+        middle = [interval for interval in intervals if interval[0] <= center <= interval[1]]
+        return (
+            center,
+            sorted(middle, key=lambda interval: interval[0]),
+            sorted(middle, key=lambda interval: interval[1], reverse=True),
+            TimeWindowIndex._build_tree(left),
+            TimeWindowIndex._build_tree(right),
+        )
+
+    def _query_tree(self, ts: float) -> FrozenSet[int]:
+        active = []
+        node = self._tree
+        while node is not None:
+            center, by_begin, by_end, left, right = node
+            if ts < center:
+                for begin, _, rule_id in by_begin:
+                    if begin > ts:
+                        break
+                    active.append(rule_id)
+                node = left
+            elif ts > center:
+                for _, end, rule_id in by_end:
+                    if end < ts:
+                        break
+                    active.append(rule_id)
+                node = right
+            else:
+                active.extend(rule_id for _, _, rule_id in by_begin)
+                break
+        return frozenset(active)
+
+    # ------------------------------------------------------------------ #
+    # Запросы
+
+    def active_at(self, ts: int) -> FrozenSet[int]:
+        """Id правил, период которых включает момент ts"""
+        if self._dirty:
+            self._rebuild()
+
+        segment = bisect_right(self._boundaries, ts)
+        if segment != self._cached_segment:
+            self._cached_active = self._query_tree(ts)
+            self._cached_segment = segment
+        return self._cached_active
+
+    def events(self, start_ts: int, end_ts: int) -> List[Tuple[int, str, int]]:
+        """События (момент, 'activate' | 'expire', rule_id) в окне [start_ts, end_ts)
+
+        Для окончания моментом события считается end_date - последняя
+        миллисекунда действия правила.
+        """
+        if self._dirty:
+            self._rebuild()
+
+        events = []
+        for boundaries, kind in ((self._begins, EVENT_ACTIVATE), (self._ends, EVENT_EXPIRE)):
+            position = bisect_left(boundaries, (start_ts, NEG_INF))
+            while position < len(boundaries) and boundaries[position][0] < end_ts:
+                ts, rule_id = boundaries[position]
+                events.append((int(ts), kind, rule_id))
+                position += 1
+        events.sort()
+        return events
+
+    def upcoming_events(self, now_ts: int, hours: float = 24) -> List[Tuple[int, str, int]]:
+        """События ближайших hours часов от now_ts"""
+        return self.events(now_ts, now_ts + int(hours * HOUR_MS))
+
+    def next_change_after(self, ts: int) -> Optional[int]:
+        """Ближайший момент после ts, когда меняется набор действующих правил"""
+        if self._dirty:
+            self._rebuild()
+
+        position = bisect_right(self._boundaries, ts)
+        if position < len(self._boundaries):
+            return int(self._boundaries[position])
+        return None
@@ -2,50 +2,42 @@
 # -*- coding: utf-8 -*-
 """
 Генератор HTML отчета для проверки загруженных данных скидок
+
+Итоговые числа (строки таблиц, правила по статусам, использование наборов
+товаров) читаются из сводных таблиц report_*, которые ETL пересчитывает
+в транзакции загрузки, поэтому время построения отчета не растет с объемом
+каталога.
+
+Обычный отчет - одна страница с первыми строками каждого раздела. Полный
+отчет (--full) содержит все правила, условия и результаты: строки читаются
+курсором порциями (fetchmany) и сразу пишутся в HTML-страницы по page_size
+строк, плюс страница index.html со сводкой и ссылками. В памяти держится
+одна порция строк, поэтому объем каталога ограничен только диском.
+
+Разделы кешируются. ETL пишет в report_table_versions id запуска, последним
+изменившего каждую таблицу; ключ раздела - версии его таблиц (и текущая
+минута для активных правил). Раздел с прежним ключом берется из кеша
+(--cache-dir; для полного отчета - уже записанные страницы), запросы
+выполняются только для разделов, таблицы которых изменились. Внутри одного
+процесса (панель, обновляющая отчет по таймеру) PRAGMA data_version без
+изменений означает, что БД никто не менял и отчет перестраивать не нужно.
+
+Запуск:
+    python generate_report.py
+    python generate_report.py --full --output-dir report --page-size 1000
 """
 
+import argparse
+import html
+import json
+import os
 import sqlite3
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
 
-
-class ReportGenerator:
-    """Генератор отчетов из БД"""
-    
-    def __init__(self, db_path: str = "discount_rules.db"):
-        self.db_path = db_path
-        self.conn = None
-    
-    def connect(self):
-        """Подключение к БД"""
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.row_factory = sqlite3.Row
-    
-    def close(self):
-        """Закрытие соединения"""
-        if self.conn:
-            self.conn.close()
-    
-    def execute_query(self, query: str):
-        """Выполнение запроса и возврат результатов"""
-        cursor = self.conn.cursor()
-        cursor.execute(query)
-        return cursor.fetchall()
-    
-    def generate_html_report(self, output_file: str = "discount_report.html"):
-        """Генерация HTML отчета"""
-        
-        html_parts = []
-        
-        # HTML шапка
-        html_parts.append("""
-<!DOCTYPE html>
-<html lang="uk">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Звіт по правилах знижок</title>
-    <style>
+# CSS общий для обычного и полного отчета
+STYLE = """
         * {
             margin: 0;
             padding: 0;
@@ -229,30 +221,441 @@ class ReportGenerator:
             color: #95a5a6;
             font-size: 14px;
         }
-    </style>
+"""
+
+# Добавка к STYLE для страниц полного отчета
+PAGER_STYLE = """
+        .pager {
+            display: flex;
+            gap: 20px;
+            margin: 20px 0;
+            font-size: 14px;
+        }
+        
+        .pager a {
+            color: #3498db;
+            text-decoration: none;
+            font-weight: 600;
+        }
+        
+        .page-list a {
+            display: inline-block;
+            margin: 4px 8px 4px 0;
+            color: #3498db;
+            font-size: 14px;
+        }
+"""
+
+# Строк, читаемых из курсора за раз
+FETCH_SIZE = 2000
+
+# Ключи и страницы разделов полного отчета в его каталоге
+FULL_REPORT_MANIFEST = ".report_cache.json"
+# Входит в ключи кеша: увеличивается при изменении разметки разделов
+CACHE_VERSION = 1
+
+
+def page_head(title: str, style: str = STYLE) -> str:
+    """Начало HTML-страницы до открытого div.container"""
+    return f"""<!DOCTYPE html>
+<html lang="uk">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{html.escape(title)}</title>
+    <style>{style}    </style>
 </head>
 <body>
     <div class="container">
-        <h1>📊 Звіт по правилах знижок</h1>
+"""
+
+
+PAGE_END = """
+        <div class="footer">
+            <p>Згенеровано автоматично | ETL Pipeline для правил знижок</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+class Column(NamedTuple):
+    """Колонка раздела полного отчета"""
+    title: str
+    numeric: bool = False
+
+
+class Section(NamedTuple):
+    """Раздел полного отчета: запрос строк и колонки в порядке полей запроса"""
+    name: str
+    title: str
+    query: str
+    columns: Sequence[Column]
+    # Таблица, без которой раздел пропускается (например, в JSON-схеме хранения)
+    required_table: str
+    # Таблицы, от которых зависят строки раздела (ключ кеша)
+    source_tables: Sequence[str]
+
+
+class PagedTableWriter:
+    """Потоковая запись строк одного раздела в HTML-файлы по page_size строк
+    
+    Страница <name>-NNNN.html закрывается, когда приходит первая строка
+    следующей, поэтому ссылка "далі" ставится только если она действительно есть.
+    """
+    
+    def __init__(self, output_dir: Path, section: Section, page_size: int):
+        self.output_dir = output_dir
+        self.section = section
+        self.page_size = page_size
+        self.pages: List[tuple] = []  # (имя файла, номер первой строки, номер последней)
+        self.rows = 0
+        self.file = None
+        self.header = "<tr>" + "".join(f"<th>{html.escape(column.title)}</th>" for column in section.columns) + "</tr>"
+        self.cell_open = ['<td class="number-cell">' if column.numeric else '<td>' for column in section.columns]
+    
+    def page_name(self, number: int) -> str:
+        return f"{self.section.name}-{number:04d}.html"
+    
+    def _open_page(self):
+        number = len(self.pages) + 1
+        self.pages.append((self.page_name(number), self.rows + 1, self.rows + 1))
+        self.file = open(self.output_dir / self.pages[-1][0], 'w', encoding='utf-8')
+        self.file.write(page_head(f"{self.section.title} - сторінка {number}", STYLE + PAGER_STYLE))
+        self.file.write(f"        <h1>{html.escape(self.section.title)}</h1>\n")
+        self.file.write(self._pager(number, has_next=False))
+        self.file.write(f"<table><thead>{self.header}</thead><tbody>\n")
+    
+    def _close_page(self, has_next: bool):
+        number = len(self.pages)
+        name, first, _ = self.pages[-1]
+        self.pages[-1] = (name, first, self.rows)
+        self.file.write("</tbody></table>\n")
+        self.file.write(self._pager(number, has_next))
+        self.file.write(PAGE_END)
+        self.file.close()
+        self.file = None
+    
+    def _pager(self, number: int, has_next: bool) -> str:
+        links = ['<a href="index.html">Зміст</a>']
+        if number > 1:
+            links.append(f'<a href="{self.page_name(number - 1)}">← Назад</a>')
+        links.append(f"<span>Сторінка {number}</span>")
+        if has_next:
+            links.append(f'<a href="{self.page_name(number + 1)}">Далі →</a>')
+        return '<div class="pager">' + "".join(links) + "</div>\n"
+    
+    def write_rows(self, rows: Sequence[tuple]):
+        escape = html.escape
+        for row in rows:
+            if self.file is not None and self.rows % self.page_size == 0:
+                self._close_page(has_next=True)
+            if self.file is None:
+                self._open_page()
+            self.rows += 1
+            self.file.write("<tr>" + "".join(
+                f"{cell_open}{'-' if value is None else escape(str(value))}</td>"
+                for cell_open, value in zip(self.cell_open, row)
+            ) + "</tr>\n")
+    
+    def close(self):
+        if self.file is not None:
+            self._close_page(has_next=False)
+
+
+# Разделы полного отчета; строки идут в порядке id правила (по индексам *_rule)
+FULL_SECTIONS = (
+    Section(
+        'rules', 'Правила знижок',
+        """
+            SELECT dr.id, dr.name, COALESCE(ms.name, dr.status), dr.priority, dr.begin_date, dr.end_date
+            FROM discount_rules dr
+            LEFT JOIN mapping_status ms ON dr.status = ms.id
+            ORDER BY dr.id
+        """,
+        (Column('ID', True), Column('Назва правила'), Column('Статус'), Column('Пріоритет', True),
+         Column('Дата початку'), Column('Дата закінчення')),
+        'discount_rules', ('discount_rules',)
+    ),
+    Section(
+        'rule_conditions', 'Умови застосування (rule_conditions)',
+        """
+            SELECT rc.discount_rule_id, dr.name, COALESCE(mdv.name, rc.condition_type),
+                   COALESCE(mo.name, rc.comparison_type), rc.value, rc.group_name
+            FROM rule_conditions rc
+            JOIN discount_rules dr ON dr.id = rc.discount_rule_id
+            LEFT JOIN mapping_data_values mdv ON rc.condition_type = mdv.id
+            LEFT JOIN mapping_operators mo ON rc.comparison_type = mo.id
+            ORDER BY rc.discount_rule_id, rc.id
+        """,
+        (Column('ID правила', True), Column('Назва'), Column('Тип умови'), Column('Оператор'),
+         Column('Значення'), Column('Група')),
+        'rule_conditions', ('discount_rules', 'rule_conditions')
+    ),
+    Section(
+        'order_conditions', 'Умови на чек (order_conditions)',
+        """
+            SELECT oc.discount_rule_id, dr.name, COALESCE(mpv.name, oc.condition_type),
+                   COALESCE(mo.name, oc.comparison_type), oc.value, oc.group_name
+            FROM order_conditions oc
+            JOIN discount_rules dr ON dr.id = oc.discount_rule_id
+            LEFT JOIN mapping_product_values mpv ON oc.condition_type = mpv.id
+            LEFT JOIN mapping_operators mo ON oc.comparison_type = mo.id
+            ORDER BY oc.discount_rule_id, oc.id
+        """,
+        (Column('ID правила', True), Column('Назва'), Column('Тип умови'), Column('Оператор'),
+         Column('Значення'), Column('Група')),
+        'order_conditions', ('discount_rules', 'order_conditions')
+    ),
+    Section(
+        'result_items', 'Результати застосування знижок (result_items)',
+        """
+            SELECT ri.discount_rule_id, dr.name, mrt.name, mvt.name, ri.fixed_value, ri.expression,
+                   mdtt.name, ss.name, mgam.name
+            FROM result_items ri
+            JOIN discount_rules dr ON dr.id = ri.discount_rule_id
+            LEFT JOIN mapping_result_type mrt ON ri.result_type = mrt.id
+            LEFT JOIN mapping_value_type mvt ON ri.value_type = mvt.id
+            LEFT JOIN mapping_discount_time_type mdtt ON ri.discount_time_type = mdtt.id
+            LEFT JOIN sku_sets ss ON ri.sku_set_id = ss.id
+            LEFT JOIN mapping_group_apply_mode mgam ON ri.group_apply_mode = mgam.id
+            ORDER BY ri.discount_rule_id, ri.id
+        """,
+        (Column('ID правила', True), Column('Назва правила'), Column('Тип результату'), Column('Тип значення'),
+         Column('Фікс. значення', True), Column('Вираз'), Column('Тип часу знижки'), Column('Набір товарів'),
+         Column('Режим застосування')),
+        'result_items', ('discount_rules', 'result_items', 'sku_sets')
+    ),
+    Section(
+        'result_item_conditions', 'Умови результатів (result_item_conditions)',
+        """
+            SELECT ri.discount_rule_id, ric.result_item_id, COALESCE(mcv.name, ric.condition_type), ric.value
+            FROM result_item_conditions ric
+            JOIN result_items ri ON ri.id = ric.result_item_id
+            LEFT JOIN mapping_cond_values mcv ON ric.condition_type = mcv.id
+            ORDER BY ric.result_item_id, ric.id
+        """,
+        (Column('ID правила', True), Column('ID результату', True), Column('Тип умови'), Column('Значення')),
+        'result_item_conditions', ('result_items', 'result_item_conditions')
+    ),
+)
+
+
+class ReportSection(NamedTuple):
+    """Раздел обычного отчета: метод section_<name> и таблицы, от которых он зависит"""
+    name: str
+    source_tables: Sequence[str]
+    # Таблица, без которой раздел пропускается (None - раздел есть всегда)
+    required_table: Optional[str] = None
+    # Зависит от текущего времени: ключ кеша меняется раз в минуту
+    time_dependent: bool = False
+
+
+# Таблицы, число строк которых показывает раздел stats
+ALL_TABLES = ('discount_rules', 'rule_conditions', 'order_conditions', 'result_items',
+              'result_item_conditions', 'sku_sets', 'locations', 'merchants', 'terminals')
+
+REPORT_SECTIONS = (
+    ReportSection('stats', ALL_TABLES),
+    ReportSection('active_rules', ('discount_rules', 'rule_time_windows'), time_dependent=True),
+    ReportSection('status_distribution', ('discount_rules', 'rule_time_windows')),
+    ReportSection('rule_conditions', ('discount_rules', 'rule_conditions'), 'rule_conditions'),
+    ReportSection('order_conditions', ('discount_rules', 'order_conditions'), 'order_conditions'),
+    ReportSection('result_items', ('discount_rules', 'result_items', 'sku_sets'), 'result_items'),
+    ReportSection('top_sku_sets', ('discount_rules', 'result_items', 'sku_sets')),
+)
+
+
+def write_atomic(path: Path, content: str):
+    """Запись через временный файл: прерванная запись не оставляет битый кеш"""
+    temp_path = path.with_name(path.name + '.tmp')
+    temp_path.write_text(content, encoding='utf-8')
+    os.replace(temp_path, path)
+
+
+class SectionCache:
+    """Каталог HTML разделов обычного отчета: <раздел>.html и ключи в keys.json"""
+    
+    KEYS_FILE = "keys.json"
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        try:
+            self.keys: Dict[str, str] = json.loads((self.path / self.KEYS_FILE).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            self.keys = {}
+        self.changed = False
+    
+    def get(self, name: str, key: str) -> Optional[str]:
+        if self.keys.get(name) != key:
+            return None
+        try:
+            return (self.path / f"{name}.html").read_text(encoding='utf-8')
+        except OSError:
+            return None
+    
+    def put(self, name: str, key: str, content: str):
+        write_atomic(self.path / f"{name}.html", content)
+        self.keys[name] = key
+        self.changed = True
+    
+    def save(self):
+        if self.changed:
+            write_atomic(self.path / self.KEYS_FILE, json.dumps(self.keys, ensure_ascii=False, indent=2))
+            self.changed = False
+
+
+class ReportGenerator:
+    """Генератор отчетов из БД"""
+    
+    def __init__(self, db_path: str = "discount_rules.db"):
+        self.db_path = db_path
+        self.conn = None
+        # (PRAGMA data_version, минута, файл, каталог кеша) последнего обычного отчета
+        self._last_render: Optional[tuple] = None
+    
+    def connect(self):
+        """Подключение к БД"""
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+    
+    def close(self):
+        """Закрытие соединения"""
+        if self.conn:
+            self.conn.close()
+    
+    def execute_query(self, query: str, params=()):
+        """Выполнение запроса и возврат результатов"""
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    
+    def has_summary(self) -> bool:
+        """Есть ли сводка ETL (report_*): в БД, не обновлявшейся новой версией ETL, ее нет"""
+        return self.table_exists('report_table_counts')
+    
+    def table_exists(self, table_name: str) -> bool:
+        return bool(self.execute_query(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ))
+    
+    def table_versions(self) -> Optional[Dict[str, int]]:
+        """Id запуска ETL, последним изменившего таблицу; None - БД без report_table_versions"""
+        if not self.table_exists('report_table_versions'):
+            return None
+        return {row['table_name']: row['sync_run_id']
+                for row in self.execute_query("SELECT table_name, sync_run_id FROM report_table_versions")}
+    
+    def cache_key(self, versions: Dict[str, int], tables: Sequence[str], *extra) -> str:
+        """Ключ кеша раздела: БД, версии исходных таблиц и дополнительные параметры"""
+        parts = [f"v{CACHE_VERSION}", str(Path(self.db_path).resolve())]
+        parts += [f"{table_name}={versions.get(table_name, 0)}" for table_name in tables]
+        parts += [str(value) for value in extra]
+        return "|".join(parts)
+    
+    def generate_full_report(self, output_dir: str = "discount_report", page_size: int = 1000,
+                             use_cache: bool = True) -> str:
+        """Полный отчет по всем строкам: страницы разделов по page_size строк и index.html
+        
+        Строки каждого раздела читаются курсором порциями по FETCH_SIZE и сразу
+        пишутся в файл страницы, список строк целиком не собирается. Страницы
+        разделов, исходные таблицы которых не менялись, остаются от прошлого
+        запуска (use_cache); index.html пишется всегда.
+        """
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        # Страницы прошлого запуска: раздел с тем же ключом не перестраивается
+        manifest_file = output_path / FULL_REPORT_MANIFEST
+        versions = self.table_versions() if use_cache else None
+        try:
+            manifest = json.loads(manifest_file.read_text(encoding='utf-8')) if versions is not None else {}
+        except (OSError, ValueError):
+            manifest = {}
+        
+        written = []
+        for section in FULL_SECTIONS:
+            if not self.table_exists(section.required_table):
+                continue
+            
+            key = self.cache_key(versions, section.source_tables, page_size) if versions is not None else None
+            cached = manifest.get(section.name)
+            if key is not None and cached and cached['key'] == key and all(
+                (output_path / name).exists() for name, _, _ in cached['pages']
+            ):
+                writer = PagedTableWriter(output_path, section, page_size)
+                writer.pages = [tuple(page) for page in cached['pages']]
+                writer.rows = cached['rows']
+                written.append((section, writer))
+                continue
+            
+            for old_page in output_path.glob(f"{section.name}-*.html"):
+                old_page.unlink()
+            writer = PagedTableWriter(output_path, section, page_size)
+            cursor = self.conn.cursor()
+            try:
+                # Кортежи вместо sqlite3.Row: строки сразу уходят в HTML
+                cursor.row_factory = None
+                cursor.execute(section.query)
+                while True:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+                    writer.write_rows(rows)
+            finally:
+                cursor.close()
+                writer.close()
+            written.append((section, writer))
+            manifest[section.name] = {'key': key, 'pages': writer.pages, 'rows': writer.rows}
+        
+        index_file = output_path / "index.html"
+        with open(index_file, 'w', encoding='utf-8') as f:
+            f.write(page_head("Повний звіт по правилах знижок", STYLE + PAGER_STYLE))
+            f.write(f"""
+        <h1>📚 Повний звіт по правилах знижок</h1>
         <div class="meta-info">
-            <div><strong>База даних:</strong> discount_rules.db</div>
-            <div><strong>Дата генерації:</strong> """ + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + """</div>
+            <div><strong>База даних:</strong> {html.escape(str(self.db_path))}</div>
+            <div><strong>Дата генерації:</strong> {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</div>
         </div>
 """)
+            f.write('<div class="stats-grid">')
+            for section, writer in written:
+                f.write(f'''
+                <div class="stat-card">
+                    <h3>{html.escape(section.title)}</h3>
+                    <div class="number">{writer.rows:,}</div>
+                </div>
+            ''')
+            f.write('</div>')
+            
+            for section, writer in written:
+                f.write(f"<h2>{html.escape(section.title)}</h2>")
+                if not writer.pages:
+                    f.write('<div class="no-data">Немає даних</div>')
+                    continue
+                f.write('<div class="page-list">')
+                for name, first, last in writer.pages:
+                    f.write(f'<a href="{name}">{first:,}–{last:,}</a>')
+                f.write('</div>')
+            f.write(PAGE_END)
         
-        # 1. Статистика таблиц
+        if versions is not None:
+            write_atomic(manifest_file, json.dumps(manifest, ensure_ascii=False))
+        print(f"✅ Повний HTML звіт згенеровано: {index_file}")
+        return str(index_file)
+    
+    def section_stats(self) -> str:
+        """Число строк таблиц (из сводки ETL)"""
+        html_parts = []
+        summary = self.has_summary()
+        
+        # 1. Статистика таблиц (из сводки ETL)
         html_parts.append("<h2>📈 Загальна статистика</h2>")
-        stats = self.execute_query("""
-            SELECT 'discount_rules' as table_name, COUNT(*) as count FROM discount_rules
-            UNION ALL SELECT 'rule_conditions', COUNT(*) FROM rule_conditions
-            UNION ALL SELECT 'order_conditions', COUNT(*) FROM order_conditions
-            UNION ALL SELECT 'result_items', COUNT(*) FROM result_items
-            UNION ALL SELECT 'result_item_conditions', COUNT(*) FROM result_item_conditions
-            UNION ALL SELECT 'sku_sets', COUNT(*) FROM sku_sets
-            UNION ALL SELECT 'locations', COUNT(*) FROM locations
-            UNION ALL SELECT 'merchants', COUNT(*) FROM merchants
-            UNION ALL SELECT 'terminals', COUNT(*) FROM terminals
-        """)
+        stats = self.execute_query(
+            "SELECT table_name, row_count AS count FROM report_table_counts"
+        ) if summary else []
         
         html_parts.append('<div class="stats-grid">')
         table_names_ua = {
@@ -267,32 +670,64 @@ class ReportGenerator:
             'terminals': 'Термінали'
         }
         
-        for row in stats:
-            table_name = table_names_ua.get(row['table_name'], row['table_name'])
+        counts = {row['table_name']: row['count'] for row in stats}
+        for table_key, table_name in table_names_ua.items():
+            if table_key not in counts:
+                continue
             html_parts.append(f'''
                 <div class="stat-card">
                     <h3>{table_name}</h3>
-                    <div class="number">{row['count']:,}</div>
+                    <div class="number">{counts[table_key]:,}</div>
                 </div>
             ''')
         html_parts.append('</div>')
+        if not summary:
+            html_parts.append('<div class="no-data">Зведення ще не побудоване: запустіть ETL</div>')
         
-        # 2. Активные правила
+        return ''.join(html_parts)
+    
+    def section_active_rules(self) -> str:
+        """Первые активные правила на текущий момент"""
+        html_parts = []
+        
+        # 2. Активные правила: статус "Активно" и период включает текущий момент.
+        # rule_time_windows хранит эпоху в мс для любой схемы, поиск идет по индексу (status, end_ts)
         html_parts.append("<h2>✅ Активні правила знижок</h2>")
-        active_rules = self.execute_query("""
-            SELECT 
-                dr.id,
-                dr.name,
-                ms.name as status,
-                dr.priority,
-                dr.begin_date,
-                dr.end_date
-            FROM discount_rules dr
-            LEFT JOIN mapping_status ms ON dr.status = ms.id
-            WHERE dr.status = 1
-            ORDER BY dr.priority DESC
-            LIMIT 20
-        """)
+        if not self.table_exists('rule_time_windows'):
+            # БД, еще не синхронизированная новой версией ETL: только по статусу, без периода
+            active_rules = self.execute_query("""
+                SELECT 
+                    dr.id,
+                    dr.name,
+                    ms.name as status,
+                    dr.priority,
+                    dr.begin_date,
+                    dr.end_date
+                FROM discount_rules dr
+                LEFT JOIN mapping_status ms ON dr.status = ms.id
+                WHERE dr.status = 1
+                ORDER BY dr.priority DESC
+                LIMIT 20
+            """)
+        else:
+            now_ms = int(datetime.now().timestamp() * 1000)
+            active_rules = self.execute_query("""
+                SELECT 
+                    dr.id,
+                    dr.name,
+                    ms.name as status,
+                    dr.priority,
+                    dr.begin_date,
+                    dr.end_date
+                FROM rule_time_windows tw
+                JOIN discount_rules dr ON dr.id = tw.rule_id
+                LEFT JOIN mapping_status ms ON tw.status = ms.id
+                WHERE tw.status = 1
+                  AND (tw.end_ts IS NULL OR tw.end_ts >= ?)
+                  AND (tw.begin_ts IS NULL OR tw.begin_ts <= ?)
+                ORDER BY dr.priority DESC
+                LIMIT 20
+            """, (now_ms, now_ms))
         
         if active_rules:
             html_parts.append("""
@@ -326,18 +761,36 @@ class ReportGenerator:
         else:
             html_parts.append('<div class="no-data">Немає активних правил</div>')
         
-        # 3. Распределение по статусам
+        return ''.join(html_parts)
+    
+    def section_status_distribution(self) -> str:
+        """Распределение правил по статусам (из сводки ETL, без нее - по discount_rules)"""
+        html_parts = []
+        
+        # 3. Распределение по статусам (из сводки ETL)
         html_parts.append("<h2>📊 Розподіл правил за статусами</h2>")
-        status_dist = self.execute_query("""
-            SELECT 
-                ms.name as status,
-                COUNT(dr.id) as count,
-                ROUND(COUNT(dr.id) * 100.0 / (SELECT COUNT(*) FROM discount_rules), 2) as percentage
-            FROM discount_rules dr
-            LEFT JOIN mapping_status ms ON dr.status = ms.id
-            GROUP BY ms.name
-            ORDER BY COUNT(dr.id) DESC
-        """)
+        if self.has_summary():
+            status_dist = self.execute_query("""
+                SELECT 
+                    COALESCE(ms.name, CAST(sc.status AS TEXT)) as status,
+                    sc.rule_count as count,
+                    ROUND(sc.rule_count * 100.0 / SUM(sc.rule_count) OVER (), 2) as percentage
+                FROM report_status_counts sc
+                LEFT JOIN mapping_status ms ON sc.status = ms.id
+                ORDER BY sc.rule_count DESC
+            """)
+        else:
+            # БД, не обновлявшаяся новой версией ETL: один проход по discount_rules
+            status_dist = self.execute_query("""
+                SELECT 
+                    COALESCE(ms.name, CAST(dr.status AS TEXT)) as status,
+                    COUNT(*) as count,
+                    ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) as percentage
+                FROM discount_rules dr
+                LEFT JOIN mapping_status ms ON dr.status = ms.id
+                GROUP BY dr.status
+                ORDER BY COUNT(*) DESC
+            """)
         
         if status_dist:
             html_parts.append("""
@@ -364,6 +817,12 @@ class ReportGenerator:
             
             html_parts.append("</tbody></table>")
         
+        return ''.join(html_parts)
+    
+    def section_rule_conditions(self) -> str:
+        """Первые условия применения правил"""
+        html_parts = []
+        
         # 4. Правила с условиями
         html_parts.append("<h2>🎯 Правила з умовами застосування (rule_conditions)</h2>")
         rules_with_conditions = self.execute_query("""
@@ -413,6 +872,12 @@ class ReportGenerator:
         else:
             html_parts.append('<div class="no-data">Немає правил з умовами</div>')
         
+        return ''.join(html_parts)
+    
+    def section_order_conditions(self) -> str:
+        """Первые условия на чек"""
+        html_parts = []
+        
         # 4.5 Условия на чек (order_conditions)
         html_parts.append("<h2>🛒 Умови на чек (order_conditions)</h2>")
         order_conditions_data = self.execute_query("""
@@ -462,6 +927,12 @@ class ReportGenerator:
         else:
             html_parts.append('<div class="no-data">Немає умов на чек</div>')
         
+        return ''.join(html_parts)
+    
+    def section_result_items(self) -> str:
+        """Первые результаты применения скидок"""
+        html_parts = []
+        
         # 5. Результаты применения скидок
         html_parts.append("<h2>💰 Результати застосування знижок</h2>")
         results = self.execute_query("""
@@ -523,21 +994,27 @@ class ReportGenerator:
         else:
             html_parts.append('<div class="no-data">Немає результатів</div>')
         
-        # 6. ТОП-10 наборов товаров
+        return ''.join(html_parts)
+    
+    def section_top_sku_sets(self) -> str:
+        """ТОП-10 наборов товаров по числу результатов (из сводки ETL)"""
+        html_parts = []
+        summary = self.has_summary()
+        
+        # 6. ТОП-10 наборов товаров (из сводки ETL, по индексу usage_count)
         html_parts.append("<h2>🏆 ТОП-10 найбільш використовуваних наборів товарів</h2>")
         top_sku_sets = self.execute_query("""
             SELECT 
                 ss.id,
                 ss.name,
                 ss.ext_code,
-                COUNT(DISTINCT ri.id) as usage_count
-            FROM sku_sets ss
-            LEFT JOIN result_items ri ON ss.id = ri.sku_set_id
-            GROUP BY ss.id, ss.name, ss.ext_code
-            HAVING usage_count > 0
-            ORDER BY usage_count DESC
+                su.usage_count
+            FROM report_sku_set_usage su
+            JOIN sku_sets ss ON ss.id = su.sku_set_id
+            WHERE su.usage_count > 0
+            ORDER BY su.usage_count DESC
             LIMIT 10
-        """)
+        """) if summary else []
         
         if top_sku_sets:
             html_parts.append("""
@@ -564,6 +1041,64 @@ class ReportGenerator:
                 """)
             
             html_parts.append("</tbody></table>")
+        elif not summary:
+            html_parts.append('<div class="no-data">Зведення ще не побудоване: запустіть ETL</div>')
+        
+        return ''.join(html_parts)
+    
+    def generate_html_report(self, output_file: str = "discount_report.html", cache_dir: Optional[str] = None):
+        """Генерация HTML отчета
+        
+        С cache_dir разделы, исходные таблицы которых не менялись, берутся из
+        кеша. Если с прошлого вызова этого же объекта PRAGMA data_version и
+        минута не изменились, файл не перестраивается.
+        """
+        now = datetime.now()
+        minute = now.strftime("%Y-%m-%d %H:%M")
+        render_key = (self.execute_query("PRAGMA data_version")[0][0], minute, output_file, cache_dir)
+        if render_key == self._last_render and Path(output_file).exists():
+            print(f"✅ HTML звіт не змінився: {output_file}")
+            return output_file
+        
+        versions = self.table_versions() if cache_dir else None
+        cache = SectionCache(cache_dir) if versions is not None else None
+        
+        html_parts = []
+        
+        # HTML шапка
+        html_parts.append("""
+<!DOCTYPE html>
+<html lang="uk">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Звіт по правилах знижок</title>
+    <style>""" + STYLE + """    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>📊 Звіт по правилах знижок</h1>
+        <div class="meta-info">
+            <div><strong>База даних:</strong> """ + html.escape(str(self.db_path)) + """</div>
+            <div><strong>Дата генерації:</strong> """ + now.strftime("%Y-%m-%d %H:%M:%S") + """</div>
+        </div>
+""")
+        
+        for section in REPORT_SECTIONS:
+            if section.required_table and not self.table_exists(section.required_table):
+                continue
+            if cache is None:
+                html_parts.append(getattr(self, f"section_{section.name}")())
+                continue
+            
+            key = self.cache_key(versions, section.source_tables, minute if section.time_dependent else '')
+            content = cache.get(section.name, key)
+            if content is None:
+                content = getattr(self, f"section_{section.name}")()
+                cache.put(section.name, key, content)
+            html_parts.append(content)
+        if cache is not None:
+            cache.save()
         
         # Footer
         html_parts.append("""
@@ -580,17 +1115,42 @@ class ReportGenerator:
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(html_content)
         
+        self._last_render = render_key
         print(f"✅ HTML звіт згенеровано: {output_file}")
         return output_file
 
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="HTML отчет по загруженным правилам скидок")
+    parser.add_argument("--db", default="discount_rules.db", help="файл БД (по умолчанию %(default)s)")
+    parser.add_argument("--output", default="discount_report.html",
+                        help="файл обычного отчета (по умолчанию %(default)s)")
+    parser.add_argument("--full", action="store_true",
+                        help="полный отчет по всем строкам: страницы и index.html в --output-dir")
+    parser.add_argument("--output-dir", default="discount_report",
+                        help="каталог полного отчета (по умолчанию %(default)s)")
+    parser.add_argument("--page-size", type=int, default=1000,
+                        help="строк на странице полного отчета (по умолчанию %(default)s)")
+    parser.add_argument("--cache-dir", default=".report_cache",
+                        help="кеш разделов обычного отчета (по умолчанию %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="перестроить все разделы, не используя кеш")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
     """Главная функция"""
-    generator = ReportGenerator()
+    args = build_parser().parse_args(argv)
+    generator = ReportGenerator(args.db)
     
     try:
         generator.connect()
-        output_file = generator.generate_html_report()
+        if args.full:
+            output_file = generator.generate_full_report(args.output_dir, max(1, args.page_size),
+                                                         use_cache=not args.no_cache)
+        else:
+            output_file = generator.generate_html_report(args.output,
+                                                         cache_dir=None if args.no_cache else args.cache_dir)
         print(f"\n📄 Відкрийте файл у браузері: {Path(output_file).absolute()}")
     except Exception as e:
         print(f"❌ Помилка: {e}")
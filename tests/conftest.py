@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Общие фикстуры: БД, загруженная ETL из заглушки API в том же процессе
+
+Каталог MockCatalog можно менять между запусками sync() (удалить правила,
+поправить поля), чтобы проверять инкрементальную синхронизацию.
+"""
+
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import pytest
+from aiohttp import web
+
+from discount_etl.config import Config
+# BASE_TIMESTAMP и DAY_MS - для моментов корзин в тестах
+from discount_etl.mockserver import BASE_TIMESTAMP, DAY_MS, MockCatalog, MockServer  # noqa: F401
+from discount_etl.pipeline import ETLPipeline
+
+CATALOG_SIZES = dict(rules=400, sku_sets=40, skus=2000, merchants=5, locations=20, terminals=60)
+RULES_ENDPOINT = '/discountRule/list'
+
+
+class EditableCatalog(MockCatalog):
+    """MockCatalog с правкой полей отдельных правил: overrides[id] = {поле: значение}"""
+
+    def __init__(self, **sizes):
+        super().__init__(**sizes)
+        self.overrides: Dict[int, Dict] = {}
+
+    def rule(self, item_id: int) -> Dict:
+        rule = super().rule(item_id)
+        rule.update(self.overrides.get(item_id, {}))
+        return rule
+
+    def resize(self, kind: str, size: int):
+        self.sizes[kind] = size
+        self._orders.clear()
+
+
+class ScriptedServer(MockServer):
+    """MockServer с ошибками по сценарию вместо случайных
+    
+    statuses[path] - коды ответов (с Retry-After) на первые запросы пути;
+    failing_pages[path] - offset страниц списка, на которые всегда отвечает 503;
+    truncated_pages[path] - offset страниц, в которых не хватает последних 10 записей.
+    page_requests - запрошенные страницы списков: (path, offset).
+    """
+
+    def __init__(self, catalog: MockCatalog, statuses: Optional[Dict[str, List[int]]] = None,
+                 failing_pages: Optional[Dict[str, Set[int]]] = None,
+                 truncated_pages: Optional[Dict[str, Set[int]]] = None, **kwargs):
+        super().__init__(catalog, **kwargs)
+        self.statuses = {path: list(codes) for path, codes in (statuses or {}).items()}
+        self.failing_pages = failing_pages or {}
+        self.truncated_pages = truncated_pages or {}
+        self.request_times: List[float] = []
+        self.page_requests: List[tuple] = []
+
+    @web.middleware
+    async def faults(self, request: web.Request, handler):
+        if request.path != '/api/login':
+            self.request_times.append(time.monotonic())
+        codes = self.statuses.get(request.path)
+        if codes:
+            self.errors += 1
+            return web.Response(status=codes.pop(0), headers={'Retry-After': str(self.retry_after)})
+        return await super().faults(request, handler)
+
+    def list_handler(self, kind: str):
+        handler = super().list_handler(kind)
+
+        async def scripted_handler(request: web.Request) -> web.Response:
+            offset = (await request.json()).get('offset')
+            self.page_requests.append((request.path, offset))
+            if offset in self.failing_pages.get(request.path, ()):
+                self.errors += 1
+                return web.Response(status=503)
+
+            response = await handler(request)
+            if offset in self.truncated_pages.get(request.path, ()):
+                page = json.loads(response.body)
+                page['data'] = page['data'][:-10]
+                return web.json_response(page)
+            return response
+        return scripted_handler
+
+
+@asynccontextmanager
+async def serve(server: MockServer) -> AsyncIterator[str]:
+    """Заглушка API на свободном порту на время блока; отдает адрес сервера"""
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    try:
+        host, port = runner.addresses[0][:2]
+        yield f"http://{host}:{port}"
+    finally:
+        await runner.cleanup()
+
+
+def make_config(base_url: str, db_path: Optional[str] = None) -> Config:
+    config = Config()
+    config.BASE_URL = base_url
+    if db_path:
+        config.DB_PATH = db_path
+    config.RATE_LIMIT = False
+    return config
+
+
+async def _sync(db_path: str, catalog: MockCatalog, server: Optional[MockServer], settings: Dict) -> ETLPipeline:
+    async with serve(server or MockServer(catalog)) as base_url:
+        config = make_config(base_url, db_path)
+        for name, value in settings.items():
+            setattr(config, name, value)
+        pipeline = ETLPipeline(config)
+        await pipeline.run()
+        return pipeline
+
+
+def sync(db_path: str, catalog: MockCatalog, server: Optional[MockServer] = None, **settings) -> ETLPipeline:
+    """Один запуск ETL (по умолчанию нормализованная схема, инкрементальный режим)
+    
+    server - заглушка над catalog (по умолчанию MockServer без ошибок),
+    settings - значения атрибутов Config для этого запуска.
+    """
+    return asyncio.run(_sync(db_path, catalog, server, settings))
+
+
+@pytest.fixture
+def catalog() -> EditableCatalog:
+    return EditableCatalog(**CATALOG_SIZES)
+
+
+@pytest.fixture
+def synced_db(tmp_path, catalog) -> str:
+    db_path = str(tmp_path / "rules.db")
+    sync(db_path, catalog)
+    return db_path
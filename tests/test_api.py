@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+DiscountRulesAPI против заглушки API: повторы после 429 и 5xx, Retry-After,
+проверка полноты списка и окно запросов страниц
+"""
+
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from discount_etl.api import DiscountRulesAPI, IncompleteDataError, RetryableAPIError
+from discount_etl.config import Config
+from discount_etl.mockserver import MockCatalog, MockServer
+
+from conftest import RULES_ENDPOINT, ScriptedServer, make_config, serve
+
+
+def fast_retry_config(base_url: str):
+    config = make_config(base_url)
+    config.RETRY_BACKOFF_BASE = 0.01
+    config.RETRY_BACKOFF_MAX = 0.05
+    return config
+
+
+def retries(api: DiscountRulesAPI, endpoint: str = RULES_ENDPOINT) -> float:
+    return api.metrics.counters.get('discount_etl_http_retries_total', {}).get((('endpoint', endpoint),), 0)
+
+
+def test_throttled_request_waits_for_retry_after():
+    server = ScriptedServer(MockCatalog(rules=50), statuses={RULES_ENDPOINT: [429]}, retry_after=0.5)
+
+    async def run():
+        async with serve(server) as base_url:
+            config = fast_retry_config(base_url)
+            config.RATE_LIMIT = True
+            async with DiscountRulesAPI(config) as api:
+                items, total_count = await api.fetch_page(RULES_ENDPOINT, 0)
+                return api, items, total_count
+
+    api, items, total_count = asyncio.run(run())
+    assert len(items) == total_count == 50
+    assert retries(api) == 1
+    # Повтор отправлен не раньше, чем разрешил Retry-After, скорость снижена вдвое
+    first, second = server.request_times
+    assert second - first >= 0.45
+    assert api.limiter.rate == pytest.approx(Config.RATE_LIMIT_INITIAL / 2)
+
+
+@pytest.mark.parametrize("concurrent", [True, False])
+def test_server_errors_are_retried(concurrent):
+    server = ScriptedServer(MockCatalog(rules=450), statuses={RULES_ENDPOINT: [500, 503, 502]})
+
+    async def run():
+        async with serve(server) as base_url:
+            async with DiscountRulesAPI(fast_retry_config(base_url)) as api:
+                return api, await api.fetch_data(RULES_ENDPOINT, concurrent=concurrent)
+
+    api, rules = asyncio.run(run())
+    assert [rule['id'] for rule in rules] == list(range(1, 451))
+    assert retries(api) == server.errors == 3
+
+
+def test_server_errors_raise_after_retry_attempts():
+    server = ScriptedServer(MockCatalog(rules=50), statuses={RULES_ENDPOINT: [503] * 10})
+
+    async def run():
+        async with serve(server) as base_url:
+            config = fast_retry_config(base_url)
+            config.RETRY_ATTEMPTS = 3
+            async with DiscountRulesAPI(config) as api:
+                await api.fetch_page(RULES_ENDPOINT, 0)
+
+    with pytest.raises(RetryableAPIError) as error:
+        asyncio.run(run())
+    assert error.value.status == 503
+    assert server.errors == 3
+
+
+@pytest.mark.parametrize("concurrent, received", [
+    # Окно запрашивает все offset по count из первой страницы
+    (True, 990),
+    # Последовательная загрузка останавливается на неполной странице
+    (False, 390),
+])
+def test_missing_rows_raise_incomplete_data_error(concurrent, received):
+    server = ScriptedServer(MockCatalog(rules=1000), truncated_pages={RULES_ENDPOINT: {300}})
+
+    async def run():
+        async with serve(server) as base_url:
+            async with DiscountRulesAPI(make_config(base_url)) as api:
+                await api.fetch_data(RULES_ENDPOINT, concurrent=concurrent)
+
+    with pytest.raises(IncompleteDataError, match=f"получено {received} записей из 1000"):
+        asyncio.run(run())
+
+
+class SlowPagesServer(MockServer):
+    """Первая страница отвечает сразу, остальные - через секунду"""
+
+    def list_handler(self, kind: str):
+        handler = super().list_handler(kind)
+
+        async def slow_handler(request: web.Request) -> web.Response:
+            if (await request.json()).get('offset'):
+                await asyncio.sleep(1)
+            return await handler(request)
+        return slow_handler
+
+
+def test_iter_offsets_waits_for_cancelled_requests():
+    async def run():
+        async with serve(SlowPagesServer(MockCatalog(rules=1000))) as base_url:
+            async with DiscountRulesAPI(make_config(base_url)) as api:
+                pages = api.iter_offsets(RULES_ENDPOINT, [0, 100, 200, 300, 400], window_size=4)
+                await pages.__anext__()
+                # Запросы остальных страниц окна еще в работе
+                await pages.aclose()
+                return [task for task in asyncio.all_tasks()
+                        if task.get_coro().__qualname__ == 'DiscountRulesAPI.fetch_page' and not task.done()]
+
+    assert asyncio.run(run()) == []
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+codec: вывод normalize_value совпадает с json.loads + json.dumps символ в символ
+"""
+
+import json
+
+import pytest
+
+from discount_etl.codec import int_values, normalize_value
+
+
+def reference_normalize(value_str):
+    """Прежняя нормализация через стандартный json"""
+    value_obj = json.loads(value_str)
+    if isinstance(value_obj, dict):
+        if 'ids' in value_obj:
+            return json.dumps(value_obj['ids'])
+        if 'id' in value_obj:
+            return str(value_obj['id'])
+        if 'value' in value_obj:
+            return str(value_obj['value'])
+    return json.dumps(value_obj)
+
+
+@pytest.mark.parametrize("value_str", [
+    '{"ids": [1, 2, 3], "descs": ["a", "b", "c"]}',
+    '{"ids": [], "descs": []}',
+    '{"ids": [1, "2", 3.5]}',
+    '{"ids": [12345678901234567890123]}',
+    '{"id": 15, "desc": "Каса 15"}',
+    '{"id": "abc"}',
+    '{"value": 100}',
+    '{"value": 100.5}',
+    '{"value": 1e20}',
+    '{"value": NaN}',
+    '{"value": "текст"}',
+    '{"value": true}',
+    '{"value": null}',
+    '{"value": 123456789012345678901}',
+    '{"other": 1}',
+    '[1, 2]',
+    '7',
+    '"рядок"',
+])
+def test_normalize_value_matches_json(value_str):
+    assert normalize_value(value_str) == reference_normalize(value_str)
+
+
+def test_normalize_value_rejects_invalid_json():
+    with pytest.raises(ValueError):
+        normalize_value('{"ids": [1, 2')
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("[1, 2, 3]", (1, 2, 3)),
+    ("7", (7,)),
+    ('[1, "2", 3.5, true]', (1,)),
+    ("12345678901234567890123", (12345678901234567890123,)),
+    ("2.5", ()),
+    ('"abc"', ()),
+    ("not json", ()),
+    ("", ()),
+    (None, ()),
+])
+def test_int_values(text, expected):
+    assert int_values(text) == expected
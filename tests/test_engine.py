@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+RuleEngine: индексированный подбор правил против полного перебора,
+семантика операторов, часовой пояс и refresh() после инкрементальной синхронизации
+"""
+
+import json
+import random
+import sqlite3
+from datetime import datetime
+
+import pytest
+import pytz
+
+from discount_etl.engine import (
+    COND_DAY_OF_YEAR, COND_TIME, COND_WEEKDAY, MISSING, Basket, BasketItem, RuleEngine,
+    compare_operator
+)
+
+from conftest import BASE_TIMESTAMP, CATALOG_SIZES, DAY_MS, sync
+
+
+class BruteForceEngine(RuleEngine):
+    """Тот же расчет без индексов: все правила, период проверяется напрямую"""
+
+    def candidate_rules(self, context, timestamp_ms):
+        return sorted(
+            (rule for rule in self.rules.values() if self.in_window(rule, timestamp_ms)),
+            key=lambda rule: rule.sort_key
+        )
+
+    @staticmethod
+    def in_window(rule, timestamp_ms):
+        return ((rule.begin_date is None or rule.begin_date <= timestamp_ms)
+                and (rule.end_date is None or timestamp_ms <= rule.end_date))
+
+
+def random_baskets(rules, count=300, seed=7):
+    """Корзины по разным терминалам и моментам, включая границы периодов правил"""
+    rnd = random.Random(seed)
+    boundaries = []
+    for rule in rules:
+        boundaries += [rule.begin_date, rule.begin_date - 1]
+        if rule.end_date is not None:
+            boundaries += [rule.end_date, rule.end_date + 1]
+
+    terminals = list(range(1, CATALOG_SIZES['terminals'] + 1)) + [None, 10 ** 6]
+    baskets = []
+    for _ in range(count):
+        if rnd.random() < 0.5:
+            timestamp = rnd.choice(boundaries)
+        else:
+            timestamp = BASE_TIMESTAMP + rnd.randrange(-30, 600) * DAY_MS
+        items = [
+            BasketItem(rnd.randint(1, CATALOG_SIZES['skus']), rnd.randint(1, 5), rnd.uniform(1, 200))
+            for _ in range(rnd.randint(0, 6))
+        ]
+        baskets.append(Basket(terminal_id=rnd.choice(terminals), items=items, timestamp=timestamp))
+    return baskets
+
+
+def stored_rules(db_path):
+    """Активные правила по таблицам: терминалы, период и порог суммы чека"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rules = {
+            rule_id: {'begin': begin, 'end': end}
+            for rule_id, begin, end in conn.execute(
+                "SELECT id, begin_date, end_date FROM discount_rules WHERE status = 1"
+            )
+        }
+        for rule_id, value in conn.execute("SELECT discount_rule_id, value FROM rule_conditions"):
+            if rule_id in rules:
+                rules[rule_id]['terminals'] = set(json.loads(value))
+        for rule_id, value in conn.execute("SELECT discount_rule_id, value FROM order_conditions"):
+            if rule_id in rules:
+                rules[rule_id]['min_amount'] = float(value)
+    finally:
+        conn.close()
+    return rules
+
+
+def matching_rule_ids(engine, basket):
+    """Правила, прошедшие условия точки и периода (до проверки чека и результатов)"""
+    timestamp_ms = engine._timestamp_ms(basket.timestamp)
+    context = engine._context(basket, timestamp_ms)
+    return [rule.id for rule in engine.candidate_rules(context, timestamp_ms)
+            if engine._conditions_match(rule.conditions, context)]
+
+
+def discounts(result):
+    return [(discount.rule_id, round(discount.amount, 6)) for discount in result.discounts]
+
+
+def assert_same_state(engine, fresh):
+    """Состояние после refresh() совпадает с загруженным с нуля"""
+    assert set(engine.rules) == set(fresh.rules)
+    for rule_id, rule in fresh.rules.items():
+        refreshed = engine.rules[rule_id]
+        assert refreshed.sort_key == rule.sort_key
+        assert (refreshed.begin_date, refreshed.end_date) == (rule.begin_date, rule.end_date)
+        assert refreshed.conditions == rule.conditions
+        assert refreshed.order_conditions == rule.order_conditions
+
+    assert engine.index.keys == fresh.index.keys
+    assert engine.index.unrestricted == fresh.index.unrestricted
+    assert engine.index.postings == fresh.index.postings
+    assert engine.time_index.windows == fresh.time_index.windows
+    assert engine.sku_index.members == fresh.sku_index.members
+    assert engine.sku_index.containing == fresh.sku_index.containing
+    assert engine.terminal_locations == fresh.terminal_locations
+    assert engine.location_merchants == fresh.location_merchants
+
+
+@pytest.fixture
+def engines(synced_db):
+    return RuleEngine.from_db(synced_db), BruteForceEngine.from_db(synced_db)
+
+
+def test_engine_loads_only_active_rules(synced_db, engines):
+    engine, _ = engines
+    active = stored_rules(synced_db)
+    assert active and set(engine.rules) == set(active)
+    assert len(engine.index) == len(engine.time_index) == len(active)
+
+
+def test_applied_rules_satisfy_their_conditions(synced_db, engines):
+    engine, _ = engines
+    rules = stored_rules(synced_db)
+    applied = 0
+    for basket in random_baskets(engine.rules.values()):
+        amount = sum(item.amount for item in basket.items)
+        result = engine.evaluate(basket)
+        for discount in result.discounts:
+            rule = rules[discount.rule_id]
+            assert basket.terminal_id in rule['terminals']
+            assert rule['begin'] <= basket.timestamp
+            assert rule['end'] is None or basket.timestamp <= rule['end']
+            assert amount >= rule['min_amount']
+        # Скидка не превышает сумму корзины
+        assert result.total <= amount + 1e-6
+        applied += bool(result.discounts)
+    assert applied > 0
+
+
+def test_indexed_candidates_match_brute_force(engines):
+    engine, brute = engines
+    checked = 0
+    for basket in random_baskets(engine.rules.values()):
+        expected = matching_rule_ids(brute, basket)
+        assert matching_rule_ids(engine, basket) == expected
+        checked += bool(expected)
+    # Выборка должна содержать корзины, которым подходят правила
+    assert checked > 50
+
+
+def test_evaluate_matches_brute_force(engines):
+    engine, brute = engines
+    applied = 0
+    for basket in random_baskets(engine.rules.values(), seed=11):
+        result = engine.evaluate(basket)
+        assert discounts(result) == discounts(brute.evaluate(basket))
+        applied += bool(result.discounts)
+    assert applied > 0
+
+
+def test_active_rules_match_brute_force(engines):
+    engine, brute = engines
+    for basket in random_baskets(engine.rules.values(), count=100, seed=3):
+        timestamp_ms = basket.timestamp
+        expected = [rule.id for rule in brute.candidate_rules({}, timestamp_ms)]
+        assert [rule.id for rule in engine.active_rules(timestamp_ms)] == expected
+
+
+@pytest.mark.parametrize("op, actual, expected, result", [
+    # 0 (=) и 6 (IN): значение или одно из значений множества
+    (0, 5, 5, True),
+    (0, 5, 6, False),
+    (0, "5", 5, True),
+    (0, 5, frozenset({4, 5}), True),
+    (6, 5, frozenset({4, 5}), True),
+    (6, 7, frozenset({4, 5}), False),
+    (6, frozenset({7, 5}), frozenset({4, 5}), True),
+    (6, frozenset({7, 8}), frozenset({4, 5}), False),
+    # 1 (!=) и 7 (NOT IN)
+    (1, 5, 6, True),
+    (1, 5, 5, False),
+    (7, 7, frozenset({4, 5}), True),
+    (7, 5, frozenset({4, 5}), False),
+    # 2 (>), 3 (<), 4 (>=), 5 (<=), строки-числа приводятся
+    (2, 10, 5, True),
+    (2, 5, 5, False),
+    (3, 4, 5, True),
+    (3, 5, 5, False),
+    (4, 5, 5, True),
+    (4, 4.99, 5, False),
+    (5, 5, 5, True),
+    (5, "6", 5, False),
+    (4, "100.5", "100", True),
+    # Несравнимые значения не проходят
+    (2, "abc", 5, False),
+])
+def test_compare_operator(op, actual, expected, result):
+    assert compare_operator(op, actual, expected) is result
+
+
+@pytest.mark.parametrize("op", range(8))
+def test_missing_attribute_passes_only_negative_operators(op):
+    assert compare_operator(op, MISSING, 5) is (op in (1, 7))
+
+
+def test_unknown_operator_fails():
+    assert compare_operator(99, 5, 5) is False
+
+
+def moment_context(engine, timestamp):
+    return engine._context(Basket(timestamp=timestamp), engine._timestamp_ms(timestamp))
+
+
+def test_time_conditions_use_kyiv_time_by_default():
+    engine = RuleEngine()
+    # 2025-12-31 22:30 UTC = 2026-01-01 00:30 по Киеву (четверг, 1-й день года)
+    utc_moment = pytz.UTC.localize(datetime(2025, 12, 31, 22, 30))
+    expected = {COND_DAY_OF_YEAR: 1, COND_WEEKDAY: 4, COND_TIME: 30}
+    for timestamp in (int(utc_moment.timestamp() * 1000), utc_moment,
+                      utc_moment.astimezone(pytz.timezone('America/New_York')),
+                      datetime(2026, 1, 1, 0, 30)):
+        context = moment_context(engine, timestamp)
+        assert {code: context[code] for code in expected} == expected
+
+
+def test_time_conditions_follow_daylight_saving():
+    engine = RuleEngine()
+    # Летом Киев UTC+3: 2026-07-01 21:30 UTC = 2026-07-02 00:30
+    timestamp = pytz.UTC.localize(datetime(2026, 7, 1, 21, 30))
+    context = moment_context(engine, timestamp)
+    assert context[COND_TIME] == 30
+    assert context[COND_WEEKDAY] == 4
+    assert context[COND_DAY_OF_YEAR] == datetime(2026, 7, 2).timetuple().tm_yday
+
+
+def test_time_conditions_in_configured_timezone():
+    engine = RuleEngine(timezone='UTC')
+    context = moment_context(engine, pytz.UTC.localize(datetime(2025, 12, 31, 22, 30)))
+    assert (context[COND_DAY_OF_YEAR], context[COND_WEEKDAY], context[COND_TIME]) == (365, 3, 22 * 60 + 30)
+
+
+def test_refresh_after_incremental_sync(synced_db, catalog):
+    engine = RuleEngine.from_db(synced_db)
+    assert engine.refresh() == {entity: 0 for entity in RuleEngine.ENTITIES}
+
+    # Удаление 50 правил, правка четырех, новый состав всех наборов SKU
+    catalog.resize('discountRule', CATALOG_SIZES['rules'] - 50)
+    catalog.overrides = {
+        5: {'priority': 1000, 'status': 1},
+        7: {'priority': 1001, 'status': 1, 'endDate': None},
+        9: {'name': "Renamed"},
+        11: {'status': 1, 'ruleConditionGroup': {'minMatchCount': 1, 'requiredConditions': [
+            {'type': 2, 'comparsionType': 6, 'group': '0', 'value': '{"ids": [1, 2], "descs": ["T1", "T2"]}'},
+        ]}},
+    }
+    catalog.skus += 100
+    sync(synced_db, catalog)
+
+    stats = engine.refresh()
+    assert stats['discount_rules'] == 54
+    assert stats['sku_sets'] == CATALOG_SIZES['sku_sets']
+    assert stats['terminals'] == stats['locations'] == 0
+
+    fresh = RuleEngine.from_db(synced_db)
+    assert_same_state(engine, fresh)
+    assert engine.rules[7].sort_key == (-1001, 7)
+    assert engine.index.keys[11] == (2, frozenset({1, 2}))
+    assert not any(rule_id > CATALOG_SIZES['rules'] - 50 for rule_id in engine.rules)
+
+    brute = BruteForceEngine.from_db(synced_db)
+    for basket in random_baskets(engine.rules.values(), count=150, seed=5):
+        assert discounts(engine.evaluate(basket)) == discounts(brute.evaluate(basket))
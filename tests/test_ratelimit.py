@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+AdaptiveRateLimiter: рост и снижение скорости не чаще раза в cooldown
+"""
+
+import pytest
+
+from discount_etl import ratelimit
+from discount_etl.ratelimit import AdaptiveRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Управляемое time.monotonic модуля ratelimit"""
+    now = [100.0]
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_success_burst_increases_rate_once_per_cooldown(clock):
+    limiter = AdaptiveRateLimiter(rate=10, min_rate=1, max_rate=1000, cooldown=1.0)
+    for _ in range(500):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(10.5)
+
+    clock[0] += 0.5
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(10.5)
+
+    clock[0] += 0.5
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(11.025)
+
+
+def test_no_increase_within_cooldown_after_throttle(clock):
+    limiter = AdaptiveRateLimiter(rate=10, min_rate=1, max_rate=1000, cooldown=1.0)
+    limiter.on_throttle()
+    for _ in range(10):
+        limiter.on_throttle()
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(5)
+
+    clock[0] += 1.0
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(5.25)
+
+
+def test_rate_stays_within_bounds(clock):
+    limiter = AdaptiveRateLimiter(rate=10, min_rate=4, max_rate=10.2, cooldown=1.0)
+    limiter.on_success()
+    assert limiter.rate == 10.2
+    for _ in range(5):
+        clock[0] += 1.0
+        limiter.on_throttle()
+    assert limiter.rate == 4
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+generate_report.py: разделы отчета со сводкой ETL и без нее
+"""
+
+import html
+import shutil
+import sqlite3
+
+import pytest
+
+from generate_report import ReportGenerator
+
+
+def status_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM discount_rules GROUP BY status"))
+    finally:
+        conn.close()
+
+
+def drop_summary(db_path):
+    """БД, не обновлявшаяся версией ETL со сводкой report_*"""
+    conn = sqlite3.connect(db_path)
+    try:
+        for (table_name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'report_%'"
+        ).fetchall():
+            conn.execute(f"DROP TABLE {table_name}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def report(synced_db):
+    generator = ReportGenerator(synced_db)
+    generator.connect()
+    yield generator
+    generator.close()
+
+
+@pytest.mark.parametrize("summary", [True, False])
+def test_status_distribution_with_and_without_summary(synced_db, report, summary):
+    if not summary:
+        drop_summary(synced_db)
+    assert report.has_summary() is summary
+
+    html = report.section_status_distribution()
+    counts = status_counts(synced_db)
+    assert html.count("<tr>") == len(counts) + 1
+    for count in counts.values():
+        assert f'<td class="number-cell">{count}</td>' in html
+
+
+def test_summary_sections_note_missing_summary(synced_db, report):
+    drop_summary(synced_db)
+    assert "Зведення ще не побудоване" in report.section_stats()
+    assert "Зведення ще не побудоване" in report.section_top_sku_sets()
+
+
+def test_reports_show_escaped_db_path(synced_db, tmp_path):
+    db_path = str(tmp_path / "<rules & co>.db")
+    shutil.copy(synced_db, db_path)
+    generator = ReportGenerator(db_path)
+    generator.connect()
+    try:
+        output_file = generator.generate_html_report(str(tmp_path / "report.html"))
+        output_dir = tmp_path / "full"
+        generator.generate_full_report(str(output_dir))
+    finally:
+        generator.close()
+
+    for path in (output_file, output_dir / "index.html"):
+        page = open(path, encoding='utf-8').read()
+        assert f"<strong>База даних:</strong> {html.escape(db_path)}</div>" in page
+        assert "discount_rules.db" not in page
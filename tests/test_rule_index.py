@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+RuleIndex: кандидаты по точке против полного перебора правил
+"""
+
+import random
+
+from discount_etl.engine import compare_operator
+from discount_etl.rule_index import (
+    COND_LOCATION, COND_MERCHANT, COND_TERMINAL, COND_TERMINAL_GROUP, RuleIndex
+)
+
+POINT_TYPES = (COND_TERMINAL, COND_LOCATION, COND_MERCHANT, COND_TERMINAL_GROUP)
+
+
+def random_conditions(rnd):
+    """0-3 условия точки с любыми операторами 0-7 и значением или множеством"""
+    conditions = []
+    for _ in range(rnd.randint(0, 3)):
+        op = rnd.randint(0, 7)
+        if op in (6, 7) or rnd.random() < 0.3:
+            expected = frozenset(rnd.sample(range(1, 30), rnd.randint(1, 4)))
+        else:
+            expected = rnd.randint(1, 30)
+        conditions.append((rnd.choice(POINT_TYPES), op, expected))
+    return conditions
+
+
+def random_context(rnd):
+    context = {condition_type: rnd.randint(1, 30) for condition_type in POINT_TYPES[:3] if rnd.random() < 0.8}
+    if rnd.random() < 0.5:
+        context[COND_TERMINAL_GROUP] = frozenset(rnd.sample(range(1, 30), rnd.randint(1, 3)))
+    return context
+
+
+def matches(conditions, context):
+    return all(compare_operator(op, context.get(condition_type, object()), expected)
+               for condition_type, op, expected in conditions)
+
+
+def test_candidates_cover_every_matching_rule():
+    rnd = random.Random(1)
+    rules = {rule_id: random_conditions(rnd) for rule_id in range(2000)}
+    index = RuleIndex()
+    for rule_id, conditions in rules.items():
+        index.add(rule_id, conditions)
+
+    for _ in range(500):
+        context = random_context(rnd)
+        candidates = index.candidates(context)
+        expected = {rule_id for rule_id, conditions in rules.items() if matches(conditions, context)}
+        # Индекс может вернуть лишние правила, но не может потерять подходящие
+        assert expected <= candidates
+        assert {rule_id for rule_id in candidates if matches(rules[rule_id], context)} == expected
+
+
+def test_candidates_prune_by_key():
+    index = RuleIndex()
+    index.add(1, [(COND_TERMINAL, 0, 15)])
+    index.add(2, [(COND_LOCATION, 6, frozenset({3, 4}))])
+    index.add(3, [(COND_TERMINAL, 1, 15)])
+    index.add(4, [(COND_MERCHANT, 0, 2), (COND_TERMINAL, 6, frozenset({15, 16, 17}))])
+    index.add(5, [(COND_TERMINAL_GROUP, 6, frozenset({8}))])
+
+    # Без условия = / IN на точку правило проверяется всегда
+    assert index.unrestricted == {3}
+    # Ключ - условие с наименьшим числом значений
+    assert index.keys[4] == (COND_MERCHANT, frozenset({2}))
+
+    assert index.candidates({COND_TERMINAL: 15}) == {1, 3}
+    assert index.candidates({COND_LOCATION: 4, COND_MERCHANT: 2}) == {2, 3, 4}
+    assert index.candidates({COND_TERMINAL_GROUP: frozenset({7, 8})}) == {3, 5}
+    assert index.candidates({}) == {3}
+
+
+def test_readd_and_remove():
+    index = RuleIndex()
+    index.add(1, [(COND_TERMINAL, 0, 15)])
+    index.add(1, [(COND_LOCATION, 0, 3)])
+    assert index.candidates({COND_TERMINAL: 15}) == set()
+    assert index.candidates({COND_LOCATION: 3}) == {1}
+
+    index.remove(1)
+    index.remove(1)
+    assert len(index) == 0 and 1 not in index
+    assert all(not postings for postings in index.postings.values())
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Полная перезагрузка (--full) через теневые таблицы: подмена рабочих таблиц
+с индексами при успехе, прежнее состояние без остатков __shadow при ошибке
+"""
+
+import sqlite3
+
+import pytest
+
+from discount_etl.layouts import NormalizedLayout, RuleLayout
+
+from conftest import CATALOG_SIZES, sync
+
+RULE_TABLES = NormalizedLayout.TABLES + ('rule_time_windows', 'sync_hashes')
+
+
+def snapshot(db_path):
+    """Содержимое таблиц правил, их индексы и теневые таблицы"""
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = {
+            table_name: sorted(conn.execute(f"SELECT * FROM {table_name}").fetchall(), key=repr)
+            for table_name in RULE_TABLES
+        }
+        indexes = {
+            (name, table_name)
+            for name, table_name in conn.execute(
+                "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+            )
+        }
+        shadow = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE ?", (f"%{RuleLayout.SHADOW_SUFFIX}%",)
+        )]
+        return tables, indexes, shadow
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("resumable", [True, False])
+def test_failed_full_load_keeps_live_tables(synced_db, catalog, monkeypatch, resumable):
+    before = snapshot(synced_db)
+
+    # Запись падает на третьей пачке правил, часть данных уже в теневых таблицах
+    write_batch = NormalizedLayout.write_batch
+    calls = []
+
+    async def failing_write_batch(self, batch):
+        calls.append(self.suffix)
+        if len(calls) == 3:
+            raise sqlite3.OperationalError("disk I/O error")
+        await write_batch(self, batch)
+
+    monkeypatch.setattr(NormalizedLayout, 'write_batch', failing_write_batch)
+    catalog.resize('discountRule', CATALOG_SIZES['rules'] - 50)
+    with pytest.raises(sqlite3.OperationalError):
+        sync(synced_db, catalog, INCREMENTAL_SYNC=False, RESUMABLE_SYNC=resumable)
+
+    assert calls == [RuleLayout.SHADOW_SUFFIX] * 3
+    assert snapshot(synced_db) == before
+
+
+def test_full_load_replaces_tables_and_rebuilds_indexes(synced_db, catalog):
+    tables, indexes, _ = snapshot(synced_db)
+    assert any(table_name == 'result_items' for _, table_name in indexes)
+
+    catalog.resize('discountRule', CATALOG_SIZES['rules'] - 50)
+    catalog.overrides = {7: {'name': "Renamed"}}
+    sync(synced_db, catalog, INCREMENTAL_SYNC=False)
+
+    new_tables, new_indexes, shadow = snapshot(synced_db)
+    assert shadow == []
+    assert new_indexes == indexes
+    assert len(new_tables['discount_rules']) == CATALOG_SIZES['rules'] - 50
+    assert len(new_tables['sync_hashes']) == len(tables['sync_hashes']) - 50
+
+    conn = sqlite3.connect(synced_db)
+    try:
+        assert conn.execute("SELECT name FROM discount_rules WHERE id = 7").fetchone() == ("Renamed",)
+        assert conn.execute(
+            "SELECT COUNT(*) FROM result_items WHERE discount_rule_id > ?", (CATALOG_SIZES['rules'] - 50,)
+        ).fetchone() == (0,)
+        # Индексы построены на рабочих таблицах, ссылки FOREIGN KEY указывают на них же
+        assert not conn.execute(
+            "SELECT name FROM sqlite_master WHERE sql LIKE ?", (f"%{RuleLayout.SHADOW_SUFFIX}%",)
+        ).fetchall()
+        assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    finally:
+        conn.close()
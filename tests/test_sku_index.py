@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+SkuSetIndex: принадлежность SKU наборам против множеств Python и таблицы sku_set_items
+"""
+
+import random
+import sqlite3
+
+from discount_etl.engine import RuleEngine
+from discount_etl.sku_index import SkuSetIndex
+
+from conftest import CATALOG_SIZES
+
+
+def test_membership_matches_sets():
+    rnd = random.Random(2)
+    sets = {sku_set_id: {rnd.randint(1, 500) for _ in range(rnd.randint(0, 60))} for sku_set_id in range(1, 80)}
+    index = SkuSetIndex()
+    for sku_set_id, skus in sets.items():
+        index.set_members(sku_set_id, list(skus) + list(skus)[:3])
+
+    for sku_id in range(0, 502):
+        expected = {sku_set_id for sku_set_id, skus in sets.items() if sku_id in skus}
+        assert index.sets_containing(sku_id) == expected
+        for sku_set_id, skus in sets.items():
+            assert index.contains(sku_set_id, sku_id) is (sku_id in skus)
+
+    assert list(index.members_of(5)) == sorted(sets[5])
+    assert not index.contains(10 ** 6, 1)
+    assert list(index.members_of(10 ** 6)) == []
+
+
+def test_replace_and_remove():
+    index = SkuSetIndex()
+    index.set_members(1, [3, 1, 2])
+    index.set_members(2, [2])
+    index.set_members(1, [4])
+    assert index.sets_containing(2) == {2}
+    assert index.sets_containing(4) == {1}
+    assert not index.contains(1, 3)
+
+    index.remove(2)
+    index.remove(2)
+    assert len(index) == 1 and 2 not in index
+    assert index.sets_containing(2) == frozenset()
+    assert 2 not in index.containing
+
+
+def test_engine_sku_index_matches_database(synced_db, catalog):
+    engine = RuleEngine.from_db(synced_db)
+    conn = sqlite3.connect(synced_db)
+    try:
+        rows = conn.execute("SELECT sku_set_id, sku_id FROM sku_set_items ORDER BY sku_set_id, sku_id").fetchall()
+    finally:
+        conn.close()
+
+    stored = {}
+    for sku_set_id, sku_id in rows:
+        stored.setdefault(sku_set_id, []).append(sku_id)
+    assert len(stored) == CATALOG_SIZES['sku_sets']
+    for sku_set_id, skus in stored.items():
+        assert list(engine.sku_index.members_of(sku_set_id)) == skus == list(catalog.sku_set_members(sku_set_id))
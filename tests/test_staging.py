@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Возобновляемая синхронизация через staging: продолжение прерванной загрузки,
+отбрасывание неполных списков и устаревших данных
+"""
+
+import asyncio
+import sqlite3
+import time
+
+import aiosqlite
+import pytest
+
+from discount_etl.api import IncompleteDataError, RetryableAPIError
+from discount_etl.staging import SyncStaging
+
+from conftest import CATALOG_SIZES, RULES_ENDPOINT, ScriptedServer, sync
+
+
+def staged(db_path):
+    """Сохраненное в staging: endpoint -> (complete, множество offset), id наборов с деталями"""
+    conn = sqlite3.connect(db_path)
+    try:
+        endpoints = {
+            endpoint: (bool(complete), set())
+            for endpoint, complete in conn.execute("SELECT endpoint, complete FROM sync_staging_endpoints")
+        }
+        for endpoint, offset in conn.execute("SELECT endpoint, page_offset FROM sync_staging_pages"):
+            endpoints[endpoint][1].add(offset)
+        sku_details = {row[0] for row in conn.execute("SELECT sku_set_id FROM sync_staging_sku_details")}
+        return endpoints, sku_details
+    finally:
+        conn.close()
+
+
+def count_rules(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM discount_rules").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def interrupted_sync(db_path, catalog):
+    """Запуск, прерванный на странице 200 списка правил (503 без повторов)"""
+    server = ScriptedServer(catalog, failing_pages={RULES_ENDPOINT: {200}})
+    with pytest.raises(RetryableAPIError):
+        sync(db_path, catalog, server, RETRY_ATTEMPTS=1)
+    return server
+
+
+def test_resume_fetches_only_missing_pages(tmp_path, catalog):
+    db_path = str(tmp_path / "rules.db")
+    interrupted_sync(db_path, catalog)
+    endpoints, _ = staged(db_path)
+    # Страницы до сбоя сохранены, правила в рабочие таблицы не попали
+    assert endpoints[RULES_ENDPOINT] == (False, {0, 100})
+    assert count_rules(db_path) == 0
+
+    server = ScriptedServer(catalog)
+    sync(db_path, catalog, server)
+
+    requested = {}
+    for path, offset in server.page_requests:
+        requested.setdefault(path, []).append(offset)
+    assert sorted(requested.pop(RULES_ENDPOINT)) == [200, 300]
+    # Полностью сохраненные списки не запрашиваются, недосохраненные - с недостающих offset
+    for path, offsets in requested.items():
+        complete, done_offsets = endpoints.get(path, (False, set()))
+        assert not complete and not done_offsets & set(offsets)
+
+    assert count_rules(db_path) == CATALOG_SIZES['rules']
+    assert staged(db_path) == ({}, set())
+
+
+def test_short_list_is_discarded_from_staging(tmp_path, catalog):
+    db_path = str(tmp_path / "rules.db")
+    server = ScriptedServer(catalog, truncated_pages={RULES_ENDPOINT: {100}})
+    with pytest.raises(IncompleteDataError, match="получено 390 записей из 400"):
+        sync(db_path, catalog, server)
+
+    # mark_complete отбросил неполный список целиком: следующий запуск начнет его заново
+    endpoints, _ = staged(db_path)
+    assert RULES_ENDPOINT not in endpoints
+    assert count_rules(db_path) == 0
+
+    server = ScriptedServer(catalog)
+    sync(db_path, catalog, server)
+    assert sorted(offset for path, offset in server.page_requests if path == RULES_ENDPOINT) == [0, 100, 200, 300]
+    assert count_rules(db_path) == CATALOG_SIZES['rules']
+
+
+def test_discard_stale_drops_old_and_other_batch_size(tmp_path, catalog):
+    db_path = str(tmp_path / "rules.db")
+    interrupted_sync(db_path, catalog)
+
+    async def discard(batch_size, fresh=False):
+        async with aiosqlite.connect(db_path) as conn:
+            staging = SyncStaging(conn, batch_size=batch_size, max_age_hours=12)
+            if fresh:
+                # Свежие список и детали рядом с устаревшими: они должны остаться
+                await staging.save_page('/fresh/list', 0, [{'id': 1}], 1)
+                await staging.save_sku_details({10 ** 6: [1, 2]})
+            await staging.discard_stale()
+
+    # Правила и детали наборов сохранены 13 часов назад
+    conn = sqlite3.connect(db_path)
+    old = time.time() - 13 * 3600
+    conn.execute("UPDATE sync_staging_endpoints SET started_at = ? WHERE endpoint = ?", (old, RULES_ENDPOINT))
+    conn.execute("UPDATE sync_staging_sku_details SET fetched_at = ?", (old,))
+    conn.commit()
+    conn.close()
+
+    asyncio.run(discard(100, fresh=True))
+    endpoints, sku_details = staged(db_path)
+    assert RULES_ENDPOINT not in endpoints
+    assert endpoints['/fresh/list'] == (False, {0})
+    assert sku_details == {10 ** 6}
+
+    # Другой BATCH_SIZE: offset сохраненных страниц не совпадут, отбрасывается все
+    asyncio.run(discard(50))
+    endpoints, _ = staged(db_path)
+    assert endpoints == {}
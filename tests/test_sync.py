@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Инкрементальная синхронизация по sync_hashes: перезапись измененных правил,
+пропуск неизмененных и удаление пропавших вместе с дочерними строками
+"""
+
+import json
+import sqlite3
+
+from conftest import CATALOG_SIZES, sync
+
+CHILD_TABLES = ('rule_conditions', 'rule_condition_values', 'order_conditions', 'result_items')
+
+
+def rule_rows(db_path, rule_id):
+    """Строки правила: discount_rules, дочерние таблицы (id строк), хеш и период"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = {
+            'rule': conn.execute("SELECT name FROM discount_rules WHERE id = ?", (rule_id,)).fetchall(),
+            'order_values': conn.execute(
+                "SELECT value FROM order_conditions WHERE discount_rule_id = ?", (rule_id,)
+            ).fetchall(),
+            'hash': conn.execute(
+                "SELECT content_hash FROM sync_hashes WHERE entity = 'discount_rules' AND id = ?", (rule_id,)
+            ).fetchall(),
+            'window': conn.execute("SELECT * FROM rule_time_windows WHERE rule_id = ?", (rule_id,)).fetchall(),
+            'condition_values': conn.execute(
+                "SELECT condition_id, int_value FROM rule_condition_values WHERE discount_rule_id = ? ORDER BY 1, 2",
+                (rule_id,)
+            ).fetchall(),
+            'result_item_conditions': conn.execute(
+                "SELECT c.id FROM result_item_conditions c JOIN result_items r ON r.id = c.result_item_id "
+                "WHERE r.discount_rule_id = ?", (rule_id,)
+            ).fetchall(),
+        }
+        for table_name in ('rule_conditions', 'order_conditions', 'result_items'):
+            rows[table_name] = conn.execute(
+                f"SELECT id FROM {table_name} WHERE discount_rule_id = ? ORDER BY id", (rule_id,)
+            ).fetchall()
+        return rows
+    finally:
+        conn.close()
+
+
+def orphan_count(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        orphans = sum(
+            conn.execute(
+                f"SELECT COUNT(*) FROM {table_name} WHERE discount_rule_id NOT IN (SELECT id FROM discount_rules)"
+            ).fetchone()[0]
+            for table_name in CHILD_TABLES
+        )
+        return orphans + conn.execute(
+            "SELECT COUNT(*) FROM result_item_conditions WHERE result_item_id NOT IN (SELECT id FROM result_items)"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_incremental_sync_rewrites_skips_and_deletes(synced_db, catalog):
+    changed_id, unchanged_id, vanished_id = 5, 6, CATALOG_SIZES['rules']
+    before = {rule_id: rule_rows(synced_db, rule_id) for rule_id in (changed_id, unchanged_id, vanished_id)}
+    assert all(rows['rule'] and rows['condition_values'] and rows['hash'] for rows in before.values())
+
+    catalog.overrides = {changed_id: {
+        'name': "Changed rule",
+        'orderConditionGroup': {'requiredConditions': [
+            {'type': 6, 'comparsionType': 4, 'value': json.dumps({'value': 777})},
+        ]},
+    }}
+    catalog.resize('discountRule', CATALOG_SIZES['rules'] - 10)
+    sync(synced_db, catalog)
+
+    # Измененное правило переписано вместе с дочерними строками (новые id)
+    changed = rule_rows(synced_db, changed_id)
+    assert changed['rule'] == [("Changed rule",)]
+    assert [float(value) for value, in changed['order_values']] == [777.0]
+    assert changed['hash'] != before[changed_id]['hash']
+    for table_name in ('rule_conditions', 'order_conditions', 'result_items'):
+        assert changed[table_name] and min(changed[table_name]) > max(before[changed_id][table_name])
+
+    # Неизмененное правило не трогалось: те же строки с теми же id
+    assert rule_rows(synced_db, unchanged_id) == before[unchanged_id]
+
+    # Пропавшее из API правило удалено со всеми дочерними строками, хешем и периодом
+    assert all(not rows for rows in rule_rows(synced_db, vanished_id).values())
+    assert orphan_count(synced_db) == 0
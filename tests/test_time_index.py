@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+TimeWindowIndex: дерево интервалов против перебора, границы периодов и события
+"""
+
+import random
+
+from discount_etl.time_index import EVENT_ACTIVATE, EVENT_EXPIRE, HOUR_MS, TimeWindowIndex
+
+
+def brute_active(windows, ts):
+    return {rule_id for rule_id, (begin, end) in windows.items()
+            if (begin is None or begin <= ts) and (end is None or ts <= end)}
+
+
+def test_active_at_matches_brute_force():
+    rnd = random.Random(3)
+    windows = {}
+    for rule_id in range(1500):
+        begin = rnd.randrange(0, 1000) if rnd.random() < 0.9 else None
+        end = rnd.randrange(0, 1000) if rnd.random() < 0.7 else None
+        windows[rule_id] = (begin, end)
+    index = TimeWindowIndex()
+    for rule_id, (begin, end) in windows.items():
+        index.add(rule_id, begin, end)
+
+    # Подряд идущие моменты проверяют и кеш по отрезкам между границами
+    for ts in list(range(-2, 1003)) + [rnd.randrange(-10, 1010) for _ in range(300)]:
+        assert index.active_at(ts) == brute_active(windows, ts)
+
+
+def test_window_boundaries_are_inclusive():
+    index = TimeWindowIndex()
+    index.add(1, 100, 200)
+    index.add(2, 200, 200)
+    index.add(3, None, 150)
+    index.add(4, 150, None)
+
+    assert index.active_at(99) == {3}
+    assert index.active_at(100) == {1, 3}
+    assert index.active_at(150) == {1, 3, 4}
+    assert index.active_at(151) == {1, 4}
+    assert index.active_at(200) == {1, 2, 4}
+    assert index.active_at(201) == {4}
+
+
+def test_empty_window_is_never_active():
+    index = TimeWindowIndex()
+    index.add(1, 300, 100)
+    assert all(not index.active_at(ts) for ts in (50, 100, 200, 300, 400))
+    assert index.events(0, 1000) == []
+
+
+def test_changes_invalidate_cache():
+    index = TimeWindowIndex()
+    index.add(1, 100, 200)
+    assert index.active_at(150) == {1}
+    index.add(2, 140, 160)
+    assert index.active_at(150) == {1, 2}
+    index.add(1, 300, 400)
+    index.remove(2)
+    assert index.active_at(150) == set()
+    assert index.active_at(300) == {1}
+
+
+def test_events_and_next_change():
+    index = TimeWindowIndex()
+    index.add(1, 1000, 5000)
+    index.add(2, None, 3000)
+    index.add(3, 5000, None)
+
+    assert index.events(0, 10000) == [
+        (1000, EVENT_ACTIVATE, 1), (3000, EVENT_EXPIRE, 2), (5000, EVENT_ACTIVATE, 3), (5000, EVENT_EXPIRE, 1)
+    ]
+    # Окно полуоткрытое: [start, end)
+    assert index.events(1000, 3000) == [(1000, EVENT_ACTIVATE, 1)]
+    assert index.upcoming_events(0, hours=1) == index.events(0, HOUR_MS)
+
+    assert index.next_change_after(0) == 1000
+    assert index.next_change_after(1000) == 3001
+    assert index.next_change_after(3001) == 5000
+    assert index.next_change_after(5000) == 5001
+    assert index.next_change_after(5001) is None